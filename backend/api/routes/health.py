@@ -4,11 +4,17 @@ import time
 import logging
 from typing import Dict, Any
 
-from core.database import DatabaseManager
+from core.database import DatabaseManager, result_cache, query_workload
+from services.cache_service import answer_cache, query_flights
+from services.index_advisor import IndexAdvisor
+from services.columnar_service import columnar_service
+from utils.sql_templates import sql_templates
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+index_advisor = IndexAdvisor()
+
 @router.get("/health")
 async def health_check():
     """Basic health check endpoint"""
@@ -115,9 +121,48 @@ async def health_metrics():
         return {
             "status": "healthy",
             "metrics": metrics,
+            "cache": answer_cache.stats(),
+            "single_flight": query_flights.stats(),
+            "sql_templates": sql_templates.cache_info(),
+            "query_cache": result_cache.stats(),
+            "workload": query_workload.stats(),
+            "columnar": columnar_service.stats(),
             "timestamp": time.time()
         }
         
     except Exception as e:
         logger.error(f"Error getting health metrics: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get health metrics: {str(e)}")
+
+@router.get("/health/indexes")
+async def index_recommendations():
+    """Most expensive query shapes and the indexes proposed for them"""
+    try:
+        proposals = await index_advisor.propose()
+        return {
+            "workload": [
+                {key: value for key, value in entry.items() if key != "example"}
+                for entry in query_workload.top(index_advisor.config["top_shapes"])
+            ],
+            "proposals": [proposal.to_dict() for proposal in proposals],
+            "timestamp": time.time()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error proposing indexes: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to propose indexes: {str(e)}")
+
+@router.post("/health/indexes/apply")
+async def apply_index_recommendations():
+    """Create the proposed indexes, keeping only those that measurably speed up their queries"""
+    try:
+        results = await index_advisor.apply()
+        return {
+            "results": results,
+            "created": [result["name"] for result in results if result["kept"]],
+            "timestamp": time.time()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error applying indexes: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to apply indexes: {str(e)}")
@@ -1,66 +1,97 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+import asyncio
 import logging
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List
 
 from core.models import MetricsSummary
 from core.database import DatabaseManager
+from core.responses import FastJSONResponse
+from services.columnar_service import columnar_service
+from utils.downsample import downsample_rows, MODES
+from config import DOWNSAMPLE_CONFIG
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 db_manager = DatabaseManager()
 
+async def _timed(name: str, query: str, timings: Dict[str, float], params: tuple = None) -> List[Dict[str, Any]]:
+    """Run one sub-query and record its latency in seconds under `name`"""
+    start_time = time.perf_counter()
+    try:
+        return await db_manager.execute_query(query, params, cache=True)
+    finally:
+        timings[name] = time.perf_counter() - start_time
+
+async def _columnar(name: str, rows_fn, timings: Dict[str, float]):
+    """Rows from the columnar snapshot (None when it is missing or stale), timed under `name`"""
+    start_time = time.perf_counter()
+    # A write from another process (e.g. setup_database.py) makes the snapshot stale
+    await db_manager.check_external_writes()
+    rows = rows_fn()
+    if rows is not None:
+        timings[name] = time.perf_counter() - start_time
+    return rows
+
+def _top(rows: List[Dict[str, Any]], key: str, fields: List[str], limit: int = 10) -> List[Dict[str, Any]]:
+    """Rank pre-aggregated per-item rows by `key` (None excluded) and keep `fields`"""
+    ranked = sorted((row for row in rows if row[key] is not None), key=lambda row: row[key], reverse=True)
+    return [{field: row[field] for field in fields} for row in ranked[:limit]]
+
 @router.get("/metrics/summary", response_model=MetricsSummary)
 async def get_summary_metrics():
-    """Get overall business metrics summary"""
+    """Get overall business metrics summary (one scan per table, tables read concurrently)"""
     try:
-        metrics = {}
+        timings = {}
         
-        # Total sales
-        result = await db_manager.execute_query(
-            "SELECT SUM(total_sales) as total FROM total_sales_metrics"
-        )
-        metrics['total_sales'] = float(result[0]['total'] or 0)
-        
-        # Total ad spend
-        result = await db_manager.execute_query(
-            "SELECT SUM(ad_spend) as total FROM ad_sales_metrics"
-        )
-        metrics['total_ad_spend'] = float(result[0]['total'] or 0)
+        # Per-item rollup: total, product count and top product in a single pass
+        sales_query = """
+            SELECT 
+                item_id,
+                SUM(total_sales) OVER () as total,
+                COUNT(item_id) OVER () as product_count
+            FROM total_sales_by_item
+            ORDER BY total_sales DESC
+            LIMIT 1
+        """
         
-        # Overall ROAS
-        result = await db_manager.execute_query("""
+        # Per-item ad rollup: total spend and ROAS (over rows with spend)
+        ad_query = """
             SELECT 
-                SUM(ad_sales) / NULLIF(SUM(ad_spend), 0) as roas
-            FROM ad_sales_metrics 
-            WHERE ad_spend > 0
-        """)
-        metrics['total_roas'] = float(result[0]['roas'] or 0)
-        
-        # Product counts
-        result = await db_manager.execute_query(
-            "SELECT COUNT(DISTINCT item_id) as count FROM total_sales_metrics"
-        )
-        metrics['total_products'] = int(result[0]['count'] or 0)
+                SUM(ad_spend) as total_spend,
+                SUM(roas_ad_sales) / NULLIF(SUM(roas_ad_spend), 0) as roas
+            FROM ad_sales_by_item
+        """
         
-        result = await db_manager.execute_query("""
+        eligibility_query = """
             SELECT COUNT(DISTINCT item_id) as count 
             FROM product_eligibility 
             WHERE eligibility = 1
-        """)
-        metrics['eligible_products'] = int(result[0]['count'] or 0)
-        
-        # Top performing product
-        result = await db_manager.execute_query("""
-            SELECT item_id, SUM(total_sales) as sales
-            FROM total_sales_metrics
-            GROUP BY item_id
-            ORDER BY sales DESC
-            LIMIT 1
-        """)
-        metrics['top_performing_product'] = str(result[0]['item_id']) if result else None
+        """
+        
+        snapshot = await _columnar("columnar", columnar_service.summary_rows, timings)
+        if snapshot is not None:
+            sales, ads, eligibility = snapshot
+        else:
+            sales, ads, eligibility = await asyncio.gather(
+                _timed("total_sales_by_item", sales_query, timings),
+                _timed("ad_sales_by_item", ad_query, timings),
+                _timed("product_eligibility", eligibility_query, timings)
+            )
+        
+        metrics = {
+            'total_sales': float(sales[0]['total'] or 0) if sales else 0.0,
+            'total_products': int(sales[0]['product_count'] or 0) if sales else 0,
+            'top_performing_product': str(sales[0]['item_id']) if sales else None,
+            'total_ad_spend': float(ads[0]['total_spend'] or 0),
+            'total_roas': float(ads[0]['roas'] or 0),
+            'eligible_products': int(eligibility[0]['count'] or 0),
+            'query_timings': timings
+        }
         
-        return MetricsSummary(**metrics)
+        # Validated against the model, then rendered directly (no second jsonable_encoder pass)
+        return FastJSONResponse(MetricsSummary(**metrics).model_dump())
         
     except Exception as e:
         logger.error(f"Error getting summary metrics: {e}")
@@ -68,108 +99,104 @@ async def get_summary_metrics():
 
 @router.get("/metrics/performance")
 async def get_performance_metrics():
-    """Get detailed performance metrics"""
+    """Get detailed performance metrics from a single read of the per-item ad rollup"""
     try:
-        metrics = {}
-        
-        # ROAS by product (top 10)
-        result = await db_manager.execute_query("""
-            SELECT 
-                item_id,
-                SUM(ad_sales) as total_ad_sales,
-                SUM(ad_spend) as total_ad_spend,
-                SUM(ad_sales) / NULLIF(SUM(ad_spend), 0) as roas
-            FROM ad_sales_metrics 
-            WHERE ad_spend > 0
-            GROUP BY item_id
-            ORDER BY roas DESC
-            LIMIT 10
-        """)
-        metrics['top_roas_products'] = result
-        
-        # CPC by product (top 10)
-        result = await db_manager.execute_query("""
-            SELECT 
-                item_id,
-                SUM(ad_spend) as total_spend,
-                SUM(clicks) as total_clicks,
-                SUM(ad_spend) / NULLIF(SUM(clicks), 0) as cpc
-            FROM ad_sales_metrics 
-            WHERE clicks > 0
-            GROUP BY item_id
-            ORDER BY cpc DESC
-            LIMIT 10
-        """)
-        metrics['highest_cpc_products'] = result
-        
-        # Conversion rates
-        result = await db_manager.execute_query("""
-            SELECT 
-                item_id,
-                SUM(clicks) as total_clicks,
-                SUM(units_sold) as total_units,
-                (SUM(units_sold) * 100.0) / NULLIF(SUM(clicks), 0) as conversion_rate
-            FROM ad_sales_metrics 
-            WHERE clicks > 0
-            GROUP BY item_id
-            ORDER BY conversion_rate DESC
-            LIMIT 10
-        """)
-        metrics['best_conversion_rates'] = result
-        
-        # Click-through rates
-        result = await db_manager.execute_query("""
-            SELECT 
-                item_id,
-                SUM(impressions) as total_impressions,
-                SUM(clicks) as total_clicks,
-                (SUM(clicks) * 100.0) / NULLIF(SUM(impressions), 0) as ctr
-            FROM ad_sales_metrics 
-            WHERE impressions > 0
-            GROUP BY item_id
-            ORDER BY ctr DESC
-            LIMIT 10
-        """)
-        metrics['best_ctr_products'] = result
-        
-        return metrics
+        timings = {}
+        
+        # Each ranking keeps the row filter of its original query via the rollup's filtered sums
+        per_item = await _columnar("columnar", columnar_service.ad_rows_by_item, timings)
+        if per_item is None:
+            per_item = await _timed("ad_sales_by_item", """
+                SELECT 
+                    item_id,
+                    roas_ad_sales as total_ad_sales,
+                    roas_ad_spend as total_ad_spend,
+                    cpc_ad_spend as total_spend,
+                    cpc_clicks as total_clicks,
+                    cvr_units_sold as total_units,
+                    ctr_impressions as total_impressions,
+                    ctr_clicks as impression_clicks
+                FROM ad_sales_by_item
+            """, timings)
+        
+        rows = []
+        for row in per_item:
+            ad_spend = row['total_ad_spend']
+            clicks = row['total_clicks']
+            impressions = row['total_impressions']
+            rows.append({
+                **row,
+                'roas': row['total_ad_sales'] / ad_spend if ad_spend else None,
+                'cpc': row['total_spend'] / clicks if clicks else None,
+                'conversion_rate': (row['total_units'] * 100.0) / clicks if clicks else None,
+                'ctr': (row['impression_clicks'] * 100.0) / impressions if impressions else None
+            })
+        
+        ctr_products = _top(rows, 'ctr', ['item_id', 'total_impressions', 'impression_clicks', 'ctr'])
+        for product in ctr_products:
+            product['total_clicks'] = product.pop('impression_clicks')
+        
+        return FastJSONResponse({
+            'top_roas_products': _top(rows, 'roas', ['item_id', 'total_ad_sales', 'total_ad_spend', 'roas']),
+            'highest_cpc_products': _top(rows, 'cpc', ['item_id', 'total_spend', 'total_clicks', 'cpc']),
+            'best_conversion_rates': _top(rows, 'conversion_rate', ['item_id', 'total_clicks', 'total_units', 'conversion_rate']),
+            'best_ctr_products': ctr_products,
+            'query_timings': timings
+        })
         
     except Exception as e:
         logger.error(f"Error getting performance metrics: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get performance metrics: {str(e)}")
 
 @router.get("/metrics/trends")
-async def get_trend_metrics():
-    """Get trend data over time"""
+async def get_trend_metrics(max_points: int = Query(None, ge=3, le=DOWNSAMPLE_CONFIG["max_points"]),
+                            mode: str = Query(None, pattern=f"^({'|'.join(MODES)})$")):
+    """Get trend data over time, downsampled to at most `max_points` per series"""
     try:
+        timings = {}
+        target = max_points or DOWNSAMPLE_CONFIG["trend_points"]
+        
         # Sales trends
-        sales_trends = await db_manager.execute_query("""
+        sales_query = """
             SELECT 
                 date,
-                SUM(total_sales) as daily_sales,
-                SUM(total_units_ordered) as daily_units
-            FROM total_sales_metrics
-            GROUP BY date
+                total_sales as daily_sales,
+                total_units_ordered as daily_units
+            FROM total_sales_by_day
             ORDER BY date
-        """)
+        """
         
         # Ad performance trends
-        ad_trends = await db_manager.execute_query("""
+        ad_query = """
             SELECT 
                 date,
-                SUM(ad_sales) as daily_ad_sales,
-                SUM(ad_spend) as daily_ad_spend,
-                SUM(impressions) as daily_impressions,
-                SUM(clicks) as daily_clicks
-            FROM ad_sales_metrics
-            GROUP BY date
+                ad_sales as daily_ad_sales,
+                ad_spend as daily_ad_spend,
+                impressions as daily_impressions,
+                clicks as daily_clicks
+            FROM ad_sales_by_day
             ORDER BY date
-        """)
-        
-        return {
+        """
+        
+        snapshot = await _columnar("columnar", columnar_service.trend_rows, timings)
+        if snapshot is not None:
+            sales_trends, ad_trends = snapshot
+        else:
+            sales_trends, ad_trends = await asyncio.gather(
+                _timed("total_sales_by_day", sales_query, timings),
+                _timed("ad_sales_by_day", ad_query, timings)
+            )
+        
+        sales_trends, sales_sampling = downsample_rows(sales_trends, "date", ["daily_sales", "daily_units"], target, mode)
+        ad_trends, ad_sampling = downsample_rows(
+            ad_trends, "date", ["daily_ad_sales", "daily_ad_spend", "daily_impressions", "daily_clicks"], target, mode)
+        
+        return FastJSONResponse({
             "sales_trends": sales_trends,
-            "ad_trends": ad_trends
-        }
+            "ad_trends": ad_trends,
+            "downsampling": {"sales_trends": sales_sampling, "ad_trends": ad_sampling},
+            "query_timings": timings
+        })
         
     except Exception as e:
         logger.error(f"Error getting trend metrics: {e}")
@@ -179,26 +206,14 @@ async def get_trend_metrics():
 async def get_product_metrics(item_id: int):
     """Get detailed metrics for a specific product"""
     try:
-        # Product eligibility
-        eligibility = await db_manager.execute_query(
-            "SELECT * FROM product_eligibility WHERE item_id = ? ORDER BY eligibility_datetime_utc DESC LIMIT 1",
-            (item_id,)
-        )
-        
-        # Sales metrics
-        sales_metrics = await db_manager.execute_query(
-            "SELECT * FROM total_sales_metrics WHERE item_id = ? ORDER BY date",
-            (item_id,)
-        )
+        timings = {}
         
-        # Ad metrics
-        ad_metrics = await db_manager.execute_query(
-            "SELECT * FROM ad_sales_metrics WHERE item_id = ? ORDER BY date",
-            (item_id,)
-        )
+        eligibility_query = "SELECT * FROM product_eligibility WHERE item_id = ? ORDER BY eligibility_datetime_utc DESC LIMIT 1"
+        sales_query = "SELECT * FROM total_sales_metrics WHERE item_id = ? ORDER BY date"
+        ad_query = "SELECT * FROM ad_sales_metrics WHERE item_id = ? ORDER BY date"
         
         # Summary stats for this product
-        summary = await db_manager.execute_query("""
+        summary_query = """
             SELECT 
                 ts.item_id,
                 SUM(ts.total_sales) as total_sales,
@@ -216,15 +231,23 @@ async def get_product_metrics(item_id: int):
             LEFT JOIN ad_sales_metrics ads ON ts.item_id = ads.item_id AND ts.date = ads.date
             WHERE ts.item_id = ?
             GROUP BY ts.item_id
-        """, (item_id,))
+        """
+        
+        eligibility, sales_metrics, ad_metrics, summary = await asyncio.gather(
+            _timed("eligibility", eligibility_query, timings, (item_id,)),
+            _timed("sales_data", sales_query, timings, (item_id,)),
+            _timed("ad_data", ad_query, timings, (item_id,)),
+            _timed("summary", summary_query, timings, (item_id,))
+        )
         
-        return {
+        return FastJSONResponse({
             "item_id": item_id,
             "eligibility": eligibility[0] if eligibility else None,
             "sales_data": sales_metrics,
             "ad_data": ad_metrics,
-            "summary": summary[0] if summary else None
-        }
+            "summary": summary[0] if summary else None,
+            "query_timings": timings
+        })
         
     except Exception as e:
         logger.error(f"Error getting product metrics: {e}")
@@ -132,19 +132,24 @@
 #     except Exception as e:
 #         logger.error(f"Error executing SQL: {e}")
 #         raise HTTPException(status_code=500, detail=f"SQL execution failed: {str(e)}")
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 import asyncio
 import json
 import time
 import logging
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, TypeVar
 
 from core.models import QueryRequest, QueryResponse
-from core.database import DatabaseManager
+from core.database import DatabaseManager, QueryTimeoutError
+from core.responses import FastJSONResponse
 from services.mistral_service import MistralService
 from services.chart_service import ChartService
-from config import AI_RESPONSE_CONFIG, PERFORMANCE_CONFIG
+from services.cache_service import answer_cache, query_flights, normalize_question
+from services.query_service import QueryPipeline
+from services.plan_service import PlanService, QueryCostError
+from utils.sql_templates import inline_params
+from config import AI_RESPONSE_CONFIG, PERFORMANCE_CONFIG, QUERY_RESULT_CONFIG, QUERY_GUARD_CONFIG
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -153,69 +158,84 @@ logger = logging.getLogger(__name__)
 db_manager = DatabaseManager()
 mistral_service = MistralService()
 chart_service = ChartService()
+plan_service = PlanService(db_manager)
+query_pipeline = QueryPipeline(db_manager, mistral_service, chart_service, plan_service)
+
+T = TypeVar("T")
+
+async def _cancel_on_disconnect(http_request: Request, awaitable: Awaitable[T]) -> T:
+    """Await `awaitable`, cancelling it (and any SQL it is running) if the client disconnects first"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=QUERY_GUARD_CONFIG["disconnect_poll_interval"])
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.info(f"Client disconnected, cancelling {http_request.url.path}")
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
 
 @router.post("/query")
-async def process_query(request: QueryRequest):
+async def process_query(request: QueryRequest, http_request: Request):
     """Process a natural language query with enhanced AI capabilities"""
     start_time = time.time()
     
     try:
         logger.info(f"Processing query: {request.question}")
         
-        # Generate SQL query using enhanced Mistral service
-        sql_query = await mistral_service.generate_sql(request.question)
-        
-        # Log the generated SQL for debugging
-        logger.info(f"Generated SQL: {sql_query}")
-        
-        # Execute the SQL query
-        results = await db_manager.execute_query(sql_query)
-        
-        # Log query results count
-        logger.info(f"Query returned {len(results) if results else 0} results")
-        
-        # Generate human-readable response
-        response_text = await mistral_service.generate_response(
-            request.question, sql_query, results
-        )
-        
-        # Generate enhanced chart data with Plotly support
-        chart_data = None
-        if request.include_chart:
-            chart_data = chart_service.generate_chart_data(request.question, results)
-            if chart_data:
-                logger.info(f"Generated {chart_data.get('type', 'unknown')} chart with {len(chart_data.get('data', []))} data points")
-        
-        execution_time = time.time() - start_time
-        
-        # Log slow queries for performance monitoring
-        if execution_time > PERFORMANCE_CONFIG.get("slow_query_threshold", 5.0):
-            logger.warning(f"Slow query detected: {execution_time:.2f}s for '{request.question}'")
-        
-        # Enhanced response with more metadata
-        response_data = {
-            "response": response_text,
-            "sql_query": sql_query,
-            "results": results,
-            "chart_data": chart_data,
-            "execution_time": execution_time,
-            "data_points": len(results) if results else 0,
-            "stream": request.stream,
-            "enhanced_features": {
-                "plotly_charts": chart_data.get("plotly_config") is not None if chart_data else False,
-                "chart_type": chart_data.get("type") if chart_data else None,
-                "has_visualization": chart_data is not None
-            },
-            "query_metadata": {
-                "question_length": len(request.question),
-                "sql_length": len(sql_query),
-                "result_count": len(results) if results else 0,
-                "timestamp": time.time()
-            }
-        }
-        
-        return JSONResponse(response_data)
+        # Serve repeated questions from the answer cache, unless another process has written since
+        await db_manager.check_external_writes()
+        cached = answer_cache.get(request.question, request.include_chart)
+        if cached is not None:
+            logger.info(f"Answer cache hit for: {request.question}")
+            response_data = dict(cached)
+            response_data["execution_time"] = time.time() - start_time
+            response_data["stream"] = request.stream
+            response_data["cache_hit"] = True
+            response_data["coalesced"] = False
+            return FastJSONResponse(response_data)
+        
+        # SQL -> rows, then the LLM answer and the chart run concurrently;
+        # identical questions already in flight join that run instead of starting their own
+        outcome, coalesced = await _cancel_on_disconnect(http_request, query_flights.run(
+            answer_cache.make_key(request.question, request.include_chart),
+            lambda: query_pipeline.run(request.question, request.include_chart)
+        ))
+        response_data = _response_data(request, outcome, time.time() - start_time)
+        
+        if not coalesced:
+            answer_cache.set(request.question, response_data, request.include_chart)
+        
+        return FastJSONResponse({**response_data, "coalesced": coalesced})
         
+    except HTTPException:
+        raise
+    except QueryCostError as e:
+        logger.error(f"Query rejected for '{request.question}': {e}")
+        raise HTTPException(status_code=422, detail={
+            "error": "Query too expensive",
+            "detail": str(e),
+            "question": request.question,
+            "sql_query": inline_params(e.plan.query, e.plan.params),
+            "query_plan": e.plan.to_dict(),
+            "execution_time": time.time() - start_time,
+            "timestamp": time.time(),
+            "suggestions": e.plan.suggestions() + _get_error_suggestions(str(e))
+        })
+    except QueryTimeoutError as e:
+        logger.error(f"Query timed out for '{request.question}': {e}")
+        raise HTTPException(status_code=504, detail={
+            "error": "Query timed out",
+            "detail": str(e),
+            "question": request.question,
+            "query_stats": e.stats(),
+            "execution_time": time.time() - start_time,
+            "timestamp": time.time(),
+            "suggestions": _get_error_suggestions(str(e))
+        })
     except Exception as e:
         logger.error(f"Error processing query '{request.question}': {e}")
         
@@ -231,112 +251,273 @@ async def process_query(request: QueryRequest):
         
         raise HTTPException(status_code=500, detail=error_response)
 
+def _response_data(request: QueryRequest, outcome: dict, execution_time: float) -> dict:
+    """/query response body for a pipeline outcome; this is also what the answer cache stores"""
+    sql_query = outcome["sql_query"]
+    results = outcome["results"]
+    chart_data = outcome["chart_data"]
+    
+    logger.info(f"Generated SQL: {sql_query}")
+    logger.info(f"Query returned {len(results) if results else 0} results")
+    
+    # Log slow queries for performance monitoring
+    if execution_time > PERFORMANCE_CONFIG.get("slow_query_threshold", 5.0):
+        logger.warning(f"Slow query detected: {execution_time:.2f}s for '{request.question}'")
+    
+    # Enhanced response with more metadata
+    return {
+        "response": outcome["response"],
+        "sql_query": sql_query,
+        "results": results,
+        "chart_data": chart_data,
+        "execution_time": execution_time,
+        "data_points": len(results) if results else 0,
+        "stream": request.stream,
+        "enhanced_features": {
+            "plotly_charts": chart_data.get("plotly") is not None if chart_data else False,
+            "chart_type": chart_data.get("type") if chart_data else None,
+            "has_visualization": chart_data is not None
+        },
+        "query_metadata": {
+            "question_length": len(request.question),
+            "sql_length": len(sql_query),
+            "result_count": len(results) if results else 0,
+            "truncated": outcome["truncated"],
+            "query_plan": outcome["query_plan"],
+            "stage_timings": outcome["stage_timings"],
+            "timestamp": time.time()
+        },
+        "cache_hit": False
+    }
+
 @router.post("/query/analyze")
 async def analyze_query_complexity(request: QueryRequest):
     """Analyze query complexity and suggest optimizations"""
     try:
-        # Generate SQL without executing
-        sql_query = await mistral_service.generate_sql(request.question)
+        # Generate SQL and ask SQLite how it would run it, without executing
+        query, params = await mistral_service.generate_query(request.question)
+        sql_query = inline_params(query, params)
+        plan = await plan_service.analyze(query, params)
         
         # Analyze the query
         analysis = {
             "original_question": request.question,
             "generated_sql": sql_query,
-            "complexity_score": _calculate_complexity_score(sql_query),
-            "estimated_performance": _estimate_performance(sql_query),
-            "suggestions": _get_optimization_suggestions(sql_query),
+            "executed_sql": inline_params(plan.query, plan.params),
+            "query_plan": plan.to_dict(),
+            "suggestions": plan.suggestions() + _get_optimization_suggestions(sql_query),
             "chart_recommendations": _recommend_chart_type(request.question)
         }
         
-        return JSONResponse(analysis)
+        return FastJSONResponse(analysis)
         
     except Exception as e:
         logger.error(f"Error analyzing query: {e}")
         raise HTTPException(status_code=500, detail=f"Query analysis failed: {str(e)}")
 
 @router.post("/query/batch")
-async def process_batch_queries(requests: list[QueryRequest]):
+async def process_batch_queries(requests: list[QueryRequest], stream: bool = False):
     """Process multiple queries in batch for dashboard loading"""
+    if stream:
+        # One NDJSON line per item as it completes, then a summary line
+        return StreamingResponse(_stream_batch(requests), media_type="application/x-ndjson")
+    
     start_time = time.time()
-    results = []
     
     try:
-        for i, request in enumerate(requests[:10]):  # Limit to 10 queries
-            try:
-                logger.info(f"Processing batch query {i+1}/{len(requests)}: {request.question}")
-                
-                sql_query = await mistral_service.generate_sql(request.question)
-                query_results = await db_manager.execute_query(sql_query)
-                response_text = await mistral_service.generate_response(
-                    request.question, sql_query, query_results
-                )
-                
-                chart_data = None
-                if request.include_chart:
-                    chart_data = chart_service.generate_chart_data(request.question, query_results)
-                
-                results.append({
-                    "query_index": i,
-                    "question": request.question,
-                    "response": response_text,
-                    "sql_query": sql_query,
-                    "results": query_results,
-                    "chart_data": chart_data,
-                    "success": True
-                })
-                
-            except Exception as e:
-                logger.error(f"Error in batch query {i+1}: {e}")
-                results.append({
-                    "query_index": i,
-                    "question": request.question,
-                    "error": str(e),
-                    "success": False
-                })
+        results = [item async for item in _run_batch(requests)]
+        results.sort(key=lambda item: item["query_index"])
         
-        total_time = time.time() - start_time
-        
-        return JSONResponse({
+        return FastJSONResponse({
             "batch_results": results,
-            "total_execution_time": total_time,
-            "successful_queries": sum(1 for r in results if r.get("success")),
-            "failed_queries": sum(1 for r in results if not r.get("success")),
-            "timestamp": time.time()
+            **_batch_summary(results, start_time)
         })
         
     except Exception as e:
         logger.error(f"Error processing batch queries: {e}")
         raise HTTPException(status_code=500, detail=f"Batch processing failed: {str(e)}")
 
+async def _stream_batch(requests: list[QueryRequest]) -> AsyncGenerator[str, None]:
+    """Encode batch items as NDJSON lines in completion order"""
+    start_time = time.time()
+    results = []
+    
+    try:
+        async for item in _run_batch(requests):
+            results.append(item)
+            yield json.dumps(item, default=str) + "\n"
+        
+        yield json.dumps({"done": True, **_batch_summary(results, start_time)}) + "\n"
+        
+    except Exception as e:
+        # Headers are already sent, so failures are reported in-band
+        logger.error(f"Error streaming batch queries: {e}")
+        yield json.dumps({"done": True, "error": f"Batch processing failed: {str(e)}"}) + "\n"
+
+async def _run_batch(requests: list[QueryRequest]) -> AsyncGenerator[dict, None]:
+    """Yield batch items as they complete; equivalent questions run once and all SQL reads one snapshot.
+    
+    The snapshot's reader is held only while the generated SQL is planned and executed, never
+    across LLM calls, so batches do not starve the read pool or pin the WAL.
+    """
+    batch = requests[:10]  # Limit to 10 queries
+    start_time = time.time()
+    
+    # Equivalent wordings of the same question share one pipeline run
+    groups: dict[tuple, list[int]] = {}
+    for i, request in enumerate(batch):
+        groups.setdefault((normalize_question(request.question), request.include_chart), []).append(i)
+    
+    await db_manager.check_external_writes()
+    pending = []
+    for indices in groups.values():
+        request = batch[indices[0]]
+        cached = answer_cache.get(request.question, request.include_chart)
+        if cached is None:
+            pending.append(indices)
+            continue
+        for i in indices:
+            yield _batch_item(i, batch[i], cached, True, deduplicated=i != indices[0])
+    if not pending:
+        return
+    
+    semaphore = asyncio.Semaphore(PERFORMANCE_CONFIG.get("batch_concurrency", 4))
+    
+    async def generate(indices: list[int]):
+        async with semaphore:
+            logger.info(f"Processing batch query {indices[0]+1}/{len(batch)}: {batch[indices[0]].question}")
+            return await mistral_service.generate_query(batch[indices[0]].question)
+    
+    # 1. SQL generation may call the LLM, so no connection is held yet
+    queries = await asyncio.gather(*(generate(indices) for indices in pending), return_exceptions=True)
+    
+    # 2. Every statement on one data version; one connection runs one statement at a time anyway
+    prepared = []
+    async with db_manager.snapshot() as connection:
+        for indices, query in zip(pending, queries):
+            if isinstance(query, Exception):
+                prepared.append(query)
+                continue
+            try:
+                prepared.append(await query_pipeline.fetch(query, batch[indices[0]].question, connection))
+            except Exception as e:
+                prepared.append(e)
+    
+    # 3. Answers and charts, with the reader back in the pool
+    async def finish(indices: list[int], fetched) -> tuple:
+        request = batch[indices[0]]
+        try:
+            if isinstance(fetched, Exception):
+                raise fetched
+            async with semaphore:
+                outcome = await query_pipeline.run(request.question, request.include_chart, prepared=fetched)
+            response_data = _response_data(request, outcome, time.time() - start_time)
+            answer_cache.set(request.question, response_data, request.include_chart)
+            return indices, response_data
+            
+        except Exception as e:
+            logger.error(f"Error in batch query {indices[0]+1}: {e}")
+            return indices, e
+    
+    tasks = [asyncio.create_task(finish(indices, fetched)) for indices, fetched in zip(pending, prepared)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indices, outcome = await next_done
+            for i in indices:
+                yield _batch_item(i, batch[i], outcome, False, deduplicated=i != indices[0])
+    finally:
+        # Client went away or the batch failed: stop any work still in flight
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def _batch_item(index: int, request: QueryRequest, outcome, cache_hit: bool, deduplicated: bool) -> dict:
+    """Shape one batch result entry"""
+    if isinstance(outcome, Exception):
+        return {
+            "query_index": index,
+            "question": request.question,
+            "error": str(outcome),
+            "query_stats": outcome.stats() if isinstance(outcome, QueryTimeoutError) else None,
+            "query_plan": outcome.plan.to_dict(include_steps=False) if isinstance(outcome, QueryCostError) else None,
+            "success": False
+        }
+    
+    return {
+        "query_index": index,
+        "question": request.question,
+        "response": outcome["response"],
+        "sql_query": outcome["sql_query"],
+        "results": outcome["results"],
+        "chart_data": outcome["chart_data"],
+        "success": True,
+        "cache_hit": cache_hit,
+        "deduplicated": deduplicated
+    }
+
+def _batch_summary(results: list[dict], start_time: float) -> dict:
+    """Totals reported after a batch"""
+    return {
+        "total_execution_time": time.time() - start_time,
+        "successful_queries": sum(1 for r in results if r.get("success")),
+        "failed_queries": sum(1 for r in results if not r.get("success")),
+        "timestamp": time.time()
+    }
+
 @router.post("/query/stream")
 async def stream_query(request: QueryRequest):
-    """Stream query response with typing effect"""
+    """Stream the query pipeline as Server-Sent Events, forwarding LLM tokens as they arrive"""
+    return StreamingResponse(
+        stream_query_events(request),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering so tokens flush immediately
+        }
+    )
+
+async def stream_query_events(request: QueryRequest) -> AsyncGenerator[str, None]:
+    """Yield sql, results, chart, token and done events for a single question"""
+    start_time = time.time()
+    
     try:
-        # Generate SQL and get results first
-        sql_query = await mistral_service.generate_sql(request.question)
-        results = await db_manager.execute_query(sql_query)
-        response_text = await mistral_service.generate_response(
-            request.question, sql_query, results
-        )
+        query, params = await mistral_service.generate_query(request.question)
+        plan = await plan_service.review(query, params)
+        sql_query = inline_params(plan.query, plan.params)
+        yield _format_sse("sql", {"sql_query": sql_query, "query_plan": plan.to_dict(include_steps=False)})
+        
+        # Same buffered-row cap as /query (the answer and chart need the whole result)
+        results, truncated = await query_pipeline.execute(plan, question=request.question)
+        yield _format_sse("results", {
+            "results": results,
+            "count": len(results) if results else 0,
+            "truncated": truncated
+        })
         
-        return StreamingResponse(
-            stream_response(response_text),
-            media_type="text/plain",
-            headers={
-                "X-SQL-Query": sql_query[:200] + "..." if len(sql_query) > 200 else sql_query,
-                "X-Result-Count": str(len(results) if results else 0)
-            }
-        )
+        if request.include_chart:
+            chart_data = await asyncio.to_thread(chart_service.generate_chart_data, request.question, results)
+            yield _format_sse("chart", {"chart_data": chart_data})
+        
+        async for token in mistral_service.stream_response(request.question, sql_query, results):
+            yield _format_sse("token", {"text": token})
+        
+        yield _format_sse("done", {"execution_time": time.time() - start_time})
         
     except Exception as e:
+        # Headers are already sent, so failures are reported in-band
         logger.error(f"Error streaming query: {e}")
-        raise HTTPException(status_code=500, detail=f"Streaming failed: {str(e)}")
+        yield _format_sse("error", {
+            "error": ("Query timed out" if isinstance(e, QueryTimeoutError)
+                      else "Query too expensive" if isinstance(e, QueryCostError) else "Streaming failed"),
+            "detail": str(e),
+            "query_stats": e.stats() if isinstance(e, QueryTimeoutError) else None,
+            "query_plan": e.plan.to_dict(include_steps=False) if isinstance(e, QueryCostError) else None,
+            "suggestions": _get_error_suggestions(str(e))
+        })
 
-async def stream_response(text: str) -> AsyncGenerator[str, None]:
-    """Stream text with typing effect"""
-    for char in text:
-        yield char
-        await asyncio.sleep(0.02)  # Adjust speed as needed
+def _format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 @router.get("/query/examples")
 async def get_example_queries():
@@ -378,51 +559,104 @@ async def get_example_queries():
         "categories": list(examples.keys())
     }
 
+@router.get("/charts/templates/{template_id}")
+async def get_chart_template(template_id: str):
+    """Palette and Plotly layout a chart_data payload references by id (cacheable by clients)"""
+    template = await asyncio.to_thread(chart_service.layout_template, template_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail=f"Unknown chart template '{template_id}'")
+    return FastJSONResponse(content=template, headers={"Cache-Control": "public, max-age=86400"})
+
 @router.post("/sql/execute")
-async def execute_raw_sql(request: dict):
+async def execute_raw_sql(request: dict, http_request: Request, stream: bool = False):
     """Execute a raw SQL query with enhanced security and logging"""
     sql_query = request.get("sql_query", "")
     
     try:
-        # Enhanced SQL injection protection
-        dangerous_keywords = ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE', 'TRUNCATE', 'REPLACE']
-        query_upper = sql_query.upper().strip()
-        
-        for keyword in dangerous_keywords:
-            if keyword in query_upper:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Dangerous SQL keyword '{keyword}' not allowed for security reasons"
-                )
-        
-        # Limit query complexity
-        if len(sql_query) > 1000:
-            raise HTTPException(
-                status_code=400,
-                detail="Query too long. Maximum 1000 characters allowed."
-            )
+        _validate_raw_sql(sql_query)
         
+        if stream:
+            # One NDJSON line per row, read chunk by chunk, then a summary line
+            return StreamingResponse(_stream_sql_rows(sql_query), media_type="application/x-ndjson")
+        
+        max_rows = QUERY_RESULT_CONFIG["max_buffered_rows"]
         start_time = time.time()
-        results = await db_manager.execute_query(sql_query)
+        # Fetching one row past the cap tells whether anything was cut off
+        results = await _cancel_on_disconnect(http_request, db_manager.execute_query(sql_query, max_rows=max_rows + 1))
+        truncated = len(results) > max_rows
+        results = results[:max_rows]
         execution_time = time.time() - start_time
         
         # Log the execution for monitoring
         logger.info(f"Raw SQL executed in {execution_time:.2f}s: {sql_query[:100]}...")
         
-        return {
+        return FastJSONResponse({
             "sql_query": sql_query,
             "results": results,
             "count": len(results) if results else 0,
+            "truncated": truncated,
+            "max_rows": max_rows,
             "execution_time": execution_time,
             "timestamp": time.time()
-        }
+        })
         
     except HTTPException:
         raise
+    except QueryTimeoutError as e:
+        logger.error(f"Raw SQL timed out: {e}")
+        raise HTTPException(status_code=504, detail={"error": f"SQL execution timed out: {str(e)}", "query_stats": e.stats()})
     except Exception as e:
         logger.error(f"Error executing raw SQL: {e}")
         raise HTTPException(status_code=500, detail=f"SQL execution failed: {str(e)}")
 
+def _validate_raw_sql(sql_query: str):
+    """Reject write statements and overlong queries"""
+    # Enhanced SQL injection protection
+    dangerous_keywords = ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE', 'TRUNCATE', 'REPLACE']
+    query_upper = sql_query.upper().strip()
+    
+    for keyword in dangerous_keywords:
+        if keyword in query_upper:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Dangerous SQL keyword '{keyword}' not allowed for security reasons"
+            )
+    
+    # Limit query complexity
+    if len(sql_query) > 1000:
+        raise HTTPException(
+            status_code=400,
+            detail="Query too long. Maximum 1000 characters allowed."
+        )
+
+async def _stream_sql_rows(sql_query: str) -> AsyncGenerator[str, None]:
+    """Encode a query result as NDJSON rows; memory stays at one chunk regardless of result size"""
+    start_time = time.time()
+    rows = db_manager.stream_query(sql_query)
+    
+    try:
+        async for chunk in rows:
+            yield "".join(json.dumps(row, default=str) + "\n" for row in chunk)
+        
+        execution_time = time.time() - start_time
+        logger.info(f"Raw SQL streamed {rows.row_count} rows in {execution_time:.2f}s: {sql_query[:100]}...")
+        yield json.dumps({
+            "done": True,
+            "sql_query": sql_query,
+            "count": rows.row_count,
+            "truncated": rows.truncated,
+            "max_rows": rows.max_rows,
+            "execution_time": execution_time
+        }) + "\n"
+        
+    except Exception as e:
+        # Headers are already sent, so failures are reported in-band
+        logger.error(f"Error streaming raw SQL: {e}")
+        failure = {"done": True, "error": f"SQL execution failed: {str(e)}"}
+        if isinstance(e, QueryTimeoutError):
+            failure["query_stats"] = e.stats()
+        yield json.dumps(failure) + "\n"
+
 # Helper functions for enhanced features
 
 def _get_error_suggestions(error_message: str) -> list[str]:
@@ -438,38 +672,18 @@ def _get_error_suggestions(error_message: str) -> list[str]:
     elif "syntax error" in error_message.lower():
         suggestions.append("Check SQL syntax for typos")
         suggestions.append("Ensure proper use of quotes and parentheses")
+    elif "query rejected" in error_message.lower():
+        suggestions.append("Ask about fewer products or a shorter date range")
+        suggestions.append("Whole-history totals are answered from the rollup tables")
+    elif "query interrupted" in error_message.lower():
+        suggestions.append("Narrow the question to a product, metric or date range")
+        suggestions.append("Avoid joining the daily tables without matching item_id and date")
     else:
         suggestions.append("Try rephrasing your question")
         suggestions.append("Check the example queries for reference")
     
     return suggestions
 
-def _calculate_complexity_score(sql_query: str) -> int:
-    """Calculate a complexity score for the SQL query"""
-    score = 0
-    query_upper = sql_query.upper()
-    
-    # Basic complexity indicators
-    score += query_upper.count('JOIN') * 2
-    score += query_upper.count('SUBQUERY') * 3
-    score += query_upper.count('GROUP BY') * 1
-    score += query_upper.count('ORDER BY') * 1
-    score += query_upper.count('HAVING') * 2
-    score += len(sql_query) // 100  # Length factor
-    
-    return min(score, 10)  # Cap at 10
-
-def _estimate_performance(sql_query: str) -> str:
-    """Estimate query performance"""
-    complexity = _calculate_complexity_score(sql_query)
-    
-    if complexity <= 2:
-        return "Fast"
-    elif complexity <= 5:
-        return "Medium"
-    else:
-        return "Slow"
-
 def _get_optimization_suggestions(sql_query: str) -> list[str]:
     """Suggest query optimizations"""
     suggestions = []
@@ -53,11 +53,30 @@ MODELS_DIR = BASE_DIR / "models"
 DATABASE_URL = "sqlite:///./data/database/ecommerce_data.db"
 DATABASE_PATH = DATA_DIR / "database" / "ecommerce_data.db"
 
+# Connection pool: long-lived readers plus one writer, all in WAL mode
+DATABASE_POOL_CONFIG = {
+    "read_pool_size": 4,
+    "cached_statements": 256,  # Prepared statements kept per connection
+    "pragmas": {
+        "journal_mode": "WAL",  # Readers never block behind the writer
+        "synchronous": "NORMAL",  # Safe with WAL, far fewer fsyncs
+        "cache_size": -65536,  # Negative = KiB, i.e. 64 MB page cache per connection
+        "mmap_size": 268435456,  # 256 MB memory-mapped I/O
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000  # ms
+    }
+}
+
 # Data file paths - FIXED TO MATCH YOUR ACTUAL FILES
 ELIGIBILITY_FILE = DATA_DIR / "raw" / "Product-Level Eligibility Table (mapped).xlsx"
 AD_SALES_FILE = DATA_DIR / "raw" / "Product-Level Ad Sales and Metrics (mapped).xlsx"
 TOTAL_SALES_FILE = DATA_DIR / "raw" / "Product-Level Total Sales and Metrics (mapped).xlsx"
 
+# Excel ingestion: rows per executemany batch (bounds peak memory)
+INGEST_CONFIG = {
+    "chunk_size": 50000
+}
+
 # Mistral/Ollama configuration - ENHANCED
 MISTRAL_MODEL_PATH = MODELS_DIR / "mistral"
 OLLAMA_MODEL = "mistral:7b-instruct"
@@ -65,11 +84,75 @@ OLLAMA_API_URL = "http://localhost:11434/api/generate"  # NEW: Direct API endpoi
 OLLAMA_TEMPERATURE = 0.0  # NEW: For deterministic SQL generation
 OLLAMA_TIMEOUT = 30  # NEW: Request timeout in seconds
 
+# Shared async HTTP client for Ollama (created at startup, closed at shutdown)
+OLLAMA_CLIENT_CONFIG = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,  # seconds an idle connection is kept open
+    "connect_timeout": 5.0,
+    "read_timeout": OLLAMA_TIMEOUT
+}
+
 # API configuration
 MAX_QUERY_LENGTH = 1000
 STREAMING_CHUNK_SIZE = 1
 QUERY_TIMEOUT = 30
 
+# Per-statement limits, enforced from SQLite's progress handler
+QUERY_GUARD_CONFIG = {
+    "timeout": QUERY_TIMEOUT,  # Seconds per read query
+    "max_instructions": 1_000_000_000,  # SQLite VM instructions per read query
+    "progress_interval": 10000,  # VM instructions between handler calls
+    "disconnect_poll_interval": 0.5  # Seconds between client-disconnect checks
+}
+
+# Result size limits: buffered answers are capped, larger reads stream in chunks
+QUERY_RESULT_CONFIG = {
+    "chunk_size": 500,  # Rows per cursor fetch when streaming
+    "max_rows": 100000,  # Hard cap for streamed results
+    "max_buffered_rows": 1000  # Cap for results returned in one JSON body (query pipeline, /sql/execute)
+}
+
+# EXPLAIN QUERY PLAN cost guard for generated SQL (cost ~ rows visited, from table row counts)
+QUERY_COST_CONFIG = {
+    "enabled": True,
+    "rewrite_cost": 2_000_000,  # Above this, try a rollup table or a LIMIT first
+    "queue_cost": 10_000_000,  # Above this, run one expensive query at a time
+    "reject_cost": 500_000_000,  # Above this, refuse to run
+    "rewrite_limit": QUERY_RESULT_CONFIG["max_buffered_rows"] + 1,  # Same cap the pipeline applies anyway
+    "max_expensive_concurrency": 1
+}
+
+# Workload-driven index advisor (GET/POST /api/health/indexes)
+INDEX_ADVISOR_CONFIG = {
+    "record_workload": True,  # Count executions and latency per SQL shape
+    "max_shapes": 500,
+    "min_executions": 3,  # Shapes seen fewer times are not worth an index
+    "min_table_rows": 1000,  # Smaller tables (e.g. rollups) are scanned faster than an index helps
+    "top_shapes": 10,
+    "max_index_columns": 6,  # Wider covering indexes fall back to their key columns
+    "benchmark_runs": 5,  # Timed runs per query before and after creating an index
+    "min_improvement": 0.1  # Keep a created index only if median latency drops by at least 10%
+}
+
+# In-process NumPy copy of the metrics tables for dashboard aggregates (SQLite stays the source of truth)
+COLUMNAR_CONFIG = {
+    "enabled": True  # Needs NumPy; rebuilt after every data load
+}
+
+# Server-side downsampling of time series before they are sent to the browser
+DOWNSAMPLE_CONFIG = {
+    "mode": "lttb",  # "lttb" keeps visual shape; "minmax" keeps every bucket's extremes
+    "chart_points": 500,  # Target points per line chart
+    "trend_points": 1000,  # Target points per /metrics/trends series (overridable per request)
+    "max_points": 10000  # Upper bound a request may ask for
+}
+
+# Response serialization for the query and metrics routes (core/responses.py)
+JSON_RESPONSE_CONFIG = {
+    "encoder": "orjson"  # "orjson" (falls back to stdlib when not installed) or "stdlib"
+}
+
 # Logging configuration
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -133,5 +216,10 @@ PERFORMANCE_CONFIG = {
     "log_query_times": True,
     "slow_query_threshold": 5.0,  # seconds
     "enable_caching": True,
-    "cache_ttl": 300  # 5 minutes
+    "cache_ttl": 300,  # 5 minutes
+    "cache_max_entries": 256,
+    "result_cache_enabled": True,  # Opt-in per call: DatabaseManager.execute_query(..., cache=True)
+    "result_cache_max_bytes": 32 * 1024 * 1024,
+    "result_cache_max_entry_bytes": 4 * 1024 * 1024,
+    "batch_concurrency": 4  # Batch questions processed at once
 }
@@ -1,27 +1,543 @@
 import sqlite3
 import aiosqlite
 import asyncio
+import sys
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
 import logging
-from typing import List, Dict, Any
+import re
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterator
 
-from config import DATABASE_PATH
+from config import (DATABASE_PATH, DATABASE_POOL_CONFIG, PERFORMANCE_CONFIG, QUERY_RESULT_CONFIG,
+                    QUERY_GUARD_CONFIG, INDEX_ADVISOR_CONFIG)
 
 logger = logging.getLogger(__name__)
 
+class ConnectionPool:
+    """Bounded pool of long-lived read connections plus a single writer connection"""
+    
+    def __init__(self, db_path: str, size: int = None, pragmas: Dict[str, Any] = None):
+        self.db_path = db_path
+        self.size = size or DATABASE_POOL_CONFIG["read_pool_size"]
+        self.pragmas = pragmas or DATABASE_POOL_CONFIG["pragmas"]
+        # Per-connection prepared statement cache; template SQL text is stable, so it is reused
+        self.cached_statements = DATABASE_POOL_CONFIG.get("cached_statements", 128)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._all_readers: List[aiosqlite.Connection] = []
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self.data_version: Optional[int] = None
+    
+    async def open(self):
+        """Open the writer first (it switches the file to WAL), then the readers"""
+        # Set up synchronously so concurrent callers wait on the queue/lock instead of reopening
+        self.loop = asyncio.get_running_loop()
+        self._readers = asyncio.Queue()
+        self._write_lock = asyncio.Lock()
+        
+        async with self._write_lock:
+            self._writer = await self._connect(read_only=False)
+            self.data_version = await self._writer_data_version()
+        for _ in range(self.size):
+            conn = await self._connect(read_only=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+        
+        logger.info(f"Opened SQLite pool with {self.size} readers and 1 writer ({self.pragmas.get('journal_mode')} mode)")
+    
+    async def close(self):
+        """Close every pooled connection"""
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers = []
+        
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+    
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        """Open one connection and apply the tuned pragmas"""
+        conn = aiosqlite.connect(self.db_path, cached_statements=self.cached_statements)
+        # Pooled connections live for the whole process; never let them block interpreter exit
+        conn.daemon = True
+        conn = await conn
+        conn.row_factory = aiosqlite.Row
+        
+        for name, value in self.pragmas.items():
+            await conn.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            await conn.execute("PRAGMA query_only = ON")
+        
+        return conn
+    
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read connection, waiting if all are in use"""
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+    
+    async def changed_externally(self) -> bool:
+        """Whether another process has committed to the file since the last check.
+        
+        PRAGMA data_version on the writer only moves for commits made by other connections,
+        and our readers are query_only, so any change came from outside this pool.
+        """
+        if self._write_lock.locked():
+            # Our own write is in flight; the next check still sees anything committed meanwhile
+            return False
+        async with self._write_lock:
+            version = await self._writer_data_version()
+        changed = version != self.data_version
+        self.data_version = version
+        return changed
+    
+    async def _writer_data_version(self) -> int:
+        async with self._writer.execute("PRAGMA data_version") as cursor:
+            return (await cursor.fetchone())[0]
+    
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow the single writer; commits on success and rolls back on error"""
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+
+# One pool per database file, shared by every DatabaseManager instance
+_pools: Dict[str, ConnectionPool] = {}
+
+# Shadow reloads build `<table>__staging`, then swap it in by rename
+SHADOW_SUFFIX = "__staging"
+RETIRED_SUFFIX = "__old"
+# Index names cannot be renamed, so a shadow copy's indexes alternate between `name` and `name__alt`
+ALT_INDEX_SUFFIX = "__alt"
+
+# Rollup columns: (name, type, aggregate over the daily source rows)
+_AD_ROLLUP_SUMS = [
+    ("ad_sales", "REAL", "SUM(ad_sales)"),
+    ("impressions", "INTEGER", "SUM(impressions)"),
+    ("ad_spend", "REAL", "SUM(ad_spend)"),
+    ("clicks", "INTEGER", "SUM(clicks)"),
+    ("units_sold", "INTEGER", "SUM(units_sold)"),
+    ("row_count", "INTEGER", "COUNT(*)"),
+    # Filtered sums so ratio metrics keep their row filters (e.g. ROAS only over rows with spend)
+    ("roas_ad_sales", "REAL", "SUM(CASE WHEN ad_spend > 0 THEN ad_sales END)"),
+    ("roas_ad_spend", "REAL", "SUM(CASE WHEN ad_spend > 0 THEN ad_spend END)"),
+    ("cpc_ad_spend", "REAL", "SUM(CASE WHEN clicks > 0 THEN ad_spend END)"),
+    ("cpc_clicks", "INTEGER", "SUM(CASE WHEN clicks > 0 THEN clicks END)"),
+    ("cvr_units_sold", "INTEGER", "SUM(CASE WHEN clicks > 0 THEN units_sold END)"),
+    ("ctr_impressions", "INTEGER", "SUM(CASE WHEN impressions > 0 THEN impressions END)"),
+    ("ctr_clicks", "INTEGER", "SUM(CASE WHEN impressions > 0 THEN clicks END)")
+]
+
+_TOTAL_ROLLUP_SUMS = [
+    ("total_sales", "REAL", "SUM(total_sales)"),
+    ("total_units_ordered", "INTEGER", "SUM(total_units_ordered)"),
+    ("row_count", "INTEGER", "COUNT(*)")
+]
+
+# Grain: (suffix, key columns as (name, type, expression))
+_ROLLUP_GRAINS = [
+    ("by_item", [("item_id", "INTEGER", "item_id")]),
+    ("by_day", [("date", "TEXT", "date")]),
+    ("by_item_month", [("item_id", "INTEGER", "item_id"), ("month", "TEXT", "substr(date, 1, 7)")])
+]
+
+def _build_rollups() -> Dict[str, Dict[str, str]]:
+    """Rollup table -> source table, CREATE statement and SELECT (with a `{source}` placeholder)"""
+    rollups = {}
+    for prefix, source, sums in [("ad_sales", "ad_sales_metrics", _AD_ROLLUP_SUMS),
+                                 ("total_sales", "total_sales_metrics", _TOTAL_ROLLUP_SUMS)]:
+        for grain, keys in _ROLLUP_GRAINS:
+            name = f"{prefix}_{grain}"
+            columns = keys + sums
+            key_names = ", ".join(column for column, _, _ in keys)
+            rollups[name] = {
+                "source": source,
+                "create_sql": (
+                    f"CREATE TABLE IF NOT EXISTS {name} ("
+                    + ", ".join(f"{column} {col_type}" for column, col_type, _ in columns)
+                    + f", PRIMARY KEY ({key_names}))"
+                ),
+                "select_sql": (
+                    "SELECT " + ", ".join(f"{expr} as {column}" for column, _, expr in columns)
+                    + " FROM {source} GROUP BY " + ", ".join(expr for _, _, expr in keys)
+                )
+            }
+    return rollups
+
+# Per-item, per-day and per-item-per-month sums, rebuilt in the same swap as their source table
+ROLLUPS = _build_rollups()
+
+def _row_measures(sums: List[tuple]) -> Dict[str, str]:
+    """Rollup column -> per-row expression over the source table (what each SUM adds up)"""
+    measures = {}
+    for column, _, expr in sums:
+        measures[column] = expr[len("SUM("):-1] if expr.startswith("SUM(") else "1"
+    return measures
+
+# Summing a measure over a rollup or its expression over the source rows gives the same value
+ROLLUP_MEASURES = {
+    "ad_sales_metrics": _row_measures(_AD_ROLLUP_SUMS),
+    "total_sales_metrics": _row_measures(_TOTAL_ROLLUP_SUMS)
+}
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+# Optionally schema-qualified, optionally quoted table name
+_IDENTIFIER = r'(?:"(?:[^"]|"")+"|`[^`]+`|\[[^\]]+\]|[a-z_][a-z0-9_$]*)'
+_TABLE_NAME = rf"(?:{_IDENTIFIER}\s*\.\s*)?({_IDENTIFIER})"
+_TABLE_REFERENCE = re.compile(rf"\b(?:from|join|into|update|table(?:\s+if\s+(?:not\s+)?exists)?)\s+{_TABLE_NAME}")
+_FROM_CLAUSE = re.compile(r"\bfrom\s+([^()]+?)(?=\b(?:where|group|order|limit|having|window|union|except|intersect|on|using)\b|[()]|$)")
+_COMMA_JOIN = re.compile(rf",\s*{_TABLE_NAME}")
+_SCHEMA_CHANGE = re.compile(r"^(?:create|drop|alter)\b")
+
+def canonicalize_sql(query: str) -> str:
+    """Whitespace/case-insensitive form of a statement; string literals are kept verbatim"""
+    parts = _STRING_LITERAL.split(query.strip().rstrip(";"))
+    for i in range(0, len(parts), 2):
+        parts[i] = " ".join(parts[i].lower().split())
+    return "".join(parts).strip()
+
+def _unquote(identifier: str) -> str:
+    if identifier[:1] in ('"', '`', '['):
+        return identifier[1:-1].replace('""', '"')
+    return identifier
+
+def referenced_tables(canonical_sql: str) -> List[str]:
+    """Tables a canonicalized statement names (FROM/JOIN/INTO/UPDATE/TABLE and comma joins).
+    
+    Used for writes and workload shapes; cached reads take their tables from the bytecode
+    instead (DatabaseManager.read_tables). DDL also touches sqlite_master.
+    """
+    sql = _STRING_LITERAL.sub("''", canonical_sql)
+    names = _TABLE_REFERENCE.findall(sql)
+    for clause in _FROM_CLAUSE.findall(sql):
+        names.extend(_COMMA_JOIN.findall(clause))
+    tables = {_unquote(name) for name in names}
+    if _SCHEMA_CHANGE.match(sql):
+        tables.add("sqlite_master")
+    return sorted(tables)
+
+# Version key every cached result and columnar snapshot depends on; bumped when another process writes
+ANY_TABLE = "*"
+
+class ResultCache:
+    """Memory-bounded LRU of query results, each tagged with the versions of the tables it read"""
+    
+    def __init__(self, max_bytes: int = None, max_entry_bytes: int = None):
+        self.max_bytes = max_bytes or PERFORMANCE_CONFIG.get("result_cache_max_bytes", 32 * 1024 * 1024)
+        self.max_entry_bytes = max_entry_bytes or PERFORMANCE_CONFIG.get("result_cache_max_entry_bytes", self.max_bytes // 8)
+        self.enabled = PERFORMANCE_CONFIG.get("result_cache_enabled", True)
+        self.table_versions: Dict[str, int] = {}
+        # key -> (table versions when the query started, rows, estimated bytes)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def key(self, query: str, params: tuple = None, max_rows: int = None) -> tuple:
+        return canonicalize_sql(query), tuple(params or ()), max_rows
+    
+    def versions(self, tables: List[str], at: Dict[str, int] = None) -> Dict[str, int]:
+        """Versions of `tables` (plus ANY_TABLE), now or in an earlier `capture()`"""
+        at = self.table_versions if at is None else at
+        return {table: at.get(table, 0) for table in [*tables, ANY_TABLE]}
+    
+    def capture(self) -> Dict[str, int]:
+        """Every table version right now, taken before a read whose tables are not known yet"""
+        return dict(self.table_versions)
+    
+    def is_current(self, versions: Dict[str, int]) -> bool:
+        return versions == self.versions([table for table in versions if table != ANY_TABLE])
+    
+    def get(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        versions, rows, size = entry
+        if not self.is_current(versions):
+            # A table it read has been reloaded since
+            self._drop(key)
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return [dict(row) for row in rows]  # Callers may mutate their rows
+    
+    def set(self, key: tuple, versions: Dict[str, int], rows: List[Dict[str, Any]]):
+        """Store rows read at `versions` (captured before the query ran, so a racing reload wins)"""
+        size = self._estimate_size(rows)
+        if size > self.max_entry_bytes:
+            return
+        
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (versions, [dict(row) for row in rows], size)
+        self.bytes += size
+        
+        while self.bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+    
+    def bump(self, tables: List[str]):
+        """Advance table versions; entries that read them stop matching"""
+        for table in tables:
+            self.table_versions[table] = self.table_versions.get(table, 0) + 1
+    
+    def invalidate(self):
+        """Another process changed the file in an unknown way: nothing cached can be trusted"""
+        self.bump([ANY_TABLE])
+        self._entries.clear()
+        self.bytes = 0
+    
+    def _drop(self, key: tuple):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+    
+    @staticmethod
+    def _estimate_size(rows: List[Dict[str, Any]]) -> int:
+        """Rough deep size of a result set: dict overhead plus each value"""
+        size = sys.getsizeof(rows)
+        for row in rows:
+            size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+        return size
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio and memory use for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "table_versions": dict(self.table_versions)
+        }
+
+# Shared by every DatabaseManager instance, like the pools
+result_cache = ResultCache()
+
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_UNRECORDED = re.compile(r"^(?:explain|pragma)\b|\bsqlite_master\b")
+
+@lru_cache(maxsize=1024)
+def query_shape(query: str) -> str:
+    """Canonical statement with literals replaced by `?` and IN lists collapsed, so template and LLM SQL group alike"""
+    shape = _STRING_LITERAL.sub("?", canonicalize_sql(query))
+    return _IN_LIST.sub("in (?)", _NUMBER_LITERAL.sub("?", shape))
+
+class QueryWorkload:
+    """Execution counts and latency per statement shape, kept for the index advisor"""
+    
+    def __init__(self, max_shapes: int = None):
+        self.enabled = INDEX_ADVISOR_CONFIG.get("record_workload", True)
+        self.max_shapes = max_shapes or INDEX_ADVISOR_CONFIG["max_shapes"]
+        # shape -> {"count", "total_time", "max_time", "example": (query, params)}
+        self._shapes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    
+    def record(self, query: str, params: tuple, elapsed: float):
+        if not self.enabled:
+            return
+        shape = query_shape(query)
+        if _UNRECORDED.search(shape):
+            return
+        
+        entry = self._shapes.get(shape)
+        if entry is None:
+            entry = self._shapes[shape] = {"count": 0, "total_time": 0.0, "max_time": 0.0}
+            if len(self._shapes) > self.max_shapes:
+                self._shapes.popitem(last=False)
+        else:
+            self._shapes.move_to_end(shape)
+        entry["count"] += 1
+        entry["total_time"] += elapsed
+        entry["max_time"] = max(entry["max_time"], elapsed)
+        entry["example"] = (query, tuple(params or ()))
+    
+    def top(self, limit: int = None, min_count: int = 1) -> List[Dict[str, Any]]:
+        """Shapes by total time spent, most expensive first"""
+        shapes = [{"shape": shape, **entry} for shape, entry in self._shapes.items() if entry["count"] >= min_count]
+        shapes.sort(key=lambda entry: entry["total_time"], reverse=True)
+        return shapes[:limit] if limit else shapes
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "shapes": len(self._shapes),
+            "executions": sum(entry["count"] for entry in self._shapes.values())
+        }
+
+query_workload = QueryWorkload()
+
+class QueryTimeoutError(Exception):
+    """A read query ran past its deadline or VM-instruction budget and was interrupted"""
+    
+    def __init__(self, query: str, reason: str, elapsed: float, instructions: int, rows_read: int):
+        self.query = query
+        self.reason = reason
+        self.elapsed = elapsed
+        self.instructions = instructions
+        self.rows_read = rows_read
+        super().__init__(
+            f"Query interrupted ({reason}) after {elapsed:.2f}s, "
+            f"~{instructions:,} VM instructions, {rows_read} rows read"
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        """Work done before the interrupt"""
+        return {
+            "reason": self.reason,
+            "elapsed": self.elapsed,
+            "vm_instructions": self.instructions,
+            "rows_read": self.rows_read
+        }
+
+class QueryGuard:
+    """Deadline and instruction budget for one statement; SQLite calls check() every `interval` VM steps"""
+    
+    def __init__(self, timeout: float = None, max_instructions: int = None):
+        self.timeout = timeout or QUERY_GUARD_CONFIG["timeout"]
+        self.max_instructions = max_instructions or QUERY_GUARD_CONFIG["max_instructions"]
+        self.interval = QUERY_GUARD_CONFIG["progress_interval"]
+        self.started = time.monotonic()
+        self.deadline = self.started + self.timeout
+        self.instructions = 0
+        self.rows_read = 0
+        self.cancelled = False
+        self.reason: Optional[str] = None
+    
+    def check(self) -> int:
+        """Progress handler: a non-zero return makes SQLite abort the statement"""
+        self.instructions += self.interval
+        if self.cancelled:
+            self.reason = "cancelled"
+        elif self.instructions > self.max_instructions:
+            self.reason = "instruction budget exceeded"
+        elif time.monotonic() > self.deadline:
+            self.reason = "deadline exceeded"
+        return 1 if self.reason else 0
+    
+    def restart_deadline(self):
+        """Give the next step a full timeout, e.g. each fetch of a stream (the consumer's pauses do not count)"""
+        self.deadline = time.monotonic() + self.timeout
+    
+    def timeout_error(self, query: str) -> QueryTimeoutError:
+        return QueryTimeoutError(query, self.reason, time.monotonic() - self.started,
+                                 self.instructions, self.rows_read)
+
+@asynccontextmanager
+async def _guarded(db: aiosqlite.Connection, query: str, timeout: float = None) -> AsyncIterator[QueryGuard]:
+    """Run one read statement under a fresh QueryGuard.
+    
+    The handler is installed through the connection's queue, so it applies exactly to the
+    statement that follows, and removed afterwards so an expired guard never aborts later,
+    unguarded statements on the pooled connection. Cancelling the awaiting task interrupts the statement.
+    """
+    guard = QueryGuard(timeout)
+    await db.set_progress_handler(guard.check, guard.interval)
+    try:
+        yield guard
+    except sqlite3.OperationalError as e:
+        if guard.reason and guard.reason != "cancelled":
+            raise guard.timeout_error(query) from e
+        raise
+    except asyncio.CancelledError:
+        # The worker thread would otherwise keep running the statement after we stop waiting
+        guard.cancelled = True
+        await db.interrupt()
+        raise
+    finally:
+        await db.set_progress_handler(None, 0)
+
+class QueryStream:
+    """Async iterator over row chunks of one query, read on a pooled connection held for the duration.
+    
+    Stops after `max_rows`; `truncated` tells whether more rows were left unread. The timeout
+    applies to each fetch, so a slow consumer is not mistaken for a slow query.
+    """
+    
+    def __init__(self, manager: "DatabaseManager", query: str, params: tuple = None,
+                 chunk_size: int = None, max_rows: int = None, timeout: float = None):
+        self.manager = manager
+        self.query = query
+        self.params = params or ()
+        self.chunk_size = chunk_size or QUERY_RESULT_CONFIG["chunk_size"]
+        self.max_rows = max_rows or QUERY_RESULT_CONFIG["max_rows"]
+        self.timeout = timeout
+        self.row_count = 0
+        self.truncated = False
+        self.columns: List[str] = []
+    
+    async def __aiter__(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        pool = await self.manager._get_pool()
+        start = time.perf_counter()
+        async with pool.reader() as db, _guarded(db, self.query, self.timeout) as guard:
+            async with db.execute(self.query, self.params) as cursor:
+                self.columns = [column[0] for column in cursor.description or []]
+                while self.row_count < self.max_rows:
+                    guard.restart_deadline()
+                    rows = await cursor.fetchmany(min(self.chunk_size, self.max_rows - self.row_count))
+                    if not rows:
+                        break
+                    self.row_count += len(rows)
+                    guard.rows_read = self.row_count
+                    yield [dict(row) for row in rows]
+                else:
+                    # Cap reached: one more fetch tells whether anything was cut off
+                    guard.restart_deadline()
+                    self.truncated = bool(await cursor.fetchmany(1))
+        query_workload.record(self.query, self.params, time.perf_counter() - start)
+
 class DatabaseManager:
     def __init__(self, db_path: str = None):
         self.db_path = db_path or str(DATABASE_PATH)
         
     async def initialize(self):
-        """Initialize database and create tables"""
+        """Initialize database, create tables and open the connection pool"""
         # Ensure directory exists
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         
-        async with aiosqlite.connect(self.db_path) as db:
+        pool = await self._get_pool()
+        async with pool.writer() as db:
             await self._create_tables(db)
-            await db.commit()
-            logger.info("Database initialized successfully")
+        logger.info("Database initialized successfully")
+    
+    async def close(self):
+        """Close the shared connection pool for this database"""
+        pool = _pools.pop(self.db_path, None)
+        if pool is not None:
+            await pool.close()
+    
+    async def _get_pool(self) -> ConnectionPool:
+        """Return the shared pool, opening it on first use or after an event loop change"""
+        pool = _pools.get(self.db_path)
+        if pool is None or pool.loop is not asyncio.get_running_loop():
+            pool = ConnectionPool(self.db_path)
+            _pools[self.db_path] = pool
+            try:
+                await pool.open()
+            except Exception:
+                _pools.pop(self.db_path, None)
+                raise
+        return pool
     
     async def _create_tables(self, db):
         """Create all necessary tables"""
@@ -63,40 +579,362 @@ class DatabaseManager:
         """)
         
         # Create indexes for better performance
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_eligibility_item ON product_eligibility(item_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_ad_sales_item ON ad_sales_metrics(item_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_ad_sales_date ON ad_sales_metrics(date)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_total_sales_item ON total_sales_metrics(item_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_total_sales_date ON total_sales_metrics(date)")
-    
-    async def execute_query(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
-        """Execute a query and return results"""
+        await self._ensure_index(db, "idx_eligibility_item", "product_eligibility", "item_id")
+        await self._ensure_index(db, "idx_ad_sales_item", "ad_sales_metrics", "item_id")
+        await self._ensure_index(db, "idx_ad_sales_date", "ad_sales_metrics", "date")
+        await self._ensure_index(db, "idx_total_sales_item", "total_sales_metrics", "item_id")
+        await self._ensure_index(db, "idx_total_sales_date", "total_sales_metrics", "date")
+        
+        # Rollup tables maintained at ingest time
+        for rollup in ROLLUPS.values():
+            await db.execute(rollup["create_sql"])
+        
+        # Ingest manifest: fingerprint of the source file each table was last loaded from
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_manifest (
+                source TEXT PRIMARY KEY,
+                table_name TEXT,
+                sha256 TEXT,
+                size INTEGER,
+                mtime REAL,
+                row_count INTEGER,
+                loaded_at TEXT
+            )
+        """)
+    
+    async def _ensure_index(self, db, name: str, table: str, columns: str):
+        """CREATE INDEX IF NOT EXISTS that also accepts the alternate name left by a shadow reload"""
+        cursor = await db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name IN (?, ?)",
+            (name, name + ALT_INDEX_SUFFIX)
+        )
+        if await cursor.fetchone() is None:
+            await db.execute(f"CREATE INDEX {name} ON {table}({columns})")
+    
+    async def execute_query(self, query: str, params: tuple = None,
+                            connection: aiosqlite.Connection = None, cache: bool = False,
+                            max_rows: int = None, timeout: float = None) -> List[Dict[str, Any]]:
+        """Execute a read-only query on a pooled connection (or a held snapshot) and return results.
+        
+        With cache=True, results are reused until a table the query reads is reloaded, or until
+        another process writes to the database file.
+        Snapshot reads bypass the cache since it always serves the latest table versions.
+        With max_rows, only that many rows are fetched from the cursor.
+        Raises QueryTimeoutError past the deadline (QUERY_GUARD_CONFIG, or `timeout`) or instruction budget.
+        """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                if params:
-                    cursor = await db.execute(query, params)
-                else:
-                    cursor = await db.execute(query)
-                
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+            if connection is not None:
+                return await self._fetch_all(connection, query, params, max_rows, timeout)
+            
+            pool = await self._get_pool()
+            if cache and result_cache.enabled:
+                await self.check_external_writes()
+                key = result_cache.key(query, params, max_rows)
+                cached = result_cache.get(key)
+                if cached is not None:
+                    return cached
+                versions = result_cache.capture()
+            
+            async with pool.reader() as db:
+                rows = await self._fetch_all(db, query, params, max_rows, timeout)
+                if cache and result_cache.enabled:
+                    tables = await self.read_tables(db, query, params)
+            
+            if cache and result_cache.enabled:
+                result_cache.set(key, result_cache.versions(tables, at=versions), rows)
+            return rows
                 
         except Exception as e:
             logger.error(f"Database query error: {e}")
             raise
     
+    async def _fetch_all(self, db: aiosqlite.Connection, query: str, params: tuple = None,
+                         max_rows: int = None, timeout: float = None) -> List[Dict[str, Any]]:
+        """Run a guarded query on a specific connection and return (at most `max_rows`) rows as dicts"""
+        start = time.perf_counter()
+        async with _guarded(db, query, timeout):
+            async with db.execute(query, params or ()) as cursor:
+                rows = await (cursor.fetchmany(max_rows) if max_rows else cursor.fetchall())
+        query_workload.record(query, params, time.perf_counter() - start)
+        return [dict(row) for row in rows]
+    
+    async def check_external_writes(self) -> bool:
+        """Invalidate every cached result (and the columnar snapshot) if another process wrote to the file"""
+        pool = await self._get_pool()
+        if await pool.changed_externally():
+            logger.info("Database changed by another process, invalidating cached results")
+            result_cache.invalidate()
+            return True
+        return False
+    
+    async def read_tables(self, db: aiosqlite.Connection, query: str, params: tuple = None) -> List[str]:
+        """Tables a statement reads, from the OpenRead root pages in its bytecode.
+        
+        Covers views, comma joins, quoted and schema-qualified names; an index read counts as
+        a read of its table. Page 1 is sqlite_master itself.
+        """
+        # Same stale-statement-cache caveat as _explain
+        async with db.execute("PRAGMA schema_version") as cursor:
+            version = (await cursor.fetchone())[0]
+        async with db.execute(f"EXPLAIN /* schema {version} */ {query}", params or ()) as cursor:
+            pages = {row["p2"] for row in await cursor.fetchall() if row["opcode"] == "OpenRead" and row["p3"] == 0}
+        async with db.execute("SELECT rootpage, tbl_name FROM sqlite_master WHERE rootpage > 0") as cursor:
+            owners = {row[0]: row[1] for row in await cursor.fetchall()}
+        return sorted({owners.get(page, "sqlite_master") for page in pages})
+    
+    def stream_query(self, query: str, params: tuple = None, chunk_size: int = None,
+                     max_rows: int = None, timeout: float = None) -> QueryStream:
+        """Iterate a large result in chunks instead of materializing it (see QueryStream)"""
+        return QueryStream(self, query, params, chunk_size, max_rows, timeout)
+    
+    async def explain(self, query: str, params: tuple = None,
+                      connection: aiosqlite.Connection = None) -> List[Dict[str, Any]]:
+        """EXPLAIN QUERY PLAN rows (id, parent, detail) on a pooled connection or a held snapshot"""
+        if connection is not None:
+            return await self._explain(connection, query, params)
+        pool = await self._get_pool()
+        async with pool.reader() as db:
+            return await self._explain(db, query, params)
+    
+    async def _explain(self, db: aiosqlite.Connection, query: str, params: tuple = None) -> List[Dict[str, Any]]:
+        # A cached EXPLAIN statement is never re-prepared after a schema change (new index, shadow swap),
+        # so the schema version goes into the statement text
+        async with db.execute("PRAGMA schema_version") as cursor:
+            version = (await cursor.fetchone())[0]
+        async with db.execute(f"EXPLAIN QUERY PLAN /* schema {version} */ {query}", params or ()) as cursor:
+            return [{"id": row["id"], "parent": row["parent"], "detail": row["detail"]} for row in await cursor.fetchall()]
+    
+    async def benchmark(self, query: str, params: tuple = None, runs: int = 5) -> Dict[str, Any]:
+        """Median latency of `runs` executions on one reader, plus the plan; not recorded in the workload"""
+        pool = await self._get_pool()
+        timings = []
+        async with pool.reader() as db:
+            for _ in range(runs):
+                start = time.perf_counter()
+                async with _guarded(db, query):
+                    async with db.execute(query, params or ()) as cursor:
+                        await cursor.fetchall()
+                timings.append(time.perf_counter() - start)
+            plan = [step["detail"] for step in await self._explain(db, query, params)]
+        timings.sort()
+        return {"median": timings[len(timings) // 2], "plan": plan}
+    
+    @asynccontextmanager
+    async def snapshot(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Hold one reader inside a read transaction so every query sees the same data version"""
+        pool = await self._get_pool()
+        async with pool.reader() as db:
+            await db.execute("BEGIN")
+            try:
+                # WAL pins the snapshot at the first read, not at BEGIN
+                await self._fetch_all(db, "SELECT 1 FROM sqlite_master LIMIT 1")
+                yield db
+            finally:
+                await db.rollback()
+    
+    async def execute_write(self, query: str, params: tuple = None):
+        """Execute a single write statement on the writer connection"""
+        try:
+            pool = await self._get_pool()
+            async with pool.writer() as db:
+                await db.execute(query, params or ())
+            result_cache.bump(referenced_tables(canonicalize_sql(query)))
+                
+        except Exception as e:
+            logger.error(f"Database write error: {e}")
+            raise
+    
     async def execute_many(self, query: str, data: List[tuple]):
         """Execute many queries with data"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            pool = await self._get_pool()
+            async with pool.writer() as db:
                 await db.executemany(query, data)
-                await db.commit()
+            result_cache.bump(referenced_tables(canonicalize_sql(query)))
                 
         except Exception as e:
             logger.error(f"Database executemany error: {e}")
             raise
     
+    async def bulk_insert(self, query: str, batches: Iterator[List[tuple]], setup: List[str] = None) -> int:
+        """Insert row batches in a single writer transaction and return the row count.
+        
+        Batches are pulled in a worker thread so file parsing never blocks the event loop.
+        Statements in `setup` (e.g. clearing the table) run first, in the same transaction.
+        """
+        try:
+            pool = await self._get_pool()
+            async with pool.writer() as db:
+                for statement in setup or []:
+                    await db.execute(statement)
+                count = await self._insert_batches(db, query, batches)
+            
+            for statement in [query] + list(setup or []):
+                result_cache.bump(referenced_tables(canonicalize_sql(statement)))
+            return count
+            
+        except Exception as e:
+            logger.error(f"Database bulk insert error: {e}")
+            raise
+        
+        finally:
+            self._close_batches(batches)
+    
+    async def replace_table(self, table: str, columns: List[str], batches: Iterator[List[tuple]]) -> int:
+        """Atomically replace a table's contents via a shadow copy and return the row count.
+        
+        Rows are loaded into `<table>__staging` and indexed there, and the table's rollups are
+        rebuilt from that copy. Everything is then swapped in with renames in one short
+        transaction, so readers only ever see the complete old snapshot or the complete new one.
+        """
+        staging = table + SHADOW_SUFFIX
+        placeholders = ", ".join("?" for _ in columns)
+        insert_query = f"INSERT OR REPLACE INTO {staging} ({', '.join(columns)}) VALUES ({placeholders})"
+        
+        try:
+            pool = await self._get_pool()
+            async with pool.writer() as db:
+                tables = [table] + self._rollups_for(table)
+                index_sql = await self._create_shadows(db, tables)
+                
+                total = await self._insert_batches(db, insert_query, batches)
+                await self._fill_rollup_shadows(db, table, source=staging)
+                await db.commit()
+                
+                await self._swap_shadows(db, tables, index_sql)
+            
+            logger.info(f"Swapped in new {table} snapshot ({total} rows)")
+            return total
+            
+        except Exception as e:
+            logger.error(f"Database table replace error for {table}: {e}")
+            raise
+        
+        finally:
+            self._close_batches(batches)
+    
+    async def refresh_rollups(self, table: str):
+        """Rebuild every rollup of `table` from its live contents and swap them in atomically"""
+        try:
+            pool = await self._get_pool()
+            async with pool.writer() as db:
+                rollups = self._rollups_for(table)
+                index_sql = await self._create_shadows(db, rollups)
+                await self._fill_rollup_shadows(db, table, source=table)
+                await db.commit()
+                await self._swap_shadows(db, rollups, index_sql)
+            
+            logger.info(f"Rebuilt rollups for {table}")
+            
+        except Exception as e:
+            logger.error(f"Database rollup refresh error for {table}: {e}")
+            raise
+    
+    async def ensure_rollups(self, table: str):
+        """Build the rollups of `table` if they are empty while the table has data (e.g. after upgrading)"""
+        source = await self.execute_query(f"SELECT EXISTS (SELECT 1 FROM {table}) as has_rows")
+        if not source[0]['has_rows']:
+            return
+        
+        for rollup in self._rollups_for(table):
+            result = await self.execute_query(f"SELECT EXISTS (SELECT 1 FROM {rollup}) as has_rows")
+            if not result[0]['has_rows']:
+                await self.refresh_rollups(table)
+                return
+    
+    def _rollups_for(self, table: str) -> List[str]:
+        """Rollup tables computed from `table`"""
+        return [name for name, rollup in ROLLUPS.items() if rollup["source"] == table]
+    
+    async def _create_shadows(self, db, tables: List[str]) -> List[str]:
+        """Create empty `__staging` copies of `tables` and return the statements to index them"""
+        index_sql = []
+        for table in tables:
+            staging = table + SHADOW_SUFFIX
+            table_sql, table_index_sql = await self._shadow_schema(db, table, staging)
+            
+            # Leftovers from an interrupted reload
+            await db.execute(f"DROP TABLE IF EXISTS {staging}")
+            await db.execute(f"DROP TABLE IF EXISTS {table}{RETIRED_SUFFIX}")
+            
+            await db.execute(table_sql)
+            index_sql.extend(table_index_sql)
+        return index_sql
+    
+    async def _fill_rollup_shadows(self, db, table: str, source: str):
+        """Populate the staging copy of each rollup of `table` by aggregating `source`"""
+        for name in self._rollups_for(table):
+            await db.execute(
+                f"INSERT INTO {name}{SHADOW_SUFFIX} " + ROLLUPS[name]["select_sql"].format(source=source)
+            )
+    
+    async def _swap_shadows(self, db, tables: List[str], index_sql: List[str]):
+        """Index the staging copies, swap them in by rename in one transaction, then drop the old tables"""
+        # Index after the bulk load, which is much cheaper than maintaining indexes per row
+        for statement in index_sql:
+            await db.execute(statement)
+        
+        await db.execute("BEGIN IMMEDIATE")
+        for table in tables:
+            await db.execute(f"ALTER TABLE {table} RENAME TO {table}{RETIRED_SUFFIX}")
+            await db.execute(f"ALTER TABLE {table}{SHADOW_SUFFIX} RENAME TO {table}")
+        await db.commit()
+        result_cache.bump(tables + ["sqlite_master"])
+        
+        # Dropping is proportional to table size, so keep it out of the swap transaction
+        for table in tables:
+            await db.execute(f"DROP TABLE {table}{RETIRED_SUFFIX}")
+    
+    async def _shadow_schema(self, db, table: str, staging: str) -> tuple:
+        """CREATE statements for a shadow copy of `table`, including all of its indexes"""
+        cursor = await db.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        )
+        row = await cursor.fetchone()
+        if row is None:
+            raise ValueError(f"Unknown table: {table}")
+        
+        table_sql = re.sub(
+            r'^\s*CREATE TABLE\s+(IF NOT EXISTS\s+)?"?' + re.escape(table) + r'"?',
+            f"CREATE TABLE {staging}", row[0], count=1, flags=re.IGNORECASE
+        )
+        
+        # Copy explicit indexes (sql is NULL for the primary key's autoindex)
+        cursor = await db.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (table,)
+        )
+        index_sql = []
+        for name, sql in await cursor.fetchall():
+            if name.endswith(ALT_INDEX_SUFFIX):
+                shadow_name = name[:-len(ALT_INDEX_SUFFIX)]
+            else:
+                shadow_name = name + ALT_INDEX_SUFFIX
+            index_sql.append(re.sub(
+                r'^\s*CREATE\s+(UNIQUE\s+)?INDEX\s+(IF NOT EXISTS\s+)?"?\w+"?\s+ON\s+"?\w+"?',
+                lambda m: f"CREATE {m.group(1) or ''}INDEX {shadow_name} ON {staging}",
+                sql, count=1, flags=re.IGNORECASE
+            ))
+        
+        return table_sql, index_sql
+    
+    async def _insert_batches(self, db, query: str, batches: Iterator[List[tuple]]) -> int:
+        """executemany each batch, pulling batches in a worker thread"""
+        total = 0
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            await db.executemany(query, batch)
+            total += len(batch)
+        return total
+    
+    def _close_batches(self, batches: Iterator[List[tuple]]):
+        """Release the batch source (e.g. an open workbook) even if loading failed"""
+        close = getattr(batches, "close", None)
+        if close is not None:
+            close()
+    
     async def get_table_schema(self, table_name: str) -> List[Dict[str, Any]]:
         """Get schema information for a table"""
         query = f"PRAGMA table_info({table_name})"
@@ -30,6 +30,7 @@ class MetricsSummary(BaseModel):
     eligible_products: Optional[int] = 0
     total_products: Optional[int] = 0
     top_performing_product: Optional[str] = None
+    query_timings: Optional[dict[str, float]] = None  # Seconds per sub-query
 
 class ProductEligibility(BaseModel):
     eligibility_datetime_utc: str
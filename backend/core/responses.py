@@ -0,0 +1,81 @@
+import json
+import logging
+import math
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib encoder is used instead
+    orjson = None
+
+from config import JSON_RESPONSE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def _default(value: Any) -> Any:
+    """Fallback for values neither encoder handles natively (NumPy scalars, Decimal, sets, models)"""
+    if hasattr(value, "item") and callable(value.item) and getattr(value, "shape", None) == ():
+        return value.item()  # NumPy scalar
+    if hasattr(value, "tolist"):
+        return value.tolist()  # NumPy array
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+def _orjson_dumps(content: Any) -> bytes:
+    # NaN/Infinity become null instead of failing the response
+    return orjson.dumps(content, default=_default,
+                        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+def _finite(value: Any) -> Any:
+    """`value` with NaN/Infinity floats replaced by None, as orjson writes them"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+def _stdlib_dumps(content: Any) -> bytes:
+    # Same output shape as Starlette's JSONResponse, plus the fallback types above
+    def encode(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None,
+                          separators=(",", ":"), default=lambda v: _finite(_default(v)))
+    try:
+        return encode(content).encode("utf-8")
+    except ValueError:
+        # Non-finite floats: null, like orjson, rather than a 500 under one encoder only
+        return encode(_finite(content)).encode("utf-8")
+
+ENCODERS = {"orjson": _orjson_dumps, "stdlib": _stdlib_dumps}
+
+def _select_encoder() -> Callable[[Any], bytes]:
+    name = JSON_RESPONSE_CONFIG.get("encoder", "orjson")
+    if name == "orjson" and orjson is None:
+        logger.warning("orjson is not installed, using the stdlib JSON encoder")
+        name = "stdlib"
+    return ENCODERS[name]
+
+dumps = _select_encoder()
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the configured encoder (orjson when installed).
+
+    Returned directly from a route, it also skips FastAPI's jsonable_encoder walk: rows from
+    SQLite are already JSON-safe, and anything that is not (NumPy scalars, datetimes, Decimal)
+    is handled by the encoder itself.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
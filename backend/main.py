@@ -1,7 +1,16 @@
+import os
+
+# Startup profile mode: time every import from here on (set by --profile-imports or PROFILE_IMPORTS=true)
+PROFILE_IMPORTS = os.getenv("PROFILE_IMPORTS", "false").lower() == "true"
+if PROFILE_IMPORTS:
+    from utils.lazy_imports import import_profiler
+    import_profiler.start()
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 import uvicorn
+import argparse
 import asyncio
 from typing import Optional
 import json
@@ -10,6 +19,7 @@ import logging
 
 from api.routes import query, metrics, health
 from core.database import DatabaseManager
+from core.responses import FastJSONResponse
 from services.mistral_service import MistralService
 from services.data_processor import DataProcessor
 
@@ -20,7 +30,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="E-commerce AI Agent",
     description="AI-powered e-commerce data analysis system",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson-backed rendering for every route that returns plain data
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware
@@ -47,18 +59,47 @@ async def startup_event():
         
         logger.info("Loading data...")
         data_processor = DataProcessor()
-        await data_processor.load_all_data()
+        # Read at startup (not import) so `--force-reload` applies to uvicorn's worker process
+        force_reload = os.getenv("FORCE_RELOAD", "false").lower() == "true"
+        await data_processor.load_all_data(force=force_reload)
+        
+        logger.info("Opening Ollama connection pool...")
+        await query.mistral_service.startup()
+        
+        if PROFILE_IMPORTS:
+            import_profiler.stop()
+            import_profiler.log_report()
         
         logger.info("Application started successfully!")
     except Exception as e:
         logger.error(f"Failed to start application: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared application resources"""
+    await query.mistral_service.shutdown()
+    await DatabaseManager().close()
+    logger.info("Application shut down cleanly")
+
 @app.get("/")
 async def root():
     return {"message": "E-commerce AI Agent API", "status": "running"}
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="E-commerce AI Agent API")
+    parser.add_argument("--force-reload", action="store_true",
+                        help="Reload every table from data/raw even if the source files are unchanged")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="Log how long each module took to import once startup completes")
+    args = parser.parse_args()
+    
+    # Passed through the environment so uvicorn's worker/reloader process sees it too
+    if args.force_reload:
+        os.environ["FORCE_RELOAD"] = "true"
+    if args.profile_imports:
+        os.environ["PROFILE_IMPORTS"] = "true"
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
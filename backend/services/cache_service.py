@@ -0,0 +1,184 @@
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable, Hashable
+
+from config import PERFORMANCE_CONFIG
+from core.database import result_cache, ANY_TABLE
+
+logger = logging.getLogger(__name__)
+
+# Words that do not change the meaning of a business question
+STOP_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'what', 'whats', 'which',
+    'my', 'our', 'me', 'i', 'we', 'us', 'please', 'show', 'tell', 'give', 'get',
+    'calculate', 'compute', 'find', 'list', 'display', 'of', 'for', 'to', 'in',
+    'on', 'do', 'does', 'did', 'has', 'had', 'have', 'can', 'could', 'you', 'much', 'current', 'overall'
+}
+
+# Phrases mapped to one canonical wording, longest phrases first
+SYNONYMS = [
+    ('return on ad spend', 'roas'),
+    ('return on advertising spend', 'roas'),
+    ('cost per click', 'cpc'),
+    ('click through rate', 'ctr'),
+    ('clickthrough rate', 'ctr'),
+    ('ad revenue', 'ad sales'),
+    ('sales revenue', 'total sales'),
+    ('total revenue', 'total sales'),
+    ('revenue', 'total sales'),
+    ('advertising spend', 'ad spend'),
+    ('advertising', 'ad'),
+    ('ads', 'ad'),
+    ('items', 'products'),
+    ('item', 'product'),
+    ('best', 'top')
+]
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_SYNONYM_PATTERNS = [
+    (re.compile(r'\b' + re.escape(phrase) + r'\b'), canonical) for phrase, canonical in SYNONYMS
+]
+
+def normalize_question(question: str) -> str:
+    """Reduce a question to a canonical form so equivalent wordings share a key"""
+    text = question.lower().replace("-", " ").replace("'", "")
+    text = _PUNCTUATION.sub(" ", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+
+    for pattern, canonical in _SYNONYM_PATTERNS:
+        text = pattern.sub(canonical, text)
+
+    tokens = []
+    for token in text.split():
+        # "Return on Ad Spend (ROAS)" collapses to "roas roas"; keep one
+        if token in STOP_WORDS or (tokens and tokens[-1] == token):
+            continue
+        tokens.append(token)
+    return " ".join(tokens)
+
+class AnswerCache:
+    """LRU + TTL cache of full query answers (SQL, rows, answer text, chart)"""
+
+    def __init__(self, max_entries: int = None, ttl: float = None, enabled: bool = None):
+        self.max_entries = max_entries or PERFORMANCE_CONFIG.get("cache_max_entries", 256)
+        self.ttl = ttl if ttl is not None else PERFORMANCE_CONFIG.get("cache_ttl", 300)
+        self.enabled = enabled if enabled is not None else PERFORMANCE_CONFIG.get("enable_caching", True)
+        self.data_version = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, question: str, include_chart: bool = True) -> Tuple:
+        """Cache key: normalized question, chart flag, data version and external-write generation"""
+        # check_external_writes() bumps ANY_TABLE whoever calls it, so a write by another process
+        # retires every answer computed before it
+        external = result_cache.table_versions.get(ANY_TABLE, 0)
+        return (normalize_question(question), bool(include_chart), self.data_version, external)
+
+    def get(self, question: str, include_chart: bool = True) -> Optional[Dict[str, Any]]:
+        """Return a cached answer, or None on miss/expiry"""
+        if not self.enabled:
+            return None
+
+        key = self.make_key(question, include_chart)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, question: str, value: Dict[str, Any], include_chart: bool = True):
+        """Store an answer and evict least recently used entries beyond the bound"""
+        if not self.enabled:
+            return
+
+        key = self.make_key(question, include_chart)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every entry and bump the data version (called after data reloads)"""
+        self.data_version += 1
+        self._entries.clear()
+        logger.info(f"Answer cache invalidated (data version {self.data_version})")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "data_version": self.data_version
+        }
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight execution"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared); `shared` is True when another caller's execution was joined"""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            task = asyncio.create_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # A disconnecting caller must not cancel the execution the others are waiting on...
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            # ...but once every caller is gone there is no one left to answer
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Execution/coalescing counters for monitoring"""
+        requests = self.executions + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / requests if requests else 0.0
+        }
+
+# Shared across routes and the data processor so reloads invalidate answers
+answer_cache = AnswerCache()
+
+# Identical /api/query questions arriving together share one pipeline run
+query_flights = SingleFlight()
@@ -253,39 +253,72 @@
 
 
 import logging
-from typing import Dict, List, Any, Optional
-import json
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
 
 from config import CHART_COLORS, MAX_CHART_ITEMS, CHART_CONFIG
+from utils.downsample import downsample_rows
+from utils.lazy_imports import LazyModule
+
+# Only needed to expand a layout template for GET /api/charts/templates/{id}
+go = LazyModule("plotly.graph_objects")
 
 logger = logging.getLogger(__name__)
 
+# Wire format of chart_data: rows travel once as typed columns; the traditional (3D) chart and the
+# Plotly figure are small specs over those columns, and styling is a template referenced by id
+CHART_FORMAT = "columnar/1"
+
+# Palette and layout shared by every chart; clients fetch and cache them once per id
+CHART_TEMPLATES = {
+    "dark": {
+        "palette": CHART_COLORS,
+        "height": CHART_CONFIG.get("default_chart_height", 400),
+        "plotly_template": "plotly_dark"
+    }
+}
+DEFAULT_TEMPLATE = "dark"
+
 class ChartService:
     def __init__(self):
         self.colors = CHART_COLORS
         self.config = CHART_CONFIG
+        # label/value/date roles depend only on the column names, which repeat across questions
+        self.column_roles = lru_cache(maxsize=256)(self._column_roles)
+        self.layout_template = lru_cache(maxsize=len(CHART_TEMPLATES))(self._layout_template)
     
     def generate_chart_data(self, question: str, results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        """Generate enhanced chart data using Streamlit's visualization logic"""
+        """Compact chart payload: typed columns plus traditional and Plotly specs over them"""
         if not results:
             return None
         
         try:
-            # Convert results to DataFrame for easier manipulation
-            df = pd.DataFrame(results)
-            
-            # Create both traditional chart data and Plotly chart
             chart_type = self._determine_chart_type(question, results)
-            traditional_chart = self._create_traditional_chart(chart_type, question, results)
-            plotly_chart = self._create_enhanced_visualization(df, question)
+            traditional_chart, rows = self._create_traditional_chart(chart_type, question, results)
+            columns = self._encode_columns(rows)
+            plotly_chart, sampling = None, None
+            if self.config.get("enable_plotly", True):
+                plotly_chart = self._create_enhanced_visualization(rows, columns, question)
             
-            # Combine both approaches
-            chart_data = traditional_chart or {}
+            # A date x-axis makes a Plotly line even when the 3D chart is not one; its rows go through
+            # the same sort and downsampling unless the line chart already did that on this column
+            already_sampled = traditional_chart and traditional_chart.get("type") == "line" \
+                and traditional_chart["config"]["xAxis"] == (plotly_chart or {}).get("x")
+            if plotly_chart and plotly_chart["kind"] == "line" and not already_sampled:
+                rows, sampling = self._time_series(rows, plotly_chart["x"], plotly_chart["y"])
+                columns = self._encode_columns(rows)
+                if sampling["dropped"]:
+                    plotly_chart["title"] += f" ({sampling['points']:,} of {sampling['original_points']:,} points)"
+            
+            if not traditional_chart and not plotly_chart:
+                return None
+            chart_data = {"format": CHART_FORMAT, "template": DEFAULT_TEMPLATE, **(traditional_chart or {})}
+            if sampling and sampling["dropped"]:
+                chart_data["downsampling"] = sampling
+            chart_data["columns"] = columns
             if plotly_chart:
-                chart_data["plotly_config"] = plotly_chart
+                chart_data["plotly"] = plotly_chart
                 chart_data["enhanced_visualization"] = True
             
             return chart_data
@@ -294,110 +327,79 @@ class ChartService:
             logger.error(f"Error generating chart data: {e}")
             return None
     
-    def _create_enhanced_visualization(self, df: pd.DataFrame, question: str):
+    def _layout_template(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """Palette plus the fully expanded Plotly layout for a template id"""
+        template = CHART_TEMPLATES.get(template_id)
+        if template is None:
+            return None
+        layout = go.Layout(template=template["plotly_template"], height=template["height"]).to_plotly_json()
+        return {"id": template_id, "palette": template["palette"], "height": template["height"], "layout": layout}
+    
+    def _encode_columns(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Rows as [{name, type, values}] in column order; type is int, float, text or null"""
+        types = self._column_types(rows)
+        return [{"name": name, "type": types[name] or "null", "values": [row.get(name) for row in rows]}
+                for name in self._columns(rows)]
+    
+    def _create_enhanced_visualization(self, rows: List[Dict[str, Any]], columns: List[Dict[str, Any]],
+                                       question: str) -> Optional[Dict[str, Any]]:
         """
-        Creates a Plotly chart using the improved logic from Streamlit version
+        Plotly figure spec (same choices as the Streamlit version): the client builds the traces
+        from the shared columns and the layout from the template
         """
-        if df is None or df.empty or len(df.columns) < 2:
-            return None
-
-        try:
-            # Logic for 2-column charts (Bar or Line)
-            if len(df.columns) == 2:
-                x_col, y_col = df.columns[0], df.columns[1]
-                
-                # If the x-axis is a date, create a line chart
-                try:
-                    pd.to_datetime(df[x_col])
-                    df[x_col] = pd.to_datetime(df[x_col])
-                    fig = px.line(df, x=x_col, y=y_col, 
-                                title=f"{y_col} over Time", 
-                                markers=True,
-                                color_discrete_sequence=self.colors)
-                    fig.update_layout(
-                        height=self.config.get("default_chart_height", 400),
-                        template="plotly_dark"
-                    )
-                    return fig.to_json()
-                except:
-                    pass
-                    
-                # If the x-axis is text (categorical), create a bar chart
-                if df.shape[0] < 30 and (pd.api.types.is_string_dtype(df[x_col]) or pd.api.types.is_integer_dtype(df[x_col])):
-                    # Sort the data for a cleaner bar chart
-                    df_sorted = df.sort_values(by=y_col, ascending=False)
-                    fig = px.bar(df_sorted, x=x_col, y=y_col, 
-                               title=f"Comparison of {y_col} by {x_col}",
-                               color_discrete_sequence=self.colors)
-                    fig.update_layout(
-                        height=self.config.get("default_chart_height", 400),
-                        template="plotly_dark"
-                    )
-                    return fig.to_json()
-
-            # Logic for 3+ column charts (Scatter Plot)
-            if len(df.columns) >= 3:
-                # Check for numeric columns to use for axes
-                numeric_cols = df.select_dtypes(include=['number']).columns
-                if len(numeric_cols) >= 2:
-                    x_col = numeric_cols[0]
-                    y_col = numeric_cols[1]
-                    # Use the first categorical column for color, if available
-                    categorical_cols = df.select_dtypes(include=['object', 'category']).columns
-                    color_col = categorical_cols[0] if len(categorical_cols) > 0 else None
-                    
-                    title = f"{y_col} vs. {x_col}"
-                    if color_col:
-                        title += f" by {color_col}"
-
-                    fig = px.scatter(df, x=x_col, y=y_col, color=color_col, 
-                                   title=title,
-                                   hover_data=df.columns,
-                                   color_discrete_sequence=self.colors)
-                    fig.update_layout(
-                        height=self.config.get("default_chart_height", 400),
-                        template="plotly_dark"
-                    )
-                    return fig.to_json()
-
-            # Fallback: Simple bar chart
-            if len(df.columns) >= 2:
-                x_col, y_col = df.columns[0], df.columns[1]
-                fig = px.bar(df, x=x_col, y=y_col, 
-                           title=self._generate_chart_title(question),
-                           color_discrete_sequence=self.colors)
-                fig.update_layout(
-                    height=self.config.get("default_chart_height", 400),
-                    template="plotly_dark"
-                )
-                return fig.to_json()
-
+        names = [column["name"] for column in columns]
+        types = {column["name"]: column["type"] for column in columns}
+        if len(names) < 2:
             return None
+        
+        # Logic for 2-column charts (Bar or Line)
+        if len(names) == 2:
+            x_col, y_col = names
             
-        except Exception as e:
-            logger.error(f"Error creating enhanced visualization: {e}")
-            return None
+            # If the x-axis is a date, create a line chart
+            if self._is_date_column(rows, x_col):
+                return {"kind": "line", "x": x_col, "y": y_col, "title": f"{y_col} over Time", "markers": True}
+            
+            # If the x-axis is text (categorical) or an id, create a bar chart sorted by value
+            if len(rows) < 30 and types[x_col] in ("text", "int"):
+                return {"kind": "bar", "x": x_col, "y": y_col, "title": f"Comparison of {y_col} by {x_col}",
+                        "sort": {"by": y_col, "descending": True}}
+        
+        # Logic for 3+ column charts (Scatter Plot)
+        if len(names) >= 3:
+            numeric_cols = [name for name in names if types[name] in ("int", "float")]
+            if len(numeric_cols) >= 2:
+                x_col, y_col = numeric_cols[0], numeric_cols[1]
+                # Use the first categorical column for color, if available
+                categorical_cols = [name for name in names if types[name] in ("text", "null")]
+                color_col = categorical_cols[0] if categorical_cols else None
+                
+                title = f"{y_col} vs. {x_col}"
+                if color_col:
+                    title += f" by {color_col}"
+                return {"kind": "scatter", "x": x_col, "y": y_col, "color": color_col, "title": title,
+                        "hover": names}
+        
+        # Fallback: Simple bar chart
+        return {"kind": "bar", "x": names[0], "y": names[1], "title": self._generate_chart_title(question)}
     
-    def _create_traditional_chart(self, chart_type: str, question: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Create traditional chart data for 3D charts"""
-        if chart_type == "bar":
-            return self._create_bar_chart(question, results)
-        elif chart_type == "pie":
-            return self._create_pie_chart(question, results)
+    def _create_traditional_chart(self, chart_type: str, question: str,
+                                  results: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """(spec, rows) for the 3D chart; line charts return their rows sorted and downsampled"""
+        if chart_type == "pie":
+            return self._create_pie_chart(question, results), results
         elif chart_type == "line":
             return self._create_line_chart(question, results)
         else:
-            return self._create_bar_chart(question, results)
+            return self._create_bar_chart(question, results), results
     
     def _determine_chart_type(self, question: str, results: List[Dict[str, Any]]) -> str:
         """Determine the best chart type based on question and data structure"""
         question_lower = question.lower()
-        
-        # Convert to DataFrame for analysis
-        df = pd.DataFrame(results)
+        columns = self._columns(results)
         
         # Check if we have time-series data
-        date_cols = [col for col in df.columns if 'date' in col.lower() or 'time' in col.lower()]
+        date_cols = [col for col in columns if 'date' in col.lower() or 'time' in col.lower()]
         if date_cols and len(results) > 1:
             return "line"
         
@@ -413,186 +415,174 @@ class ChartService:
             return "pie"
         
         # Analyze data structure
-        if len(df.columns) >= 3:
-            numeric_cols = df.select_dtypes(include=['number']).columns
+        if len(columns) >= 3:
+            numeric_cols = [col for col, kind in self._column_types(results).items() if kind in ("int", "float")]
             if len(numeric_cols) >= 2:
                 return "scatter"
         
         # Default to bar chart
         return "bar"
     
-    def _create_bar_chart(self, question: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Create enhanced bar chart data"""
+    def _create_bar_chart(self, question: str, results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Bar chart spec: label and value columns of the first MAX_CHART_ITEMS rows"""
         if not results:
             return None
         
         # Limit results for better visualization
         limited_results = results[:MAX_CHART_ITEMS]
         
-        # Try to identify x and y axes
-        keys = list(limited_results[0].keys())
-        
         # Find the best label and value columns
-        label_col = self._find_label_column(keys)
-        value_col = self._find_value_column(keys)
+        roles = self.column_roles(tuple(limited_results[0]))
+        label_col, value_col = roles["label"], roles["value"]
         
         if not label_col or not value_col:
             return None
-        
-        labels = []
-        values = []
-        chart_data = []
-        
-        for i, result in enumerate(limited_results):
-            label = str(result.get(label_col, 'Unknown'))
-            value = float(result.get(value_col, 0))
-            
-            # Enhanced data point with more information
-            data_point = {
-                "label": label,
-                "value": value,
-                "color": self.colors[i % len(self.colors)],
-                "item_id": result.get('item_id', f'item_{i}'),
-                "item_name": self._get_item_name(result, label),
-                "additional_info": {k: v for k, v in result.items() if k not in [label_col, value_col]}
-            }
-            
-            labels.append(label)
-            values.append(value)
-            chart_data.append(data_point)
+        self._check_numeric(limited_results, value_col)
         
         return {
             "type": "bar",
             "title": self._generate_chart_title(question),
-            "data": chart_data,
-            "labels": labels,
-            "values": values,
             "config": {
                 "xAxis": label_col,
                 "yAxis": value_col,
-                "colors": self.colors[:len(labels)],
+                "limit": MAX_CHART_ITEMS,
                 "enhanced": True
             }
         }
     
-    def _create_pie_chart(self, question: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Create enhanced pie chart data"""
+    def _create_pie_chart(self, question: str, results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Pie chart spec: like a bar chart, plus the total the slices are a share of"""
         if not results:
             return None
         
         # Limit results for better visualization
         limited_results = results[:MAX_CHART_ITEMS]
         
-        keys = list(limited_results[0].keys())
-        label_col = self._find_label_column(keys)
-        value_col = self._find_value_column(keys)
+        roles = self.column_roles(tuple(limited_results[0]))
+        label_col, value_col = roles["label"], roles["value"]
         
         if not label_col or not value_col:
             return None
         
-        labels = []
-        values = []
-        chart_data = []
-        
-        # Calculate total for percentages
-        total = sum(float(result.get(value_col, 0)) for result in limited_results)
-        
-        for i, result in enumerate(limited_results):
-            label = str(result.get(label_col, 'Unknown'))
-            value = float(result.get(value_col, 0))
-            percentage = round((value / total * 100), 2) if total > 0 else 0
-            
-            data_point = {
-                "label": label,
-                "value": value,
-                "percentage": percentage,
-                "color": self.colors[i % len(self.colors)],
-                "item_id": result.get('item_id', f'item_{i}'),
-                "item_name": self._get_item_name(result, label)
-            }
-            
-            labels.append(label)
-            values.append(value)
-            chart_data.append(data_point)
-        
         return {
             "type": "pie",
             "title": self._generate_chart_title(question),
-            "data": chart_data,
-            "labels": labels,
-            "values": values,
             "config": {
-                "colors": self.colors[:len(labels)],
-                "total": total,
+                "xAxis": label_col,
+                "yAxis": value_col,
+                "limit": MAX_CHART_ITEMS,
+                "total": sum(self._values(limited_results, value_col)),
                 "enhanced": True
             }
         }
     
-    def _create_line_chart(self, question: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Create enhanced line chart data for time series"""
+    def _create_line_chart(self, question: str, results: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Line chart spec and its rows, sorted by date and downsampled"""
         if not results:
-            return None
+            return None, results
         
-        keys = list(results[0].keys())
-        date_col = self._find_date_column(keys)
-        value_col = self._find_value_column(keys)
+        roles = self.column_roles(tuple(results[0]))
+        date_col, value_col = roles["date"], roles["value"]
         
         if not date_col or not value_col:
-            return self._create_bar_chart(question, results)  # Fallback
+            return self._create_bar_chart(question, results), results  # Fallback
         
-        # Sort by date
-        try:
-            sorted_results = sorted(results, key=lambda x: pd.to_datetime(x.get(date_col, '1900-01-01')))
-        except:
-            sorted_results = results
-        
-        labels = []
-        values = []
-        chart_data = []
-        
-        for result in sorted_results:
-            date = str(result.get(date_col, 'Unknown'))
-            value = float(result.get(value_col, 0))
-            
-            data_point = {
-                "x": date,
-                "y": value,
-                "label": date,
-                "value": value
-            }
-            
-            labels.append(date)
-            values.append(value)
-            chart_data.append(data_point)
+        sorted_results, sampling = self._time_series(results, date_col, value_col)
+        self._check_numeric(sorted_results, value_col)
         
         return {
             "type": "line",
             "title": self._generate_chart_title(question),
-            "data": chart_data,
-            "labels": labels,
-            "values": values,
             "config": {
                 "xAxis": date_col,
                 "yAxis": value_col,
-                "color": self.colors[0],
                 "enhanced": True
-            }
-        }
+            },
+            **({"downsampling": sampling} if sampling["dropped"] else {})
+        }, sorted_results
     
-    def _get_item_name(self, result: Dict, fallback_label: str) -> str:
-        """Extract meaningful item name from result"""
-        # Try various column names that might contain item names
-        name_columns = ['product_name', 'item_name', 'name', 'title', 'description']
-        
-        for col in name_columns:
-            if col in result and result[col]:
-                return str(result[col])
-        
-        # If item_id exists, format it nicely
-        if 'item_id' in result:
-            return f"Product {result['item_id']}"
+    def _time_series(self, rows: List[Dict[str, Any]], date_col: str,
+                     value_col: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """(rows sorted by date and downsampled, downsampling report)"""
+        # Sort by date, parsing each value once; anything unparseable keeps the original order
+        try:
+            rows = sorted(rows, key=lambda x: self._parse_date(x.get(date_col, '1900-01-01')))
+        except (TypeError, ValueError):
+            pass
         
-        return fallback_label
+        # Long series are thinned to the target point count; the payload says how many were dropped
+        return downsample_rows(rows, date_col, [value_col])
+    
+    @staticmethod
+    def _values(rows: List[Dict[str, Any]], column: str) -> List[float]:
+        """Plotted values of a column"""
+        return [float(row.get(column, 0)) for row in rows]
+    
+    @staticmethod
+    def _check_numeric(rows: List[Dict[str, Any]], column: str) -> None:
+        """Raise ValueError unless every value of the column is plottable as a number (missing counts as 0)"""
+        for row in rows:
+            value = row.get(column, 0)
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Column '{column}' has non-numeric value {value!r}") from None
+    
+    @classmethod
+    def _is_date_column(cls, rows: List[Dict[str, Any]], column: str) -> bool:
+        """Every non-NULL value is a date, datetime or ISO date string"""
+        values = [row.get(column) for row in rows if row.get(column) is not None]
+        try:
+            for value in values:
+                if isinstance(value, (int, float)):
+                    return False
+                cls._parse_date(value)
+        except (TypeError, ValueError):
+            return False
+        return bool(values)
+    
+    @staticmethod
+    def _parse_date(value: Any) -> datetime:
+        """Sort key for a date cell (ISO strings, dates or datetimes)"""
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        return datetime.fromisoformat(str(value))
+    
+    @staticmethod
+    def _columns(results: List[Dict[str, Any]]) -> List[str]:
+        """Column names across all rows, in first-seen order"""
+        return list(dict.fromkeys(key for row in results for key in row))
+    
+    @staticmethod
+    def _column_types(results: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """'int', 'float' or 'text' per column in one pass over the rows; None for all-NULL columns"""
+        types: Dict[str, Optional[str]] = {}
+        for row in results:
+            for key, value in row.items():
+                if value is None:
+                    types.setdefault(key, None)
+                    continue
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    kind = "text"
+                else:
+                    kind = "int" if isinstance(value, int) else "float"
+                previous = types.get(key)
+                if previous in (None, kind):
+                    types[key] = kind
+                else:
+                    types[key] = "float" if {previous, kind} == {"int", "float"} else "text"
+        return types
+    
+    def _column_roles(self, keys: Tuple[str, ...]) -> Dict[str, Optional[str]]:
+        """Label, value and date columns for a set of column names"""
+        keys = list(keys)
+        return {
+            "label": self._find_label_column(keys),
+            "value": self._find_value_column(keys),
+            "date": self._find_date_column(keys)
+        }
     
     def _find_label_column(self, keys: List[str]) -> Optional[str]:
         """Find the best column to use as labels"""
@@ -0,0 +1,333 @@
+import asyncio
+import re
+import time
+import logging
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: without NumPy every read goes to SQLite
+    np = None
+
+from core.database import DatabaseManager, ROLLUP_MEASURES, result_cache
+from utils.intent_classifier import IntentMatch
+from utils.sql_templates import RATIO_METRICS, DEFAULT_TOP_N, MAX_TOP_N, sql_templates
+from config import COLUMNAR_CONFIG
+
+logger = logging.getLogger(__name__)
+
+AD_TABLE = "ad_sales_metrics"
+TOTAL_TABLE = "total_sales_metrics"
+ELIGIBILITY_TABLE = "product_eligibility"
+
+# Columns loaded per table; the first is the dictionary-encoded date column
+TABLE_COLUMNS = {
+    AD_TABLE: ["date", "item_id", "ad_sales", "impressions", "ad_spend", "clicks", "units_sold"],
+    TOTAL_TABLE: ["date", "item_id", "total_sales", "total_units_ordered"],
+    ELIGIBILITY_TABLE: ["eligibility_datetime_utc", "item_id", "eligibility"]
+}
+
+# Intents answered from the snapshot; everything else (and any failure) goes to SQLite
+ANSWERABLE_INTENTS = {'total_sales', 'top_products', 'trends'} | set(RATIO_METRICS)
+
+_FILTERED_MEASURE = re.compile(r"^CASE WHEN (\w+) > 0 THEN (\w+) END$")
+_MEASURE_REF = re.compile(r"\{(\w+)\}")
+_SUPPORTING = re.compile(r"SUM\(\{(\w+)\}\) as (\w+)")
+
+class ColumnarTable:
+    """One table as NumPy columns with item_id and the date column dictionary-encoded"""
+
+    def __init__(self, name: str, rows: List[tuple], columns: List[str]):
+        self.name = name
+        self.row_count = len(rows)
+        values = dict(zip(columns, zip(*rows))) if rows else {column: () for column in columns}
+
+        # Codes index into sorted dictionaries, so date ranges become code ranges
+        self.items, self.item_codes = np.unique(np.asarray(values["item_id"], dtype=np.int64), return_inverse=True)
+        self.dates, self.date_codes = np.unique(np.asarray(values[columns[0]], dtype=str), return_inverse=True)
+        self.columns = {column: self._array(values[column]) for column in columns[2:]}
+        self._measures: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @staticmethod
+    def _array(values: tuple) -> "np.ndarray":
+        array = np.asarray(values)
+        if array.dtype == object:
+            # NULLs: SQL sums skip them, so they count as 0
+            array = np.asarray([value or 0 for value in values], dtype=np.float64)
+        return array
+
+    def measure(self, name: str) -> "Tuple[np.ndarray, np.ndarray]":
+        """(values, present) for a rollup measure, e.g. `cpc_clicks` = clicks where clicks > 0"""
+        if name not in self._measures:
+            expression = ROLLUP_MEASURES[self.name][name]
+            filtered = _FILTERED_MEASURE.match(expression)
+            if expression == "1":
+                values, present = np.ones(self.row_count, dtype=np.int64), np.ones(self.row_count, dtype=bool)
+            elif filtered:
+                present = self.columns[filtered.group(1)] > 0
+                values = np.where(present, self.columns[filtered.group(2)], 0)
+            else:
+                values, present = self.columns[expression], np.ones(self.row_count, dtype=bool)
+            self._measures[name] = (values, present)
+        return self._measures[name]
+
+    def is_integer(self, name: str) -> bool:
+        return self.measure(name)[0].dtype.kind in "iub"
+
+    def mask(self, start: str = None, end: str = None, last_days: int = None,
+             item_ids: Tuple[int, ...] = ()) -> "np.ndarray":
+        """Rows inside a date window and item list, with the same bounds as the SQL templates"""
+        mask = np.ones(self.row_count, dtype=bool)
+        if start is not None:
+            mask &= self.date_codes >= np.searchsorted(self.dates, start, side="left")
+        if end is not None:
+            mask &= self.date_codes < np.searchsorted(self.dates, end, side="right")
+        if last_days is not None and len(self.dates):
+            # date > date(MAX(date), '-N days')
+            cutoff = (date.fromisoformat(self.dates[-1][:10]) - timedelta(days=last_days)).isoformat()
+            mask &= self.date_codes >= np.searchsorted(self.dates, cutoff, side="right")
+        if item_ids:
+            mask &= np.isin(self.item_codes, np.flatnonzero(np.isin(self.items, item_ids)))
+        return mask
+
+    def total(self, name: str, mask: "np.ndarray" = None) -> float:
+        """SUM(measure) over the masked rows; NaN when no row contributes (SQL NULL)"""
+        values, present = self.measure(name)
+        selected = present if mask is None else present & mask
+        return values[selected].sum() if selected.any() else np.nan
+
+    def grouped(self, by: str, names: List[str], mask: "np.ndarray" = None) -> "Tuple[np.ndarray, Dict[str, np.ndarray]]":
+        """(keys, {measure: per-group sums}) for GROUP BY item_id or date; NaN marks all-NULL groups"""
+        codes, keys = (self.item_codes, self.items) if by == "item" else (self.date_codes, self.dates)
+        mask = np.ones(self.row_count, dtype=bool) if mask is None else mask
+        groups = np.flatnonzero(np.bincount(codes[mask], minlength=len(keys)))
+
+        sums = {}
+        for name in names:
+            values, present = self.measure(name)
+            selected = mask & present
+            totals = np.bincount(codes[selected], weights=values[selected], minlength=len(keys))[groups]
+            counts = np.bincount(codes[selected], minlength=len(keys))[groups]
+            sums[name] = np.where(counts > 0, totals, np.nan)
+        return keys[groups], sums
+
+    def distinct_items(self, mask: "np.ndarray") -> int:
+        """COUNT(DISTINCT item_id) over the masked rows"""
+        return int(np.unique(self.item_codes[mask]).size)
+
+def top_k(values: "np.ndarray", k: int, descending: bool = True) -> "np.ndarray":
+    """Indices of the k largest (or smallest) non-NaN values; ties keep key order, as SQLite's sort does"""
+    candidates = np.flatnonzero(~np.isnan(values))
+    keys = -values[candidates] if descending else values[candidates]
+    if k < len(candidates):
+        # Partition to the k-th key, but keep every tie with it so the stable sort picks the same rows
+        kth = keys[np.argpartition(keys, k - 1)[k - 1]] if k > 0 else -np.inf
+        candidates, keys = candidates[keys <= kth], keys[keys <= kth]
+    return candidates[np.argsort(keys, kind="stable")][:k]
+
+def ratio(numerator: "np.ndarray", denominator: "np.ndarray") -> "np.ndarray":
+    """numerator / NULLIF(denominator, 0), NaN for NULL"""
+    numerator, denominator = np.asarray(numerator, dtype=np.float64), np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, np.nan), where=denominator != 0)
+
+def rollup_sum(group_sums: "np.ndarray") -> Optional[float]:
+    """SUM over per-group sums added one by one, as SQLite adds up rollup rows (NumPy sums pairwise)"""
+    present = group_sums[~np.isnan(group_sums)].tolist()
+    return float(sum(present)) if present else None
+
+def _value(value, integer: bool = False):
+    """NumPy scalar -> JSON-friendly Python value, NaN -> None"""
+    if value is None or np.isnan(value):
+        return None
+    return int(round(float(value))) if integer else float(value)
+
+class ColumnarSnapshot:
+    """Immutable set of columnar tables plus the table versions it was read at"""
+
+    def __init__(self, tables: Dict[str, ColumnarTable], versions: Dict[str, int], build_seconds: float):
+        self.tables = tables
+        self.versions = versions
+        self.build_seconds = build_seconds
+        self.built_at = time.time()
+
+class ColumnarService:
+    """Optional in-process columnar copy of the metrics tables.
+
+    Rebuilt after every data load and swapped in with one reference assignment. Reads fall back
+    to SQLite whenever the snapshot is missing or a table has been written since it was built.
+    """
+
+    def __init__(self, db_manager: DatabaseManager = None):
+        self.db_manager = db_manager or DatabaseManager()
+        self.enabled = COLUMNAR_CONFIG.get("enabled", True) and np is not None
+        self.snapshot: Optional[ColumnarSnapshot] = None
+        self.hits = 0
+        self.misses = 0
+
+    async def refresh(self):
+        """Read the tables on one SQLite snapshot, build the arrays off the event loop, then swap"""
+        if not self.enabled:
+            return
+        start = time.perf_counter()
+        # Captured before reading, so a write racing the build leaves the snapshot stale rather than wrong
+        versions = result_cache.versions(list(TABLE_COLUMNS))
+
+        raw = {}
+        async with self.db_manager.snapshot() as db:
+            for table, columns in TABLE_COLUMNS.items():
+                async with db.execute(f"SELECT {', '.join(columns)} FROM {table}") as cursor:
+                    raw[table] = await cursor.fetchall()
+
+        tables = await asyncio.to_thread(
+            lambda: {table: ColumnarTable(table, rows, TABLE_COLUMNS[table]) for table, rows in raw.items()}
+        )
+        self.snapshot = ColumnarSnapshot(tables, versions, time.perf_counter() - start)
+        logger.info(f"Built columnar snapshot ({', '.join(f'{t}: {len(r)}' for t, r in raw.items())} rows) "
+                    f"in {self.snapshot.build_seconds:.3f}s")
+
+    @property
+    def current(self) -> Optional[ColumnarSnapshot]:
+        """The snapshot, if no table it holds has been written since it was built"""
+        snapshot = self.snapshot
+        if snapshot is None or not result_cache.is_current(snapshot.versions):
+            return None
+        return snapshot
+
+    def answer(self, match: IntentMatch) -> Optional[List[Dict[str, Any]]]:
+        """Rows the SQL template for `match` would return, or None to use SQLite"""
+        snapshot = self.current
+        if snapshot is None or match.intent not in ANSWERABLE_INTENTS:
+            self.misses += 1
+            return None
+        try:
+            rows = self._answer(snapshot, match)
+        except Exception as e:
+            logger.warning(f"Columnar answer failed for {match.intent}, using SQLite: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rows
+
+    def _answer(self, snapshot: ColumnarSnapshot, match: IntentMatch) -> List[Dict[str, Any]]:
+        intent = match.intent
+        table_name = TOTAL_TABLE if intent in ('total_sales', 'top_products') else AD_TABLE
+        if intent == 'trends' and match.metric in (None, 'total_sales', 'units'):
+            table_name = TOTAL_TABLE
+        table = snapshot.tables[table_name]
+
+        # eligible_products is not answered here, so windows and item ids always apply
+        mask = table.mask(match.start_date, match.end_date, match.last_days, match.item_ids)
+        limit = min(match.top_n or DEFAULT_TOP_N, MAX_TOP_N)
+        descending = (match.sort or 'desc') == 'desc'
+
+        if intent == 'total_sales':
+            return [{"total_sales": _value(table.total("total_sales", mask))}]
+
+        if intent == 'top_products':
+            items, sums = table.grouped("item", ["total_sales", "total_units_ordered"], mask)
+            return [{"item_id": int(items[i]),
+                     "total_sales": _value(sums["total_sales"][i]),
+                     "total_units": _value(sums["total_units_ordered"][i], integer=True)}
+                    for i in top_k(sums["total_sales"], limit, descending)]
+
+        if intent == 'trends':
+            return self._trend_rows(table, match.metric, mask)
+
+        # Ratio metrics: expression and supporting sums come from the same definitions as the SQL
+        expression, supporting, positive = RATIO_METRICS[intent]
+        numerator, denominator = _MEASURE_REF.findall(expression)
+        columns = [(alias, name) for name, alias in (_SUPPORTING.match(item).groups() for item in supporting)]
+
+        if sql_templates.ranked(match):
+            names = list(dict.fromkeys([numerator, denominator, positive] + [name for _, name in columns]))
+            items, sums = table.grouped("item", names, mask)
+            values = ratio(sums[numerator], sums[denominator])
+            # HAVING SUM(positive) > 0
+            values[~(np.nan_to_num(sums[positive]) > 0)] = np.nan
+            return [{"item_id": int(items[i]), intent: _value(values[i]),
+                     **{alias: _value(sums[name][i], table.is_integer(name)) for alias, name in columns}}
+                    for i in top_k(values, limit, descending)]
+
+        row = {intent: _value(ratio(table.total(numerator, mask), table.total(denominator, mask)))}
+        row.update({alias: _value(table.total(name, mask), table.is_integer(name)) for alias, name in columns})
+        if intent == 'roas':
+            row["products_with_ads"] = table.distinct_items(mask & table.measure(positive)[1])
+        return [row]
+
+    def _trend_rows(self, table: ColumnarTable, metric: Optional[str], mask: "np.ndarray" = None) -> List[Dict[str, Any]]:
+        """Per-day sums (and the metric's daily ratio) in date order"""
+        if table.name == TOTAL_TABLE:
+            columns = [("daily_sales", "total_sales"), ("daily_units", "total_units_ordered")]
+        else:
+            columns = [("daily_ad_sales", "ad_sales"), ("daily_ad_spend", "ad_spend"),
+                       ("daily_clicks", "clicks"), ("daily_impressions", "impressions")]
+        names = [name for _, name in columns]
+        ratio_terms = _MEASURE_REF.findall(RATIO_METRICS[metric][0]) if table.name == AD_TABLE and metric in RATIO_METRICS else []
+
+        dates, sums = table.grouped("date", list(dict.fromkeys(names + ratio_terms)), mask)
+        daily_ratio = ratio(sums[ratio_terms[0]], sums[ratio_terms[1]]) if ratio_terms else None
+        rows = []
+        for i, day in enumerate(dates.tolist()):
+            row = {"date": day, **{alias: _value(sums[name][i], table.is_integer(name)) for alias, name in columns}}
+            if daily_ratio is not None:
+                row[metric] = _value(daily_ratio[i])
+            rows.append(row)
+        return rows
+
+    def summary_rows(self) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """(sales, ads, eligibility) rows shaped like the /metrics/summary queries"""
+        snapshot = self.current
+        if snapshot is None:
+            return None
+        sales, ads = snapshot.tables[TOTAL_TABLE], snapshot.tables[AD_TABLE]
+        eligibility = snapshot.tables[ELIGIBILITY_TABLE]
+
+        items, sums = sales.grouped("item", ["total_sales"])
+        best = top_k(sums["total_sales"], 1)
+        sales_rows = [{"item_id": int(items[best[0]]), "total": rollup_sum(sums["total_sales"]),
+                       "product_count": len(items)}] if len(best) else []
+        _, ad_sums = ads.grouped("item", ["ad_spend", "roas_ad_sales", "roas_ad_spend"])
+        spend, roas_sales, roas_spend = (rollup_sum(ad_sums[name]) for name in ("ad_spend", "roas_ad_sales", "roas_ad_spend"))
+        ad_rows = [{"total_spend": spend, "roas": roas_sales / roas_spend if roas_spend else None}]
+        eligible = eligibility.distinct_items(eligibility.columns["eligibility"] == 1)
+        return sales_rows, ad_rows, [{"count": eligible}]
+
+    def ad_rows_by_item(self) -> Optional[List[Dict[str, Any]]]:
+        """Per-item filtered ad sums shaped like the /metrics/performance query"""
+        snapshot = self.current
+        if snapshot is None:
+            return None
+        table = snapshot.tables[AD_TABLE]
+        columns = [("total_ad_sales", "roas_ad_sales"), ("total_ad_spend", "roas_ad_spend"),
+                   ("total_spend", "cpc_ad_spend"), ("total_clicks", "cpc_clicks"),
+                   ("total_units", "cvr_units_sold"), ("total_impressions", "ctr_impressions"),
+                   ("impression_clicks", "ctr_clicks")]
+        items, sums = table.grouped("item", [name for _, name in columns])
+        return [{"item_id": int(item), **{alias: _value(sums[name][i], table.is_integer(name)) for alias, name in columns}}
+                for i, item in enumerate(items.tolist())]
+
+    def trend_rows(self) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """(sales trends, ad trends) shaped like the /metrics/trends queries"""
+        snapshot = self.current
+        if snapshot is None:
+            return None
+        return (self._trend_rows(snapshot.tables[TOTAL_TABLE], None),
+                self._trend_rows(snapshot.tables[AD_TABLE], None))
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "fresh": self.current is not None,
+            "rows": {name: table.row_count for name, table in snapshot.tables.items()} if snapshot else {},
+            "build_seconds": snapshot.build_seconds if snapshot else None,
+            "built_at": snapshot.built_at if snapshot else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+# Shared by the query pipeline, the metrics routes and DataProcessor (which rebuilds it)
+columnar_service = ColumnarService()
@@ -1,11 +1,20 @@
-import pandas as pd
 import logging
+import hashlib
+import time
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional
 import asyncio
 
 from core.database import DatabaseManager
-from config import ELIGIBILITY_FILE, AD_SALES_FILE, TOTAL_SALES_FILE
+from services.cache_service import answer_cache
+from services.columnar_service import columnar_service
+from utils.lazy_imports import LazyModule
+from config import ELIGIBILITY_FILE, AD_SALES_FILE, TOTAL_SALES_FILE, INGEST_CONFIG
+
+# Only needed when a source file actually changed, not on the unchanged-startup path
+pd = LazyModule("pandas")
+openpyxl = LazyModule("openpyxl")
 
 logger = logging.getLogger(__name__)
 
@@ -13,145 +22,183 @@ class DataProcessor:
     def __init__(self):
         self.db_manager = DatabaseManager()
     
-    async def load_all_data(self):
-        """Load all data from Excel files into database"""
+    async def load_all_data(self, force: bool = False):
+        """Load data from Excel files, skipping sources whose fingerprint is unchanged"""
+        reloaded = []
         try:
-            logger.info("Loading eligibility data...")
-            await self.load_eligibility_data()
-            
-            logger.info("Loading ad sales data...")
-            await self.load_ad_sales_data()
-            
-            logger.info("Loading total sales data...")
-            await self.load_total_sales_data()
-            
-            logger.info("All data loaded successfully!")
+            manifest = await self._get_manifest()
+            
+            for label, path, table, loader in self._sources():
+                previous = manifest.get(path.name)
+                fingerprint = await asyncio.to_thread(self._fingerprint, path, previous)
+                
+                if not force and previous and previous['sha256'] == fingerprint['sha256']:
+                    logger.info(f"Skipping {label} data (source unchanged)")
+                    if previous['mtime'] != fingerprint['mtime']:
+                        # Touched but identical content: remember the new mtime to skip hashing next time
+                        await self._record_manifest(path, table, fingerprint, previous['row_count'])
+                    # Databases created before the rollups existed get them built once
+                    await self.db_manager.ensure_rollups(table)
+                    continue
+                
+                logger.info(f"Loading {label} data...")
+                row_count = await loader()
+                await self._record_manifest(path, table, fingerprint, row_count)
+                reloaded.append(table)
+            
+            if reloaded:
+                logger.info(f"Data loaded successfully! Reloaded: {', '.join(reloaded)}")
+            else:
+                logger.info("All source files unchanged, skipped data reload")
             
         except Exception as e:
             logger.error(f"Error loading data: {e}")
             raise
+        
+        finally:
+            # Even a failed load may have replaced some tables
+            if reloaded or force:
+                self._on_data_changed()
+            if reloaded or force or columnar_service.current is None:
+                await self._refresh_columnar()
     
-    async def load_eligibility_data(self):
-        """Load product eligibility data"""
+    def _sources(self) -> List[tuple]:
+        """(label, source file, table, loader) for every ingested table"""
+        return [
+            ("eligibility", Path(ELIGIBILITY_FILE), "product_eligibility", self.load_eligibility_data),
+            ("ad sales", Path(AD_SALES_FILE), "ad_sales_metrics", self.load_ad_sales_data),
+            ("total sales", Path(TOTAL_SALES_FILE), "total_sales_metrics", self.load_total_sales_data)
+        ]
+    
+    def _fingerprint(self, path: Path, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Content hash, size and mtime of a source file; the hash is reused when size and mtime match"""
+        stat = path.stat()
+        if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+            return {'sha256': previous['sha256'], 'size': stat.st_size, 'mtime': stat.st_mtime}
+        
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        
+        return {'sha256': digest.hexdigest(), 'size': stat.st_size, 'mtime': stat.st_mtime}
+    
+    async def _get_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """Manifest rows keyed by source file name"""
+        rows = await self.db_manager.execute_query("SELECT * FROM ingest_manifest")
+        return {row['source']: row for row in rows}
+    
+    async def _record_manifest(self, path: Path, table: str, fingerprint: Dict[str, Any], row_count: int):
+        """Store the fingerprint a table was loaded from"""
+        await self.db_manager.execute_write("""
+            INSERT OR REPLACE INTO ingest_manifest
+            (source, table_name, sha256, size, mtime, row_count, loaded_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+        """, (path.name, table, fingerprint['sha256'], fingerprint['size'], fingerprint['mtime'], row_count))
+    
+    def _on_data_changed(self):
+        """Invalidate caches that depend on the loaded tables"""
+        answer_cache.invalidate()
+    
+    async def _refresh_columnar(self):
+        """Rebuild the in-memory columnar snapshot; on failure readers keep using SQLite"""
         try:
-            df = pd.read_excel(ELIGIBILITY_FILE)
-            
-            # Clean and prepare data
-            df['eligibility'] = df['eligibility'].astype(bool)
-            df['message'] = df['message'].fillna('')
-            
-            # FIXED: Convert timestamp to string format
-            df['eligibility_datetime_utc'] = pd.to_datetime(df['eligibility_datetime_utc']).dt.strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Convert to list of tuples for insertion
-            data = [
-                (
-                    str(row['eligibility_datetime_utc']),  # Now it's already a string
-                    int(row['item_id']),
-                    bool(row['eligibility']),
-                    str(row['message'])
-                )
-                for _, row in df.iterrows()
-            ]
-            
-            # Clear existing data and insert new data
-            await self.db_manager.execute_query("DELETE FROM product_eligibility")
-            
-            query = """
-                INSERT OR REPLACE INTO product_eligibility 
-                (eligibility_datetime_utc, item_id, eligibility, message) 
-                VALUES (?, ?, ?, ?)
-            """
-            
-            await self.db_manager.execute_many(query, data)
-            logger.info(f"Loaded {len(data)} eligibility records")
-            
+            await columnar_service.refresh()
         except Exception as e:
-            logger.error(f"Error loading eligibility data: {e}")
-            raise
+            logger.error(f"Error building columnar snapshot: {e}")
+    
+    async def load_eligibility_data(self):
+        """Load product eligibility data"""
+        columns = ['eligibility_datetime_utc', 'item_id', 'eligibility', 'message']
+        return await self._ingest(ELIGIBILITY_FILE, "product_eligibility", columns, self._prepare_eligibility, "eligibility")
     
     async def load_ad_sales_data(self):
         """Load ad sales metrics data"""
-        try:
-            df = pd.read_excel(AD_SALES_FILE)
-            
-            # Clean and prepare data
-            numeric_columns = ['ad_sales', 'impressions', 'ad_spend', 'clicks', 'units_sold']
-            for col in numeric_columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
-            # FIXED: Convert date to string format
-            df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
-            
-            # Convert to list of tuples for insertion
-            data = [
-                (
-                    str(row['date']),  # Now it's already a string
-                    int(row['item_id']),
-                    float(row['ad_sales']),
-                    int(row['impressions']),
-                    float(row['ad_spend']),
-                    int(row['clicks']),
-                    int(row['units_sold'])
-                )
-                for _, row in df.iterrows()
-            ]
-            
-            # Clear existing data and insert new data
-            await self.db_manager.execute_query("DELETE FROM ad_sales_metrics")
-            
-            query = """
-                INSERT OR REPLACE INTO ad_sales_metrics 
-                (date, item_id, ad_sales, impressions, ad_spend, clicks, units_sold) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """
-            
-            await self.db_manager.execute_many(query, data)
-            logger.info(f"Loaded {len(data)} ad sales records")
-            
-        except Exception as e:
-            logger.error(f"Error loading ad sales data: {e}")
-            raise
+        columns = ['date', 'item_id', 'ad_sales', 'impressions', 'ad_spend', 'clicks', 'units_sold']
+        return await self._ingest(AD_SALES_FILE, "ad_sales_metrics", columns, self._prepare_ad_sales, "ad sales")
     
     async def load_total_sales_data(self):
         """Load total sales metrics data"""
+        columns = ['date', 'item_id', 'total_sales', 'total_units_ordered']
+        return await self._ingest(TOTAL_SALES_FILE, "total_sales_metrics", columns, self._prepare_total_sales, "total sales")
+    
+    async def _ingest(self, path: Path, table: str, columns: List[str],
+                      prepare: Callable[["pd.DataFrame"], List[tuple]], label: str) -> int:
+        """Stream an Excel file into a shadow table in chunks and swap it in atomically"""
         try:
-            df = pd.read_excel(TOTAL_SALES_FILE)
+            start_time = time.perf_counter()
             
-            # Clean and prepare data
-            df['total_sales'] = pd.to_numeric(df['total_sales'], errors='coerce').fillna(0)
-            df['total_units_ordered'] = pd.to_numeric(df['total_units_ordered'], errors='coerce').fillna(0)
+            batches = (prepare(df) for df in self._iter_excel_chunks(path))
+            count = await self.db_manager.replace_table(table, columns, batches)
             
-            # FIXED: Convert date to string format
-            df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
-            
-            # Convert to list of tuples for insertion
-            data = [
-                (
-                    str(row['date']),  # Now it's already a string
-                    int(row['item_id']),
-                    float(row['total_sales']),
-                    int(row['total_units_ordered'])
-                )
-                for _, row in df.iterrows()
-            ]
-            
-            # Clear existing data and insert new data
-            await self.db_manager.execute_query("DELETE FROM total_sales_metrics")
-            
-            query = """
-                INSERT OR REPLACE INTO total_sales_metrics 
-                (date, item_id, total_sales, total_units_ordered) 
-                VALUES (?, ?, ?, ?)
-            """
-            
-            await self.db_manager.execute_many(query, data)
-            logger.info(f"Loaded {len(data)} total sales records")
+            elapsed = time.perf_counter() - start_time
+            rate = count / elapsed if elapsed > 0 else 0.0
+            logger.info(f"Loaded {count} {label} records in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+            return count
             
         except Exception as e:
-            logger.error(f"Error loading total sales data: {e}")
+            logger.error(f"Error loading {label} data: {e}")
             raise
     
+    def _iter_excel_chunks(self, path: Path, chunk_size: int = None) -> Iterator["pd.DataFrame"]:
+        """Read the first sheet row by row and yield bounded DataFrame chunks"""
+        chunk_size = chunk_size or INGEST_CONFIG["chunk_size"]
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                yield pd.DataFrame.from_records(chunk, columns=header)
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _to_int(series: "pd.Series") -> "pd.Series":
+        """Coerce a column to int64 in one vectorized pass"""
+        return pd.to_numeric(series, errors='coerce').fillna(0).astype('int64')
+    
+    @staticmethod
+    def _to_float(series: "pd.Series") -> "pd.Series":
+        """Coerce a column to float64 in one vectorized pass"""
+        return pd.to_numeric(series, errors='coerce').fillna(0).astype('float64')
+    
+    def _prepare_eligibility(self, df: "pd.DataFrame") -> List[tuple]:
+        """Columnar conversion of an eligibility chunk into insert tuples"""
+        # tolist() converts each column to native Python values once, no per-row casts
+        return list(zip(
+            pd.to_datetime(df['eligibility_datetime_utc']).dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+            pd.to_numeric(df['item_id']).astype('int64').tolist(),
+            df['eligibility'].fillna(False).astype(bool).tolist(),
+            df['message'].fillna('').astype(str).tolist()
+        ))
+    
+    def _prepare_ad_sales(self, df: "pd.DataFrame") -> List[tuple]:
+        """Columnar conversion of an ad sales chunk into insert tuples"""
+        return list(zip(
+            pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d').tolist(),
+            pd.to_numeric(df['item_id']).astype('int64').tolist(),
+            self._to_float(df['ad_sales']).tolist(),
+            self._to_int(df['impressions']).tolist(),
+            self._to_float(df['ad_spend']).tolist(),
+            self._to_int(df['clicks']).tolist(),
+            self._to_int(df['units_sold']).tolist()
+        ))
+    
+    def _prepare_total_sales(self, df: "pd.DataFrame") -> List[tuple]:
+        """Columnar conversion of a total sales chunk into insert tuples"""
+        return list(zip(
+            pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d').tolist(),
+            pd.to_numeric(df['item_id']).astype('int64').tolist(),
+            self._to_float(df['total_sales']).tolist(),
+            self._to_int(df['total_units_ordered']).tolist()
+        ))
+    
     async def get_summary_stats(self) -> Dict[str, Any]:
         """Get summary statistics of the loaded data"""
         try:
@@ -0,0 +1,228 @@
+import hashlib
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+from core.database import (DatabaseManager, QueryWorkload, query_workload, result_cache, referenced_tables,
+                           SHADOW_SUFFIX, RETIRED_SUFFIX)
+from config import INDEX_ADVISOR_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_CLAUSE = re.compile(r"\b(where|group by|order by|having|limit)\b")
+_COLUMN = re.compile(r"(?:[a-z_]\w*\.)?([a-z_]\w*)")
+_EQUALITY = re.compile(r"(?:[a-z_]\w*\.)?([a-z_]\w*)\s*(?:==?|\bin\b|\bis\b)")
+_RANGE = re.compile(r"(?:[a-z_]\w*\.)?([a-z_]\w*)\s*(?:[<>]|\bbetween\b|\blike\b)")
+_SELECT_STAR = re.compile(r"^select\s+(?:distinct\s+)?(?:[a-z_]\w*\.)?\*")
+_SUBQUERY = re.compile(r"\(\s*select\b")
+
+@dataclass
+class IndexProposal:
+    """A composite (and, when it fits, covering) index serving one or more workload shapes"""
+    table: str
+    columns: Tuple[str, ...]
+    covering: bool
+    weight: float = 0.0  # Seconds the served shapes spent executing
+    shapes: List[str] = field(default_factory=list)
+    examples: List[Tuple[str, tuple]] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        digest = hashlib.sha1(",".join(self.columns).encode()).hexdigest()[:8]
+        return f"idx_{self.table}_{digest}"
+
+    @property
+    def create_sql(self) -> str:
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table}({', '.join(self.columns)})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "table": self.table,
+            "columns": list(self.columns),
+            "covering": self.covering,
+            "weight": self.weight,
+            "shapes": self.shapes,
+            "sql": self.create_sql
+        }
+
+class IndexAdvisor:
+    """Proposes indexes from the recorded query workload and measures them before keeping them.
+
+    Each single-table query part (subqueries included) gets equality columns first, then GROUP BY
+    columns, then one range column (or ORDER BY columns), then every other column it reads so the
+    plan becomes an index-only scan. Indexes are ordinary named indexes, so shadow reloads carry them over.
+    """
+
+    def __init__(self, db_manager: DatabaseManager = None, workload: QueryWorkload = None):
+        self.db_manager = db_manager or DatabaseManager()
+        self.workload = workload or query_workload
+        self.config = INDEX_ADVISOR_CONFIG
+        # Indexes that were measured and did not help are not proposed again
+        self._dropped: set = set()
+
+    async def propose(self) -> List[IndexProposal]:
+        """Indexes for the most expensive shapes that no existing index already covers, best first"""
+        tables = await self._tables()
+        proposals: Dict[Tuple[str, Tuple[str, ...]], IndexProposal] = {}
+
+        for entry in self.workload.top(self.config["top_shapes"], self.config["min_executions"]):
+            for part in self._parts(entry["shape"]):
+                referenced = referenced_tables(part)
+                if len(referenced) != 1 or referenced[0] not in tables or " join " in part:
+                    continue
+                table = referenced[0]
+                columns, indexes = tables[table]
+                proposal = self._propose_for(part, table, columns)
+                if proposal is None or proposal.name in self._dropped or self._covered(proposal, indexes):
+                    continue
+
+                merged = proposals.setdefault((table, proposal.columns), proposal)
+                merged.weight += entry["total_time"]
+                if entry["shape"] not in merged.shapes:
+                    merged.shapes.append(entry["shape"])
+                    merged.examples.append(entry["example"])
+
+        return sorted(self._merge_prefixes(list(proposals.values())), key=lambda p: p.weight, reverse=True)
+
+    async def apply(self, proposals: List[IndexProposal] = None) -> List[Dict[str, Any]]:
+        """Create each proposed index, time its queries before and after, and drop it unless it helped"""
+        if proposals is None:
+            proposals = await self.propose()
+        runs = self.config["benchmark_runs"]
+        report = []
+
+        for proposal in proposals:
+            try:
+                before = [await self.db_manager.benchmark(query, params, runs) for query, params in proposal.examples]
+                await self.db_manager.execute_write(proposal.create_sql)
+                # Plans cached by the cost guard were made without this index
+                result_cache.bump([proposal.table])
+                after = [await self.db_manager.benchmark(query, params, runs) for query, params in proposal.examples]
+
+                before_time = sum(result["median"] for result in before)
+                after_time = sum(result["median"] for result in after)
+                kept = after_time <= before_time * (1 - self.config["min_improvement"])
+                if not kept:
+                    await self.db_manager.execute_write(f"DROP INDEX IF EXISTS {proposal.name}")
+                    result_cache.bump([proposal.table])
+                    self._dropped.add(proposal.name)
+
+                logger.info(f"Index {proposal.name} on {proposal.table}{proposal.columns}: "
+                            f"{before_time * 1000:.2f}ms -> {after_time * 1000:.2f}ms, {'kept' if kept else 'dropped'}")
+                report.append({
+                    **proposal.to_dict(),
+                    "before_ms": before_time * 1000,
+                    "after_ms": after_time * 1000,
+                    "speedup": before_time / after_time if after_time else None,
+                    "index_only": any(f"COVERING INDEX {proposal.name}" in detail
+                                      for result in after for detail in result["plan"]),
+                    "plans_before": [result["plan"] for result in before],
+                    "plans_after": [result["plan"] for result in after],
+                    "kept": kept
+                })
+
+            except Exception as e:
+                logger.error(f"Error applying index {proposal.name}: {e}")
+                report.append({**proposal.to_dict(), "kept": False, "error": str(e)})
+
+        return report
+
+    async def _tables(self) -> Dict[str, Tuple[List[str], List[Tuple[str, ...]]]]:
+        """Live tables worth indexing -> (columns, column lists of their existing indexes)"""
+        rows = await self.db_manager.execute_query("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {}
+        for name in (row["name"] for row in rows):
+            if name.endswith((SHADOW_SUFFIX, RETIRED_SUFFIX)) or name.startswith("sqlite_"):
+                continue
+            count = await self.db_manager.execute_query(f"SELECT COUNT(*) as count FROM {name}", cache=True)
+            if count[0]["count"] < self.config["min_table_rows"]:
+                continue
+            columns = [row["name"] for row in await self.db_manager.execute_query(f"PRAGMA table_info({name})")]
+            indexes = []
+            for index in await self.db_manager.execute_query(f"PRAGMA index_list({name})"):
+                info = await self.db_manager.execute_query(f"PRAGMA index_info({index['name']})")
+                indexes.append(tuple(row["name"] for row in sorted(info, key=lambda row: row["seqno"])))
+            tables[name] = (columns, indexes)
+        return tables
+
+    @staticmethod
+    def _parts(shape: str) -> List[str]:
+        """The statement with subqueries cut out, followed by each subquery the same way"""
+        parts, pending = [], [shape]
+        while pending:
+            sql = pending.pop()
+            match = _SUBQUERY.search(sql)
+            while match:
+                depth, start = 0, match.start()
+                for end in range(start, len(sql)):
+                    depth += {"(": 1, ")": -1}.get(sql[end], 0)
+                    if depth == 0:
+                        break
+                pending.append(sql[start + 1:end].strip())
+                sql = sql[:start] + "?" + sql[end + 1:]
+                match = _SUBQUERY.search(sql)
+            parts.append(sql)
+        return parts
+
+    def _propose_for(self, part: str, table: str, columns: List[str]) -> Optional[IndexProposal]:
+        """Index for one single-table query part, or None when an index would not help it"""
+        known = set(columns)
+        pieces = _CLAUSE.split(part)
+        clauses = dict(zip(pieces[1::2], pieces[2::2]))
+
+        def columns_in(pattern: re.Pattern, text: str) -> List[str]:
+            return [column for column in pattern.findall(text or "") if column in known]
+
+        where = clauses.get("where", "")
+        group = columns_in(_COLUMN, clauses.get("group by"))
+        # ORDER BY after GROUP BY sorts aggregates, which no index on the table provides
+        order = [] if group else columns_in(_COLUMN, clauses.get("order by"))
+        # Grouping columns before the range column: the index then delivers groups in order and the
+        # range is filtered inside the index instead of sorting into a temp B-tree
+        keys = list(dict.fromkeys(columns_in(_EQUALITY, where) + group + columns_in(_RANGE, where)[:1] + order))
+
+        if _SELECT_STAR.match(part):
+            referenced = set(columns)
+        else:
+            referenced = set(columns_in(_COLUMN, part.split(" from ", 1)[0] + " " + " ".join(clauses.values())))
+        extras = [column for column in columns if column in referenced and column not in keys]
+
+        if not keys and not extras:
+            return None
+        # An index holding every column is just a second copy of the table
+        width = len(keys) + len(extras)
+        if width <= self.config["max_index_columns"] and width < len(columns):
+            return IndexProposal(table, tuple(keys + extras), covering=True)
+        if keys:
+            return IndexProposal(table, tuple(keys[:self.config["max_index_columns"]]), covering=False)
+        return None
+
+    @staticmethod
+    def _covered(proposal: IndexProposal, indexes: List[Tuple[str, ...]]) -> bool:
+        """An existing index with the same leading keys that already holds every needed column"""
+        for index in indexes:
+            if index[:len(proposal.columns)] == proposal.columns:
+                return True
+            if proposal.covering and set(proposal.columns) <= set(index) and index[0] == proposal.columns[0]:
+                return True
+        return False
+
+    @staticmethod
+    def _merge_prefixes(proposals: List[IndexProposal]) -> List[IndexProposal]:
+        """Fold an index into a wider one on the same table that starts with the same columns"""
+        proposals.sort(key=lambda p: len(p.columns), reverse=True)
+        kept: List[IndexProposal] = []
+        for proposal in proposals:
+            wider = next((other for other in kept if other.table == proposal.table
+                          and other.columns[:len(proposal.columns)] == proposal.columns), None)
+            if wider is None:
+                kept.append(proposal)
+                continue
+            wider.weight += proposal.weight
+            for shape, example in zip(proposal.shapes, proposal.examples):
+                if shape not in wider.shapes:
+                    wider.shapes.append(shape)
+                    wider.examples.append(example)
+        return kept
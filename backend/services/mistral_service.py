@@ -797,17 +797,68 @@ import subprocess
 import json
 import logging
 import re
-import requests
-from typing import List, Dict, Any
-from config import OLLAMA_MODEL
+import httpx
+from typing import List, Dict, Any, Optional, AsyncGenerator, Tuple
+from config import OLLAMA_MODEL, OLLAMA_API_URL, OLLAMA_CLIENT_CONFIG
+from utils.intent_classifier import intent_classifier, IntentMatch, FALLBACK_INTENTS
+from utils.sql_templates import sql_templates, inline_params
 
 logger = logging.getLogger(__name__)
 
 class MistralService:
     def __init__(self):
         self.model = OLLAMA_MODEL or "mistral:7b-instruct"
-        self.ollama_url = "http://localhost:11434/api/generate"
+        self.ollama_url = OLLAMA_API_URL
         self.schema_context = self._get_schema_context()
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    async def startup(self):
+        """Create the shared, connection-pooled HTTP client for Ollama"""
+        if self._client is None:
+            self._client = self._create_client()
+    
+    async def shutdown(self):
+        """Close the shared HTTP client and release pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def _create_client(self) -> httpx.AsyncClient:
+        """Build an AsyncClient with pool limits and connect/read timeouts from config"""
+        limits = httpx.Limits(
+            max_connections=OLLAMA_CLIENT_CONFIG["max_connections"],
+            max_keepalive_connections=OLLAMA_CLIENT_CONFIG["max_keepalive_connections"],
+            keepalive_expiry=OLLAMA_CLIENT_CONFIG["keepalive_expiry"]
+        )
+        timeout = httpx.Timeout(
+            OLLAMA_CLIENT_CONFIG["read_timeout"],
+            connect=OLLAMA_CLIENT_CONFIG["connect_timeout"]
+        )
+        return httpx.AsyncClient(limits=limits, timeout=timeout)
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared client; created lazily when startup() was not called (e.g. scripts)"""
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+    
+    async def _generate(self, prompt: str, temperature: float) -> str:
+        """Send a non-streaming generate request to Ollama and return the raw text"""
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {
+                "temperature": temperature
+            }
+        }
+        
+        response = await self.client.post(self.ollama_url, json=payload)
+        response.raise_for_status()
+        
+        response_data = response.json()
+        return response_data.get("response", "")
     
     def _get_schema_context(self) -> str:
         """Get simplified database schema context"""
@@ -815,6 +866,14 @@ class MistralService:
         Table 'ad_sales_metrics' has columns: date, item_id, ad_sales, impressions, ad_spend, clicks, units_sold
         Table 'product_eligibility' has columns: eligibility_datetime_utc, item_id, eligibility, message
         Table 'total_sales_metrics' has columns: date, item_id, total_sales, total_units_ordered
+        
+        Pre-aggregated rollups (prefer these for totals, rankings and trends; columns are already summed):
+        Table 'ad_sales_by_item' has columns: item_id, ad_sales, impressions, ad_spend, clicks, units_sold
+        Table 'ad_sales_by_day' has columns: date, ad_sales, impressions, ad_spend, clicks, units_sold
+        Table 'ad_sales_by_item_month' has columns: item_id, month (YYYY-MM), ad_sales, impressions, ad_spend, clicks, units_sold
+        Table 'total_sales_by_item' has columns: item_id, total_sales, total_units_ordered
+        Table 'total_sales_by_day' has columns: date, total_sales, total_units_ordered
+        Table 'total_sales_by_item_month' has columns: item_id, month (YYYY-MM), total_sales, total_units_ordered
         """
     
     def _clean_sql_from_response(self, raw_response: str) -> str:
@@ -835,25 +894,16 @@ class MistralService:
     
     def _should_use_fallback(self, question: str) -> bool:
         """Determine if we should skip AI and use fallback directly for reliable queries"""
-        question_lower = question.lower()
-        
         # Use fallback for these critical business queries
-        fallback_triggers = [
-            'total sales',
-            'roas',
-            'return on ad spend', 
-            'cpc',
-            'cost per click',
-            'top products',
-            'highest cpc',
-            'conversion rate'
-        ]
-        
-        return any(trigger in question_lower for trigger in fallback_triggers)
+        return intent_classifier.classify(question).intent in FALLBACK_INTENTS
     
     async def generate_sql(self, question: str) -> str:
+        """SQL text for a question, with any template parameters written inline"""
+        return inline_params(*await self.generate_query(question))
+    
+    async def generate_query(self, question: str) -> Tuple[str, tuple]:
         """
-        Generate SQL query - use fallback for critical business queries
+        Generate (sql, params) - use templates for critical business queries
         """
         
         # For critical business queries, skip AI and use reliable fallback
@@ -888,20 +938,7 @@ SQL Query:
 """
         
         try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.0
-                }
-            }
-            
-            response = requests.post(self.ollama_url, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            response_data = response.json()
-            raw_response = response_data.get("response", "")
+            raw_response = await self._generate(prompt, temperature=0.0)
             
             sql_query = self._clean_sql_from_response(raw_response)
             
@@ -910,7 +947,7 @@ SQL Query:
                 return self._fallback_sql(question)
             
             logger.info(f"Generated SQL: {sql_query}")
-            return sql_query
+            return sql_query, ()
             
         except Exception as e:
             logger.error(f"Error generating SQL: {e}")
@@ -918,9 +955,56 @@ SQL Query:
     
     async def generate_response(self, question: str, sql_query: str, results: List[Dict]) -> str:
         """Generate human-readable response"""
+        prompt = self._build_response_prompt(question, sql_query, results)
+        
+        try:
+            response_text = await self._generate(prompt, temperature=0.3)
+            return response_text.strip()
+            
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            return self._fallback_response(question, results)
+    
+    async def stream_response(self, question: str, sql_query: str, results: List[Dict]) -> AsyncGenerator[str, None]:
+        """Stream the human-readable response token by token as Ollama produces it"""
+        prompt = self._build_response_prompt(question, sql_query, results)
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+            "options": {
+                "temperature": 0.3
+            }
+        }
+        
+        tokens_sent = False
+        try:
+            async with self.client.stream("POST", self.ollama_url, json=payload) as response:
+                response.raise_for_status()
+                
+                # Ollama streams one JSON object per line until "done" is true
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    token = chunk.get("response", "")
+                    if token:
+                        tokens_sent = True
+                        yield token
+                    if chunk.get("done"):
+                        break
+                        
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            # Only fall back if nothing was sent, otherwise the answer would be duplicated
+            if not tokens_sent:
+                yield self._fallback_response(question, results)
+    
+    def _build_response_prompt(self, question: str, sql_query: str, results: List[Dict]) -> str:
+        """Build the answer prompt shared by the blocking and streaming paths"""
         formatted_results = self._format_results(results)
         
-        prompt = f"""Based on the SQL query results, provide a clear business answer.
+        return f"""Based on the SQL query results, provide a clear business answer.
 
 Question: {question}
 SQL Query: {sql_query}
@@ -928,26 +1012,6 @@ Results: {formatted_results}
 
 Provide a concise, business-friendly answer with specific numbers and insights.
 """
-        
-        try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.3
-                }
-            }
-            
-            response = requests.post(self.ollama_url, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            response_data = response.json()
-            return response_data.get("response", "").strip()
-            
-        except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            return self._fallback_response(question, results)
     
     def _format_results(self, results: List[Dict]) -> str:
         """Format query results for LLM consumption"""
@@ -962,121 +1026,81 @@ Provide a concise, business-friendly answer with specific numbers and insights.
         
         return formatted
     
-    def _fallback_sql(self, question: str) -> str:
-        """Generate reliable fallback SQL queries for business metrics"""
-        question_lower = question.lower()
+    def _fallback_sql(self, question: str) -> Tuple[str, tuple]:
+        """Parameterized SQL for deterministic intents, or a safe default"""
+        rendered = sql_templates.render(intent_classifier.classify(question))
+        if rendered is not None:
+            return rendered
         
-        if 'total sales' in question_lower:
-            return "SELECT SUM(total_sales) as total_sales FROM total_sales_metrics"
-            
-        elif 'roas' in question_lower or 'return on ad spend' in question_lower:
-            # Simple, reliable ROAS calculation
-            return """
-                SELECT 
-                    SUM(ad_sales) / NULLIF(SUM(ad_spend), 0) as roas,
-                    SUM(ad_sales) as total_ad_sales,
-                    SUM(ad_spend) as total_ad_spend,
-                    COUNT(DISTINCT item_id) as products_with_ads
-                FROM ad_sales_metrics 
-                WHERE ad_spend > 0
-            """
-            
-        elif ('cpc' in question_lower or 'cost per click' in question_lower) and 'highest' in question_lower:
-            # Find product with highest CPC
-            return """
-                SELECT 
-                    item_id,
-                    SUM(ad_spend) / NULLIF(SUM(clicks), 0) as cpc,
-                    SUM(ad_spend) as total_spend,
-                    SUM(clicks) as total_clicks
-                FROM ad_sales_metrics 
-                WHERE clicks > 0 
-                GROUP BY item_id
-                ORDER BY cpc DESC 
-                LIMIT 1
-            """
-            
-        elif 'cpc' in question_lower or 'cost per click' in question_lower:
-            # General CPC analysis
-            return """
-                SELECT 
-                    item_id,
-                    SUM(ad_spend) / NULLIF(SUM(clicks), 0) as cpc,
-                    SUM(ad_spend) as total_spend,
-                    SUM(clicks) as total_clicks
-                FROM ad_sales_metrics 
-                WHERE clicks > 0 
-                GROUP BY item_id
-                ORDER BY cpc DESC 
-                LIMIT 10
-            """
-            
-        elif 'top' in question_lower and ('product' in question_lower or 'item' in question_lower):
-            # Top products by sales
-            return """
-                SELECT 
-                    item_id,
-                    SUM(total_sales) as total_sales,
-                    SUM(total_units_ordered) as total_units
-                FROM total_sales_metrics 
-                GROUP BY item_id 
-                ORDER BY total_sales DESC 
-                LIMIT 10
-            """
-            
-        elif 'conversion rate' in question_lower:
-            # Conversion rate analysis
-            return """
-                SELECT 
-                    item_id,
-                    SUM(units_sold) / NULLIF(SUM(clicks), 0) as conversion_rate,
-                    SUM(units_sold) as total_units_sold,
-                    SUM(clicks) as total_clicks
-                FROM ad_sales_metrics 
-                WHERE clicks > 0 
-                GROUP BY item_id
-                ORDER BY conversion_rate DESC 
-                LIMIT 10
-            """
-            
-        else:
-            return "SELECT COUNT(*) as total_records FROM total_sales_metrics"
+        return "SELECT COUNT(*) as total_records FROM total_sales_metrics", ()
     
     def _fallback_response(self, question: str, results: List[Dict]) -> str:
         """Generate fallback response when LLM fails"""
         if not results:
             return f"No data found for your question: '{question}'"
         
-        question_lower = question.lower()
+        intent = intent_classifier.classify(question)
+        window = self._window_text(intent)
+        scope = window or "across all products and time periods"
         
-        if 'total sales' in question_lower and results:
-            total = results[0].get('total_sales', 0)
-            return f"Your total sales amount to ${total:,.2f} across all products and time periods."
+        if intent.intent == 'total_sales' and results:
+            total = results[0].get('total_sales')
+            # SUM over an empty window is NULL
+            if total is None:
+                return f"No sales were recorded {scope}."
+            return f"Your total sales amount to ${total:,.2f} {scope}."
         
-        elif 'roas' in question_lower and results:
+        elif intent.intent == 'roas' and 'products_with_ads' in results[0]:
             data = results[0]
-            roas = data.get('roas', 0)
-            ad_sales = data.get('total_ad_sales', 0)
-            ad_spend = data.get('total_ad_spend', 0)
-            products = data.get('products_with_ads', 0)
-            return f"Your Return on Ad Spend (ROAS) is {roas:.2f}x. You've generated ${ad_sales:,.2f} in ad sales from ${ad_spend:,.2f} in ad spend across {products} products."
-        
-        elif 'cpc' in question_lower and 'highest' in question_lower and results:
+            if data.get('roas') is None:
+                return f"There was no ad spend {scope}, so ROAS cannot be calculated."
+            roas = data['roas']
+            ad_sales = data.get('total_ad_sales') or 0
+            ad_spend = data.get('total_ad_spend') or 0
+            products = data.get('products_with_ads') or 0
+            return f"Your Return on Ad Spend (ROAS) is {roas:.2f}x{' ' + window if window else ''}. You've generated ${ad_sales:,.2f} in ad sales from ${ad_spend:,.2f} in ad spend across {products} products."
+        
+        elif intent.intent == 'cpc' and intent.top_n == 1 and results:
             item = results[0]
-            cpc = item.get('cpc', 0)
+            cpc = item.get('cpc') or 0
             item_id = item.get('item_id', 'Unknown')
-            total_spend = item.get('total_spend', 0)
-            total_clicks = item.get('total_clicks', 0)
-            return f"Product {item_id} has the highest Cost Per Click at ${cpc:.2f}. This product spent ${total_spend:,.2f} and received {total_clicks:,} clicks."
+            total_spend = item.get('total_spend') or 0
+            total_clicks = item.get('total_clicks') or 0
+            # Same direction the template ordered by
+            extreme = "lowest" if intent.sort == 'asc' else "highest"
+            return f"Product {item_id} has the {extreme} Cost Per Click at ${cpc:.2f}{' ' + window if window else ''}. This product spent ${total_spend:,.2f} and received {total_clicks:,} clicks."
         
-        elif 'top' in question_lower and ('product' in question_lower or 'item' in question_lower):
+        elif intent.intent == 'top_products':
             if results:
-                response = "Top products by sales:\n"
+                ranking = "Bottom" if intent.sort == 'asc' else "Top"
+                response = f"{ranking} products by sales{' ' + window if window else ''}:\n"
                 for i, item in enumerate(results[:5], 1):
                     item_id = item.get('item_id', 'Unknown')
-                    sales = item.get('total_sales', 0)
-                    units = item.get('total_units', 0)
+                    sales = item.get('total_sales') or 0
+                    units = item.get('total_units') or 0
                     response += f"{i}. Product {item_id}: ${sales:,.2f} ({units:,} units)\n"
                 return response.strip()
         
         return f"Found {len(results)} results for your query: '{question}'"
+    
+    @staticmethod
+    def _window_text(intent: IntentMatch) -> Optional[str]:
+        """Phrase for the date window and products a templated answer is limited to, if any"""
+        windowed = bool(intent.start_date or intent.end_date or intent.last_days)
+        if not windowed and not intent.item_ids:
+            return None
+        if intent.start_date and intent.end_date:
+            period = f"from {intent.start_date} to {intent.end_date}"
+        elif intent.start_date:
+            period = f"since {intent.start_date}"
+        elif intent.end_date:
+            period = f"through {intent.end_date}"
+        elif intent.last_days:
+            period = f"over the last {intent.last_days} days of data"
+        else:
+            period = "across all time periods"
+        
+        if not intent.item_ids:
+            return f"{period} for all products"
+        label = "product" if len(intent.item_ids) == 1 else "products"
+        return f"for {label} {', '.join(str(item_id) for item_id in intent.item_ids)} {period}"
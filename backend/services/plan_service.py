@@ -0,0 +1,312 @@
+import asyncio
+import aiosqlite
+import math
+import re
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+
+from core.database import DatabaseManager, ROLLUP_MEASURES, canonicalize_sql
+from config import QUERY_COST_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# "SCAN t", "SCAN t USING COVERING INDEX i", "SEARCH t USING INDEX i (item_id=?)"; older SQLite writes "SCAN TABLE t"
+_LOOP = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\S+)(?: AS \S+)?(?: USING (.*))?$")
+_SEARCH_TERMS = re.compile(r"\(([^()]*)\)$")
+_TEMP_BTREE = re.compile(r"USE TEMP B-TREE FOR (.+)$")
+_LIMIT = re.compile(r"\blimit\s+(\d+|\?)(?:\s+offset\s+(\d+|\?))?\s*$")
+_AGGREGATE = re.compile(r"\bgroup\s+by\b|\bdistinct\b|\b(?:sum|count|avg|min|max|total|group_concat)\s*\(")
+_NOT_ALIASES = {
+    "where", "on", "using", "join", "inner", "left", "right", "full", "cross", "natural", "outer",
+    "group", "order", "limit", "union", "except", "intersect", "having", "window", "as", "from", "select"
+}
+_TABLE_ALIAS = re.compile(
+    r"(?:\bfrom|\bjoin|,)\s+([a-z_][a-z0-9_]*)"
+    r"(?:\s+(?:as\s+)?(?!(?:" + "|".join(_NOT_ALIASES) + r")\b)([a-z_][a-z0-9_]*))?"
+)
+
+# Base-table aggregates that a rollup answers exactly: plain SUMs/COUNT(*) grouped by a rollup key (or not at all)
+_ROLLUP_CANDIDATE = re.compile(
+    r"^\s*select\s+(?P<select>.+?)\s+from\s+(?P<table>ad_sales_metrics|total_sales_metrics)"
+    r"(?:\s+group\s+by\s+(?P<key>item_id|date))?(?P<tail>\s+(?:having|order\s+by|limit)\s.*)?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+_ROLLUP_ITEM = re.compile(
+    r"^(?:(?P<key>item_id|date)|sum\(\s*(?P<column>[a-z_]+)\s*\)|(?P<count>count\(\s*\*\s*\)))"
+    r"(?:\s+as\s+(?P<alias>[a-z_][a-z0-9_]*|\"[^\"]*\"))?$",
+    re.IGNORECASE
+)
+_SUM_OR_COUNT = re.compile(r"sum\(\s*([a-z_]+)\s*\)|count\(\s*\*\s*\)", re.IGNORECASE)
+_TAIL_WORDS = {"having", "order", "by", "limit", "offset", "asc", "desc", "and", "or", "not", "nulls", "first", "last"}
+_ROLLUP_GRAIN = {"item_id": "_by_item", "date": "_by_day", None: "_by_item"}
+
+@dataclass
+class QueryPlan:
+    """EXPLAIN QUERY PLAN of one statement, its estimated cost and what the guard decided"""
+    query: str
+    params: tuple = ()
+    steps: List[Dict[str, Any]] = field(default_factory=list)
+    cost: float = 0.0  # Estimated rows visited, including sorts
+    rows: float = 0.0  # Estimated result rows
+    issues: List[Dict[str, Any]] = field(default_factory=list)
+    action: str = "allow"  # allow, queue or reject
+    rewrite: Optional[str] = None
+    original_query: Optional[str] = None
+
+    def to_dict(self, include_steps: bool = True) -> Dict[str, Any]:
+        """Plan summary for API responses"""
+        summary = {
+            "estimated_cost": round(self.cost),
+            "estimated_rows": round(self.rows),
+            "action": self.action,
+            "rewrite": self.rewrite,
+            "issues": self.issues
+        }
+        if include_steps:
+            summary["steps"] = self.steps
+        return summary
+
+    def suggestions(self) -> List[str]:
+        """Index and query-shape advice derived from the plan"""
+        advice = {
+            "full_scan": "Full scan of {table}: filter on an indexed column (item_id, date) or use a rollup table",
+            "missing_index": "SQLite builds a temporary index on {table} for every run: add a permanent index on the join column",
+            "cartesian_join": "{table} is joined without a usable join condition (cartesian product)",
+            "temp_btree": "{purpose} sorts through a temporary B-tree: an index on those columns or a LIMIT avoids it"
+        }
+        return [advice[issue["type"]].format(**issue) for issue in self.issues if issue["type"] in advice]
+
+class QueryCostError(Exception):
+    """A generated query's estimated cost is above the reject threshold"""
+
+    def __init__(self, plan: QueryPlan, limit: float):
+        self.plan = plan
+        super().__init__(f"Query rejected: estimated cost {plan.cost:,.0f} rows exceeds the limit of {limit:,.0f}")
+
+class PlanService:
+    """Cost guard for generated SQL: explain, estimate, then allow, rewrite, queue or reject"""
+
+    def __init__(self, db_manager: DatabaseManager = None):
+        self.db_manager = db_manager or DatabaseManager()
+        self.config = QUERY_COST_CONFIG
+        self._expensive = asyncio.Semaphore(self.config["max_expensive_concurrency"])
+
+    async def review(self, query: str, params: tuple = None,
+                     connection: aiosqlite.Connection = None) -> QueryPlan:
+        """Plan to execute (possibly rewritten); raises QueryCostError when the query is rejected"""
+        plan = await self.analyze(query, params, connection)
+        if plan.action == "reject":
+            logger.warning(f"Rejected query (cost {plan.cost:,.0f}): {query[:100]}")
+            raise QueryCostError(plan, self.config["reject_cost"])
+        if plan.rewrite:
+            logger.info(f"Rewrote query ({plan.rewrite}), cost now {plan.cost:,.0f}: {plan.original_query[:100]}")
+        return plan
+
+    async def analyze(self, query: str, params: tuple = None,
+                      connection: aiosqlite.Connection = None) -> QueryPlan:
+        """Explain and cost a statement and decide what to do with it, without raising"""
+        plan = await self.explain(query, params, connection)
+        if not self.config.get("enabled", True) or plan.cost <= self.config["rewrite_cost"]:
+            return plan
+
+        # Cheaper equivalents first: a rollup instead of daily rows, then a LIMIT on row-streaming queries
+        for rewrite, rewritten in (("rollup", self._rollup_rewrite(plan.query)),
+                                   ("limit", self._limit_rewrite(plan))):
+            if rewritten is None:
+                continue
+            candidate = await self.explain(rewritten, plan.params, connection)
+            if rewrite == "rollup" and not await self._rollup_ready(candidate, connection):
+                continue
+            if candidate.cost < plan.cost:
+                candidate.rewrite = rewrite
+                candidate.original_query = query
+                plan = candidate
+
+        if plan.cost > self.config["reject_cost"]:
+            plan.action = "reject"
+        elif plan.cost > self.config["queue_cost"]:
+            plan.action = "queue"
+        return plan
+
+    @asynccontextmanager
+    async def admit(self, plan: QueryPlan) -> AsyncIterator[None]:
+        """Queued plans run one (max_expensive_concurrency) at a time; the rest run immediately"""
+        if plan.action != "queue":
+            yield
+            return
+        async with self._expensive:
+            yield
+
+    async def explain(self, query: str, params: tuple = None,
+                      connection: aiosqlite.Connection = None) -> QueryPlan:
+        """EXPLAIN QUERY PLAN plus a row-count based cost estimate"""
+        params = tuple(params or ())
+        steps = await self.db_manager.explain(query, params, connection)
+
+        canonical = canonicalize_sql(query)
+        aliases = self._aliases(canonical)
+        counts = await self._row_counts(set(aliases.values()), connection)
+        plan = QueryPlan(query=query, params=params, steps=steps)
+
+        children: Dict[int, List[Dict[str, Any]]] = {}
+        for step in steps:
+            children.setdefault(step["parent"], []).append(step)
+        plan.cost, plan.rows = self._cost(0, children, aliases, counts, plan.issues)
+
+        # Queries that stream rows stop at their LIMIT; sorts and aggregates still read everything
+        limit = self._limit(canonical, params)
+        if limit is not None and plan.rows > limit and not _AGGREGATE.search(canonical) \
+                and not any(issue["type"] == "temp_btree" for issue in plan.issues):
+            plan.cost = min(plan.cost, plan.cost / plan.rows * limit)
+            plan.rows = limit
+        return plan
+
+    def _cost(self, parent: int, children: Dict[int, List[Dict[str, Any]]], aliases: Dict[str, str],
+              counts: Dict[str, int], issues: List[Dict[str, Any]]) -> Tuple[float, float]:
+        """(cost, rows) of the loops under one plan node; sibling loops nest, outer to inner"""
+        cost, rows, loops = 0.0, 1.0, 0
+        for step in children.get(parent, []):
+            detail = step["detail"]
+            loop = _LOOP.match(detail)
+            sort = _TEMP_BTREE.match(detail)
+
+            if detail == "SCAN CONSTANT ROW":
+                cost += rows
+            elif loop:
+                kind, name, using = loop.groups()
+                table = aliases.get(name, name)
+                total = counts.get(table, max(counts.values(), default=1))
+                estimate = self._loop_rows(kind, using or "", total)
+                self._loop_issues(kind, using or "", table, loops, issues)
+                rows *= estimate
+                # Automatic indexes are built from a full scan before the loop starts
+                cost += rows + (total if "AUTOMATIC" in (using or "") else 0)
+                loops += 1
+            elif sort:
+                issues.append({"type": "temp_btree", "purpose": sort.group(1)})
+                cost += rows * math.log2(max(rows, 2))
+            elif detail.startswith("CORRELATED"):
+                # Re-run for every outer row
+                cost += rows * self._cost(step["id"], children, aliases, counts, issues)[0]
+            else:
+                # Subqueries, co-routines, compound parts: evaluated once
+                sub_cost, sub_rows = self._cost(step["id"], children, aliases, counts, issues)
+                cost += sub_cost
+                if not loops and detail.startswith(("COMPOUND", "MULTI-INDEX")):
+                    rows = sub_rows
+        return cost, rows
+
+    @staticmethod
+    def _loop_rows(kind: str, using: str, total: int) -> float:
+        """Rows one pass of a SCAN/SEARCH loop visits"""
+        if kind == "SCAN":
+            return float(max(total, 1))
+        terms = _SEARCH_TERMS.search(using)
+        terms = terms.group(1).split(" AND ") if terms else []
+        equalities = sum(1 for term in terms if "=" in term and not any(op in term for op in ("<", ">")))
+        if "PRIMARY KEY" in using and "INDEX" not in using and equalities:
+            return 1.0
+        # Each equality keeps ~10% of the rows, any range ~25%
+        selectivity = 0.1 ** equalities * (0.25 if len(terms) > equalities else 1.0)
+        return max(total * selectivity, 1.0)
+
+    @staticmethod
+    def _loop_issues(kind: str, using: str, table: str, position: int, issues: List[Dict[str, Any]]):
+        """Plan problems visible on one loop"""
+        if "AUTOMATIC" in using:
+            issues.append({"type": "missing_index", "table": table})
+        elif kind == "SCAN" and not using:
+            issues.append({"type": "cartesian_join" if position else "full_scan", "table": table})
+
+    @staticmethod
+    def _aliases(canonical: str) -> Dict[str, str]:
+        """Names the plan may use (table or alias) -> table"""
+        aliases = {}
+        for table, alias in _TABLE_ALIAS.findall(canonical):
+            aliases[table] = table
+            if alias:
+                aliases[alias] = table
+        return aliases
+
+    async def _row_counts(self, names: set, connection: aiosqlite.Connection = None) -> Dict[str, int]:
+        """Row counts of the referenced tables; cached until a table is reloaded.
+        
+        With a held connection (a batch snapshot) they are read on it: borrowing a second
+        reader could wait forever when the snapshots hold the whole pool.
+        """
+        tables = await self.db_manager.execute_query(
+            "SELECT name FROM sqlite_master WHERE type = 'table'", connection=connection, cache=True
+        )
+        counts = {}
+        for name in sorted(names & {row["name"] for row in tables}):
+            rows = await self.db_manager.execute_query(f"SELECT COUNT(*) as count FROM {name}",
+                                                       connection=connection, cache=True)
+            counts[name] = rows[0]["count"]
+        return counts
+
+    @staticmethod
+    def _limit(canonical: str, params: tuple) -> Optional[int]:
+        """Outermost LIMIT (+ OFFSET) of a statement, resolving trailing placeholders"""
+        match = _LIMIT.search(canonical)
+        if not match:
+            return None
+        values = list(params[-(match.group(0).count("?")):]) if "?" in match.group(0) else []
+        try:
+            limit, offset = (int(values.pop(0)) if group == "?" else int(group or 0) for group in match.groups())
+        except (TypeError, ValueError):
+            return None
+        return limit + offset
+
+    def _limit_rewrite(self, plan: QueryPlan) -> Optional[str]:
+        """Wrap a row-streaming query without a LIMIT in one; the pipeline truncates there anyway"""
+        canonical = canonicalize_sql(plan.query)
+        if _LIMIT.search(canonical) or _AGGREGATE.search(canonical) \
+                or any(issue["type"] == "temp_btree" for issue in plan.issues):
+            return None
+        return f"SELECT * FROM ({plan.query.strip().rstrip(';')}) LIMIT {self.config['rewrite_limit']}"
+
+    def _rollup_rewrite(self, query: str) -> Optional[str]:
+        """Same aggregate over the matching rollup table, or None when the query is not an exact fit"""
+        match = _ROLLUP_CANDIDATE.match(query)
+        if not match:
+            return None
+        table, key = match.group("table").lower(), (match.group("key") or "").lower() or None
+        measures = ROLLUP_MEASURES[table]
+
+        select, names = [], set()
+        for item in (part.strip() for part in match.group("select").split(",")):
+            parsed = _ROLLUP_ITEM.match(item)
+            if not parsed:
+                return None
+            if parsed.group("key") and parsed.group("key").lower() != key:
+                return None
+            if parsed.group("column") and measures.get(parsed.group("column").lower()) != parsed.group("column").lower():
+                return None
+            if parsed.group("alias"):
+                names.add(parsed.group("alias").strip('"').lower())
+            if parsed.group("count"):
+                # Keep the result column name the original expression would have had
+                alias = parsed.group("alias") or '"' + item.replace('"', '""') + '"'
+                item = f"SUM(row_count) AS {alias}"
+            select.append(item)
+
+        tail = match.group("tail") or ""
+        for column in _SUM_OR_COUNT.findall(tail):
+            if column and measures.get(column.lower()) != column.lower():
+                return None
+        words = set(re.findall(r"[a-z_][a-z0-9_]*", _SUM_OR_COUNT.sub("", tail).lower()))
+        if words - _TAIL_WORDS - names - {key}:
+            return None
+        tail = re.sub(r"count\(\s*\*\s*\)", "SUM(row_count)", tail, flags=re.IGNORECASE)
+
+        rollup = table.replace("_metrics", _ROLLUP_GRAIN[key])
+        group_by = f" GROUP BY {key}" if key else ""
+        return f"SELECT {', '.join(select)} FROM {rollup}{group_by}{tail}"
+
+    async def _rollup_ready(self, plan: QueryPlan, connection: aiosqlite.Connection = None) -> bool:
+        """A rollup is only used once it has been built for its (non-empty) source"""
+        rollup = next(iter(self._aliases(canonicalize_sql(plan.query)).values()), None)
+        counts = await self._row_counts({rollup, rollup.rsplit("_by_", 1)[0] + "_metrics"}, connection) if rollup else {}
+        return bool(counts.get(rollup)) or not any(counts.values())
@@ -0,0 +1,157 @@
+import asyncio
+import aiosqlite
+import time
+import logging
+from typing import Dict, List, Any, Callable, Awaitable, Optional, Tuple
+
+from core.database import DatabaseManager
+from services.mistral_service import MistralService
+from services.chart_service import ChartService
+from services.plan_service import PlanService, QueryPlan
+from services.columnar_service import columnar_service
+from utils.intent_classifier import intent_classifier
+from utils.sql_templates import sql_templates, inline_params
+from config import QUERY_RESULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# (plan, (rows, truncated)) of a question whose SQL has already run
+Prepared = Optional[Tuple[QueryPlan, Tuple[List[Dict[str, Any]], bool]]]
+
+async def _ready(value: Any) -> Any:
+    return value
+
+class StageGraph:
+    """Small dependency graph of async stages; a stage starts as soon as its inputs are ready"""
+
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], *deps: str) -> "StageGraph":
+        """Register a stage; it receives the outputs of `deps` as positional arguments"""
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {', '.join(missing)}")
+        self._stages[name] = (func, deps)
+        return self
+
+    async def run(self) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Run every stage and return (outputs, per-stage seconds)"""
+        tasks: Dict[str, asyncio.Task] = {}
+        timings: Dict[str, float] = {}
+
+        async def run_stage(name: str):
+            func, deps = self._stages[name]
+            inputs = [await tasks[dep] for dep in deps]
+            start = time.perf_counter()
+            try:
+                return await func(*inputs)
+            finally:
+                timings[name] = time.perf_counter() - start
+
+        # Stages are registered after their dependencies, so tasks exist before they are awaited
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        return {name: task.result() for name, task in tasks.items()}, timings
+
+class QueryPipeline:
+    """Question -> SQL -> rows -> (answer text || chart), with the chart built off the event loop"""
+
+    def __init__(self, db_manager: DatabaseManager = None, mistral_service: MistralService = None,
+                 chart_service: ChartService = None, plan_service: PlanService = None):
+        self.db_manager = db_manager or DatabaseManager()
+        self.mistral_service = mistral_service or MistralService()
+        self.chart_service = chart_service or ChartService()
+        self.plan_service = plan_service or PlanService(self.db_manager)
+
+    def build(self, question: str, include_chart: bool = True,
+              connection: aiosqlite.Connection = None, prepared: Prepared = None) -> StageGraph:
+        """Stage graph for one question; response and chart only depend on sql/results.
+
+        With `prepared` (plan, fetched) from fetch(), the SQL already ran and only the
+        answer and chart stages are left.
+        """
+        graph = StageGraph()
+        if prepared is None:
+            # Template SQL arrives with bound parameters; the LLM and the API see it with literals inlined
+            graph.add("generate_sql", lambda: self.mistral_service.generate_query(question))
+            # Cost guard: EXPLAIN QUERY PLAN before anything runs; may rewrite, queue or reject the query
+            graph.add("plan_query", lambda query: self.plan_service.review(*query, connection=connection), "generate_sql")
+            graph.add("execute_query", lambda plan: self.execute(plan, connection, question), "plan_query")
+        else:
+            graph.add("plan_query", lambda: _ready(prepared[0]))
+            graph.add("execute_query", lambda: _ready(prepared[1]))
+        graph.add("generate_response",
+                  lambda plan, fetched: self.mistral_service.generate_response(
+                      question, inline_params(plan.query, plan.params), fetched[0]),
+                  "plan_query", "execute_query")
+        if include_chart:
+            # CPU-bound pandas/plotly work runs in a worker thread while the LLM call is in flight
+            graph.add("generate_chart",
+                      lambda fetched: asyncio.to_thread(self.chart_service.generate_chart_data, question, fetched[0]),
+                      "execute_query")
+        return graph
+
+    async def fetch(self, query: Tuple[str, tuple], question: str,
+                    connection: aiosqlite.Connection = None) -> Prepared:
+        """Plan and execute generated SQL only, e.g. on a snapshot held just for the SQL stages"""
+        plan = await self.plan_service.review(*query, connection=connection)
+        return plan, await self.execute(plan, connection, question)
+
+    async def execute(self, plan: QueryPlan, connection: aiosqlite.Connection = None,
+                       question: str = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """(rows, truncated): answers are buffered whole, so they are capped at max_buffered_rows"""
+        limit = QUERY_RESULT_CONFIG["max_buffered_rows"]
+        rows = None
+        if connection is None:
+            await self.db_manager.check_external_writes()
+            rows = self._columnar_rows(plan, question)
+        if rows is None:
+            # Fetching one row past the cap tells whether anything was cut off
+            async with self.plan_service.admit(plan):
+                rows = await self.db_manager.execute_query(plan.query, plan.params, connection=connection,
+                                                           cache=True, max_rows=limit + 1)
+        if len(rows) > limit:
+            logger.warning(f"Result truncated to {limit} rows: {inline_params(plan.query, plan.params)[:100]}")
+            return rows[:limit], True
+        return rows, False
+
+    @staticmethod
+    def _columnar_rows(plan: QueryPlan, question: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """Template answers straight from the columnar snapshot; batch snapshots keep reading SQLite"""
+        if question is None or plan.rewrite:
+            return None
+        match = intent_classifier.classify(question)
+        # Only when the statement about to run is exactly the template for this intent
+        if sql_templates.render(match) != (plan.query, plan.params):
+            return None
+        return columnar_service.answer(match)
+
+    async def run(self, question: str, include_chart: bool = True,
+                  connection: aiosqlite.Connection = None, prepared: Prepared = None) -> Dict[str, Any]:
+        """Run the pipeline and return sql_query, results, truncated, response, chart_data, query_plan and stage_timings"""
+        outputs, timings = await self.build(question, include_chart, connection, prepared).run()
+
+        chart_data: Optional[Dict[str, Any]] = outputs.get("generate_chart")
+        if chart_data:
+            logger.info(f"Generated {chart_data.get('type', 'unknown')} chart with {len(chart_data.get('data', []))} data points")
+
+        plan: QueryPlan = outputs["plan_query"]
+        return {
+            "sql_query": inline_params(plan.query, plan.params),
+            "results": outputs["execute_query"][0],
+            "truncated": outputs["execute_query"][1],
+            "response": outputs["generate_response"],
+            "chart_data": chart_data,
+            "query_plan": plan.to_dict(include_steps=False),
+            "stage_timings": timings
+        }
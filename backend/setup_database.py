@@ -22,6 +22,7 @@ async def main():
         # Initialize database
         db_manager = DatabaseManager()
         await db_manager.initialize()
+        await db_manager.close()
         
         logger.info("Database initialized successfully!")
         logger.info("✅ Database setup complete!")
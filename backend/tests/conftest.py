@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest_asyncio
+
+# Tests import backend modules the way the app does (from the backend directory)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.database import DatabaseManager
+from fixtures.sample_data import load_sample_data
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    """DatabaseManager on a fresh file loaded with the sample data"""
+    manager = DatabaseManager(str(tmp_path / "test.db"))
+    await load_sample_data(manager)
+    yield manager
+    await manager.close()
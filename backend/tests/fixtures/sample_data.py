@@ -0,0 +1,57 @@
+import random
+from datetime import date, timedelta
+from typing import Dict, List
+
+from core.database import DatabaseManager
+
+START_DATE = date(2025, 6, 1)
+
+def eligibility_rows(items: int = 20) -> List[tuple]:
+    """Two status changes per item; the later one wins"""
+    rows = []
+    for item_id in range(1, items + 1):
+        rows.append(("2025-06-01 00:00:00", item_id, 1, "Eligible"))
+        rows.append(("2025-06-15 12:00:00", item_id, int(item_id % 4 != 0), "Eligible" if item_id % 4 else "Ineligible"))
+    return rows
+
+def ad_sales_rows(days: int = 30, items: int = 20, seed: int = 7) -> List[tuple]:
+    """Daily ad metrics with zero-spend, zero-click and zero-impression rows, like the real exports"""
+    rng = random.Random(seed)
+    rows = []
+    for day in range(days):
+        for item_id in range(1, items + 1):
+            clicks = rng.choice([0, 0, 1, 3, 8, 20])
+            impressions = clicks * rng.randint(10, 50) if clicks else rng.choice([0, 100])
+            ad_spend = round(clicks * rng.uniform(0.1, 2.5), 2)
+            ad_sales = round(rng.uniform(0, 200), 2) if clicks else 0.0
+            units_sold = rng.randint(0, clicks)
+            rows.append(((START_DATE + timedelta(days=day)).isoformat(), item_id,
+                         ad_sales, impressions, ad_spend, clicks, units_sold))
+    return rows
+
+def total_sales_rows(days: int = 30, items: int = 20, seed: int = 11) -> List[tuple]:
+    rng = random.Random(seed)
+    rows = []
+    for day in range(days):
+        for item_id in range(1, items + 1):
+            units = rng.randint(0, 12)
+            rows.append(((START_DATE + timedelta(days=day)).isoformat(), item_id,
+                         round(units * rng.uniform(5, 80), 2), units))
+    return rows
+
+TABLES: Dict[str, List[str]] = {
+    "product_eligibility": ["eligibility_datetime_utc", "item_id", "eligibility", "message"],
+    "ad_sales_metrics": ["date", "item_id", "ad_sales", "impressions", "ad_spend", "clicks", "units_sold"],
+    "total_sales_metrics": ["date", "item_id", "total_sales", "total_units_ordered"]
+}
+
+async def load_sample_data(db: DatabaseManager, days: int = 30, items: int = 20):
+    """Create the schema and load every table (and its rollups) the way DataProcessor does"""
+    await db.initialize()
+    rows = {
+        "product_eligibility": eligibility_rows(items),
+        "ad_sales_metrics": ad_sales_rows(days, items),
+        "total_sales_metrics": total_sales_rows(days, items)
+    }
+    for table, columns in TABLES.items():
+        await db.replace_table(table, columns, iter([rows[table]]))
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import sqlite3
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from config import DATABASE_POOL_CONFIG
+from api.routes import query as query_routes
+from core import responses
+from services.cache_service import answer_cache
+
+BATCH = [
+    {"question": "What is my total sales?"},
+    {"question": "what is my total sales"},
+    {"question": "Which product had the lowest CPC?"},
+    {"question": "Show me the top 5 products by revenue"},
+    {"question": "What is my ROAS since 2025-06-20?"}
+]
+
+@pytest.fixture
+def client_app(db, monkeypatch):
+    """The query routes on the sample database, answering without Ollama"""
+    monkeypatch.setattr(query_routes.db_manager, "db_path", db.db_path)
+
+    async def no_llm(*args, **kwargs):
+        raise RuntimeError("LLM unavailable in tests")
+    monkeypatch.setattr(query_routes.mistral_service, "_generate", no_llm)
+    answer_cache.invalidate()
+
+    app = FastAPI()
+    app.include_router(query_routes.router, prefix="/api")
+    return app
+
+async def _post(app: FastAPI, path: str, body) -> httpx.Response:
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        return await asyncio.wait_for(client.post(path, json=body), timeout=10)
+
+@pytest.mark.asyncio
+async def test_batch_completes_with_a_single_pooled_reader(client_app, db, monkeypatch):
+    monkeypatch.setitem(DATABASE_POOL_CONFIG, "read_pool_size", 1)
+    await db.close()
+
+    response = await _post(client_app, "/api/query/batch", BATCH)
+    assert response.status_code == 200
+    results = response.json()["batch_results"]
+    assert [item["success"] for item in results] == [True] * len(BATCH)
+    assert results[1]["deduplicated"] and results[1]["response"] == results[0]["response"]
+    assert "lowest" in results[2]["response"]
+
+@pytest.mark.asyncio
+async def test_batch_answers_are_cached(client_app):
+    first = (await _post(client_app, "/api/query/batch", BATCH)).json()["batch_results"]
+    assert not any(item["cache_hit"] for item in first)
+
+    second = (await _post(client_app, "/api/query/batch?stream=true", BATCH)).text.splitlines()
+    items = [json.loads(line) for line in second[:-1]]
+    assert all(item["cache_hit"] for item in items)
+    assert json.loads(second[-1])["successful_queries"] == len(BATCH)
+
+@pytest.mark.asyncio
+async def test_cached_answer_dropped_after_another_process_writes(client_app, db):
+    body = {"question": "What is my total sales?", "include_chart": False}
+    first = (await _post(client_app, "/api/query", body)).json()
+    assert (await _post(client_app, "/api/query", body)).json()["cache_hit"]
+
+    # e.g. scripts/setup_database.py --force-reload while the API is up (it rebuilds the rollups too)
+    with sqlite3.connect(db.db_path) as other:
+        other.execute("UPDATE total_sales_by_item SET total_sales = total_sales + 1000 WHERE item_id = 1")
+
+    third = (await _post(client_app, "/api/query", body)).json()
+    assert not third["cache_hit"]
+    assert third["results"][0]["total_sales"] == pytest.approx(first["results"][0]["total_sales"] + 1000)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoder", sorted(responses.ENCODERS))
+async def test_raw_sql_renders_non_finite_floats_as_null(client_app, monkeypatch, encoder):
+    monkeypatch.setattr(responses, "dumps", responses.ENCODERS[encoder])
+    response = await _post(client_app, "/api/sql/execute", {"sql_query": "SELECT 1e999 as high, -1e999 as low, 0.5 as half"})
+    assert response.status_code == 200
+    assert response.json()["results"] == [{"high": None, "low": None, "half": 0.5}]
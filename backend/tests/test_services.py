@@ -0,0 +1,235 @@
+import asyncio
+import sqlite3
+from datetime import timedelta
+
+import pytest
+
+from config import DATABASE_POOL_CONFIG, QUERY_COST_CONFIG, DOWNSAMPLE_CONFIG
+from core.database import QueryTimeoutError, result_cache, referenced_tables, canonicalize_sql
+from services.chart_service import ChartService
+from services.columnar_service import ColumnarService, ANSWERABLE_INTENTS
+from services.plan_service import PlanService
+from utils.downsample import downsample_rows
+from utils.intent_classifier import intent_classifier
+from utils.sql_templates import sql_templates
+from fixtures.sample_data import START_DATE
+
+# Result cache invalidation
+
+async def _count(db, query: str) -> int:
+    rows = await db.execute_query(query, cache=True)
+    return rows[0]["count"]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", [
+    "SELECT COUNT(*) as count FROM total_sales_metrics t, ad_sales_metrics a WHERE t.item_id = a.item_id AND t.date = a.date",
+    'SELECT COUNT(*) as count FROM main."ad_sales_metrics"',
+    "SELECT COUNT(*) as count FROM [ad_sales_metrics]"
+])
+async def test_cached_read_invalidated_by_write_to_any_table_it_reads(db, query):
+    before = await _count(db, query)
+    assert await _count(db, query) == before  # Served from the cache
+
+    await db.execute_write(
+        "INSERT INTO ad_sales_metrics (date, item_id, ad_sales, impressions, ad_spend, clicks, units_sold) "
+        "VALUES ('2025-06-01', 999, 1, 1, 1, 1, 1)"
+    )
+    await db.execute_write(
+        "INSERT INTO total_sales_metrics (date, item_id, total_sales, total_units_ordered) VALUES ('2025-06-01', 999, 1, 1)"
+    )
+    assert await _count(db, query) == before + 1
+
+@pytest.mark.asyncio
+async def test_cached_read_invalidated_by_another_process(db):
+    query = "SELECT COUNT(*) as count FROM total_sales_metrics"
+    before = await _count(db, query)
+    hits = result_cache.hits
+    assert await _count(db, query) == before
+    assert result_cache.hits == hits + 1
+
+    # e.g. setup_database.py run against the same file while the API is up
+    with sqlite3.connect(db.db_path) as other:
+        other.execute("INSERT INTO total_sales_metrics VALUES ('2025-06-01', 999, 1, 1)")
+
+    assert await _count(db, query) == before + 1
+
+@pytest.mark.asyncio
+async def test_read_tables_follow_views_and_comma_joins(db):
+    pool = await db._get_pool()
+    async with pool.reader() as conn:
+        assert await db.read_tables(conn, "SELECT * FROM total_sales_metrics t, ad_sales_metrics a") == \
+            ["ad_sales_metrics", "total_sales_metrics"]
+        assert await db.read_tables(conn, 'SELECT item_id FROM main."total_sales_by_item" WHERE item_id = ?', (1,)) == \
+            ["total_sales_by_item"]
+        assert await db.read_tables(conn, "SELECT name FROM sqlite_master") == ["sqlite_master"]
+
+def test_referenced_tables_for_writes():
+    def tables(sql):
+        return referenced_tables(canonicalize_sql(sql))
+
+    assert tables('INSERT INTO main."ad_sales_metrics" VALUES (1)') == ["ad_sales_metrics"]
+    assert tables("DELETE FROM [total_sales_metrics] WHERE 'from x' = ''") == ["total_sales_metrics"]
+    assert tables("SELECT * FROM a, b AS c, main.d WHERE a.x = c.x") == ["a", "b", "d"]
+    assert tables("CREATE TABLE IF NOT EXISTS t (x)") == ["sqlite_master", "t"]
+
+# Query guard
+
+# ~10M VM steps: long enough to trip a millisecond deadline, a few hundred ms unguarded
+SLOW_QUERY = ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1000000) "
+              "SELECT COUNT(*) as count FROM c")
+
+@pytest.mark.asyncio
+async def test_guard_interrupts_slow_query(db):
+    with pytest.raises(QueryTimeoutError) as error:
+        await db.execute_query(SLOW_QUERY, timeout=0.001)
+    assert error.value.reason == "deadline exceeded"
+
+@pytest.mark.asyncio
+async def test_expired_guard_is_removed_from_the_connection(db, monkeypatch):
+    monkeypatch.setitem(DATABASE_POOL_CONFIG, "read_pool_size", 1)
+    await db.close()  # Reopen with a single reader, so both statements share it
+    
+    with pytest.raises(QueryTimeoutError):
+        await db.execute_query(SLOW_QUERY, timeout=0.001)
+    
+    pool = await db._get_pool()
+    async with pool.reader() as conn:
+        # Unguarded, like _explain and the PRAGMAs: must not inherit the expired deadline
+        async with conn.execute(SLOW_QUERY) as cursor:
+            assert (await cursor.fetchone())[0] == 1000000
+        assert await db.explain("SELECT * FROM ad_sales_metrics WHERE item_id = ?", (1,), connection=conn)
+
+@pytest.mark.asyncio
+async def test_stream_deadline_excludes_consumer_pauses(db):
+    # Enough VM steps per chunk that the progress handler runs during every fetch
+    query = ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000) "
+             "SELECT x FROM c")
+    stream = db.stream_query(query, chunk_size=25000, timeout=0.2)
+    chunks = 0
+    async for _ in stream:
+        chunks += 1
+        await asyncio.sleep(0.25)  # Each pause alone is longer than the timeout
+    assert chunks == 4
+    assert stream.row_count == 100000 and not stream.truncated
+
+# Cost guard
+
+@pytest.mark.asyncio
+async def test_review_on_a_snapshot_never_borrows_a_second_reader(db, monkeypatch):
+    monkeypatch.setitem(DATABASE_POOL_CONFIG, "read_pool_size", 1)
+    # Every plan goes through the rewrite path, which also counts the rollup's rows
+    monkeypatch.setitem(QUERY_COST_CONFIG, "rewrite_cost", 0)
+    await db.close()
+    plan_service = PlanService(db)
+    
+    async with db.snapshot() as connection:
+        plan = await asyncio.wait_for(plan_service.review(
+            "SELECT item_id, SUM(total_sales) as total_sales FROM total_sales_metrics GROUP BY item_id",
+            connection=connection
+        ), timeout=5)
+    assert plan.rewrite == "rollup"
+    assert "total_sales_by_item" in plan.query
+
+# Columnar snapshot vs SQLite
+
+COLUMNAR_QUESTIONS = [
+    "What is my total sales?",
+    "What were total sales since 2025-06-10?",
+    "Total sales between 2025-06-05 and 2025-06-12",
+    "Total sales in the last 7 days",
+    "Total sales for products 3 and 4",
+    "Total sales for product 5 before 2025-06-03",
+    "Show me the top 5 products by revenue",
+    "Show me the bottom 3 products by sales",
+    "Top 10 best selling products in the last two weeks",
+    "What is my ROAS?",
+    "What is my ROAS since 2025-06-20?",
+    "Which products have the best ROAS?",
+    "ROAS for products 1, 2 and 7",
+    "Which product had the highest CPC?",
+    "Which product had the lowest CPC?",
+    "Show me the CPC by product",
+    "Bottom 5 products by cost per click in the last 10 days",
+    "What's the conversion rate by product?",
+    "Which product has the lowest conversion rate since 2025-06-15?",
+    "What is my click through rate?",
+    "Top 3 products by CTR",
+    "Show me sales trends over time",
+    "Daily ad spend trend",
+    "Show me the ROAS trend for the last 14 days",
+    "CTR trend for product 2",
+    "Sales trend for products 8 and 9 from 2025-06-03 to 2025-06-09"
+]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("question", COLUMNAR_QUESTIONS)
+async def test_columnar_answers_match_sqlite(db, question):
+    columnar = ColumnarService(db)
+    await columnar.refresh()
+    match = intent_classifier.classify(question)
+    assert match.intent in ANSWERABLE_INTENTS
+    
+    query, params = sql_templates.render(match)
+    expected = await db.execute_query(query, params)
+    actual = columnar.answer(match)
+    
+    assert actual is not None
+    assert [list(row) for row in actual] == [list(row) for row in expected]  # Same columns, same order
+    assert actual == [{key: pytest.approx(value, rel=1e-9) if isinstance(value, float) else value
+                       for key, value in row.items()} for row in expected]
+
+@pytest.mark.asyncio
+async def test_columnar_snapshot_goes_stale_on_write(db):
+    columnar = ColumnarService(db)
+    await columnar.refresh()
+    assert columnar.current is not None
+    
+    await db.execute_write("DELETE FROM total_sales_metrics WHERE item_id = 1")
+    assert columnar.current is None
+    assert columnar.answer(intent_classifier.classify("What is my total sales?")) is None
+    
+    await columnar.refresh()
+    with sqlite3.connect(db.db_path) as other:
+        other.execute("DELETE FROM total_sales_metrics WHERE item_id = 2")
+    assert await db.check_external_writes()
+    assert columnar.current is None
+
+# Downsampling
+
+def _trend_rows(n: int = 30):
+    """Daily points over three series, with gaps like a LEFT JOIN against days without ad data"""
+    return [{"date": f"2025-06-{day + 1:02d}", "total_sales": (day * 37) % 23,
+             "ad_spend": None if day % 7 == 3 else (day * 11) % 17, "roas": float(day % 5)}
+            for day in range(n)]
+
+@pytest.mark.parametrize("mode", ["lttb", "minmax"])
+@pytest.mark.parametrize("target", [1, 2, 3, 4, 5, 7, 10, 29])
+def test_downsampling_stays_within_target(mode, target):
+    rows = _trend_rows()
+    sampled, report = downsample_rows(rows, "date", ["total_sales", "ad_spend", "roas"], target, mode)
+    assert len(sampled) <= target
+    assert report["points"] == len(sampled) and report["dropped"] == len(rows) - len(sampled)
+    assert sampled[0] is rows[0]
+    if target >= 2:
+        assert sampled[-1] is rows[-1]
+
+def test_minmax_keeps_the_leading_extreme_for_three_points():
+    rows = _trend_rows()
+    sampled, _ = downsample_rows(rows, "date", ["total_sales", "ad_spend"], 3, "minmax")
+    interior = [row["total_sales"] for row in rows[1:-1]]
+    assert sampled[1]["total_sales"] in (min(interior), max(interior))
+
+def test_plotly_line_on_a_date_column_is_sorted_and_downsampled():
+    # No "date"/"time" in the column name: the 3D chart is a bar, the Plotly spec a line
+    days = 3000
+    rows = [{"day": (START_DATE + timedelta(days=i)).isoformat(), "daily_sales": float((i * 37) % 101)}
+            for i in range(days)]
+    rows.reverse()
+    chart = ChartService().generate_chart_data("Daily sales", rows)
+
+    assert chart["type"] == "bar" and chart["plotly"]["kind"] == "line"
+    kept = chart["columns"][0]["values"]
+    assert len(kept) <= DOWNSAMPLE_CONFIG["chart_points"]
+    assert kept == sorted(kept) and kept[0] == START_DATE.isoformat()
+    assert chart["downsampling"]["original_points"] == days
+    assert chart["downsampling"]["dropped"] == days - len(kept)
@@ -0,0 +1,124 @@
+import logging
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from config import DOWNSAMPLE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+MODES = ("lttb", "minmax")
+
+def lttb(xs: Sequence[float], ys: Sequence[float], target: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets: indices of `target` points that keep the line's visual shape"""
+    n = len(xs)
+    if target >= n:
+        return list(range(n))
+    if target < 3:
+        return [0, n - 1][:max(target, 1)]
+
+    every = (n - 2) / (target - 2)
+    selected = [0]
+    a = 0
+    for i in range(target - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        # The next bucket's average is the third vertex; the last bucket looks at the final point
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
+
+def min_max(ys_by_series: Sequence[Sequence[Optional[float]]], target: int) -> List[int]:
+    """First and last point plus each series' minimum and maximum per bucket, in order"""
+    n = len(ys_by_series[0]) if ys_by_series else 0
+    if target >= n:
+        return list(range(n))
+    # Small targets cannot fit two extremes per series per bucket; track the leading series only
+    ys_by_series = ys_by_series[:max((target - 2) // 2, 1)]
+    buckets = (target - 2) // (2 * max(len(ys_by_series), 1))
+    if buckets < 1:
+        return _endpoints_and_extremes(ys_by_series[0], target)
+
+    selected = {0, n - 1}
+    every = (n - 2) / buckets
+    for i in range(buckets):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        for ys in ys_by_series:
+            present = [j for j in range(start, end) if not _missing(ys[j])]
+            if present:
+                selected.add(min(present, key=ys.__getitem__))
+                selected.add(max(present, key=ys.__getitem__))
+    return sorted(selected)
+
+def _endpoints_and_extremes(ys: Sequence[Optional[float]], target: int) -> List[int]:
+    """First and last point, then the series' global extremes (largest deviation first) while they fit"""
+    n = len(ys)
+    selected = [0, n - 1][:max(target, 1)]
+    present = [j for j in range(1, n - 1) if not _missing(ys[j])]
+    if present:
+        mean = sum(ys[j] for j in present) / len(present)
+        extremes = sorted({min(present, key=ys.__getitem__), max(present, key=ys.__getitem__)},
+                          key=lambda j: abs(ys[j] - mean), reverse=True)
+        selected += extremes[:target - len(selected)]
+    return sorted(selected)
+
+def _missing(value: Any) -> bool:
+    return value is None or value != value  # None or NaN
+
+def sample_indices(xs: Sequence[float], series: Sequence[Sequence[Any]], target: int, mode: str) -> List[int]:
+    """Indices to keep from x-ordered points; LTTB follows the first series, min/max keeps every one"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown downsampling mode '{mode}', expected one of {', '.join(MODES)}")
+    if mode == "lttb":
+        # Missing values count as 0 for the triangle areas; the points themselves are returned unchanged
+        return lttb(xs, [0.0 if _missing(y) else float(y) for y in series[0]], target)
+    return min_max(series, target)
+
+def positions(values: Sequence[Any]) -> List[float]:
+    """Numeric x positions for dates, datetimes, ISO strings or numbers; row index if any is unparseable"""
+    try:
+        result = []
+        for value in values:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                result.append(float(value))
+            elif isinstance(value, datetime):
+                result.append(value.timestamp())
+            elif isinstance(value, date):
+                result.append(float(value.toordinal() * 86400))
+            else:
+                result.append(datetime.fromisoformat(str(value)).timestamp())
+        return result
+    except (TypeError, ValueError, OverflowError):
+        return [float(i) for i in range(len(values))]
+
+def downsample_rows(rows: List[Dict[str, Any]], x_key: str, y_keys: Sequence[str], target: int = None,
+                    mode: str = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """(kept rows, report) for x-ordered rows; LTTB follows the first y column, min/max keeps every one"""
+    target = target or DOWNSAMPLE_CONFIG["chart_points"]
+    mode = mode or DOWNSAMPLE_CONFIG["mode"]
+    if mode not in MODES:
+        raise ValueError(f"Unknown downsampling mode '{mode}', expected one of {', '.join(MODES)}")
+
+    report = {"mode": mode, "target": target, "original_points": len(rows), "points": len(rows), "dropped": 0}
+    if len(rows) <= target or not y_keys:
+        return rows, report
+
+    kept = sample_indices(positions([row.get(x_key) for row in rows]),
+                          [[row.get(key) for row in rows] for key in y_keys], target, mode)
+    sampled = [rows[i] for i in kept]
+    report.update(points=len(sampled), dropped=len(rows) - len(sampled))
+    logger.info(f"Downsampled {len(rows)} -> {len(sampled)} points ({mode}) on {x_key}")
+    return sampled, report
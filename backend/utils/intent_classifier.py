@@ -0,0 +1,215 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Routing intents in priority order: when a question names several metrics the first one wins
+METRIC_INTENTS = ['total_sales', 'roas', 'cpc', 'conversion_rate', 'ctr']
+
+# Intents MistralService answers from SQL templates instead of the LLM
+FALLBACK_INTENTS = {'total_sales', 'roas', 'cpc', 'top_products', 'conversion_rate', 'ctr', 'trends', 'eligible_products'}
+
+# Trigger phrases and synonyms -> (slot kind, value)
+PHRASES: Dict[str, Tuple[str, object]] = {}
+
+def _register(kind: str, value: object, *phrases: str):
+    for phrase in phrases:
+        PHRASES[phrase] = (kind, value)
+
+_register('metric', 'total_sales', 'total sales', 'total revenue', 'revenue', 'sales revenue', 'sales amount', 'gross sales')
+_register('metric', 'roas', 'roas', 'return on ad spend', 'return on advertising spend', 'advertising roi', 'ad roi', 'ad return')
+_register('metric', 'cpc', 'cpc', 'cost per click', 'click cost')
+_register('metric', 'conversion_rate', 'conversion rate', 'conversion', 'conversions', 'click to sale', 'cvr')
+_register('metric', 'ctr', 'ctr', 'click through rate', 'clickthrough rate')
+_register('metric', 'ad_sales', 'ad sales', 'ad revenue', 'advertising sales')
+_register('metric', 'ad_spend', 'ad spend', 'advertising spend', 'ad cost')
+_register('metric', 'impressions', 'impressions')
+_register('metric', 'clicks', 'clicks')
+_register('metric', 'units', 'units', 'units sold', 'units ordered')
+_register('eligibility', True, 'eligible', 'eligibility', 'ineligible', 'advertising eligible')
+_register('trend', True, 'trend', 'trends', 'over time', 'daily', 'per day', 'by day', 'by date',
+          'each day', 'day by day', 'time series')
+_register('entity', 'product', 'product', 'products', 'item', 'items', 'sku', 'skus')
+# "top"/"bottom" ask for a list, superlatives ask for a single winner
+_register('rank', ('list', 'desc'), 'top', 'best')
+_register('rank', ('list', 'asc'), 'bottom', 'worst')
+_register('rank', ('one', 'desc'), 'highest', 'most', 'largest', 'biggest', 'maximum', 'max')
+_register('rank', ('one', 'asc'), 'lowest', 'least', 'smallest', 'minimum', 'min')
+_register('ranked_entity', ('list', 'desc'), 'best selling', 'top selling', 'best sellers', 'bestsellers',
+          'top performers', 'best performers', 'top performing', 'best performing')
+
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'fifteen': 15, 'twenty': 20, 'fifty': 50
+}
+
+PERIOD_DAYS = {'day': 1, 'days': 1, 'week': 7, 'weeks': 7, 'month': 30, 'months': 30}
+
+_TOKEN = re.compile(r"\d{4}-\d{2}-\d{2}|[a-z]+|\d+")
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}$")
+_END = "$"
+
+@dataclass(frozen=True)
+class IntentMatch:
+    """Routing intent plus the slots extracted from a question"""
+    intent: Optional[str] = None
+    metric: Optional[str] = None
+    metrics: Tuple[str, ...] = ()
+    top_n: Optional[int] = None
+    sort: Optional[str] = None  # 'desc' or 'asc'
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    last_days: Optional[int] = None  # Relative window, resolved against the latest loaded date
+    item_ids: Tuple[int, ...] = field(default_factory=tuple)
+
+    @property
+    def slots(self) -> Dict[str, object]:
+        """Slots as a plain dict (for logging and API responses)"""
+        return {
+            'metric': self.metric,
+            'top_n': self.top_n,
+            'sort': self.sort,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'last_days': self.last_days,
+            'item_ids': list(self.item_ids)
+        }
+
+class IntentClassifier:
+    """Token trie over every trigger phrase; one left-to-right pass yields intent and slots"""
+
+    def __init__(self, phrases: Dict[str, Tuple[str, object]] = None):
+        self._trie: Dict = {}
+        for phrase, target in (phrases or PHRASES).items():
+            node = self._trie
+            for token in phrase.split():
+                node = node.setdefault(token, {})
+            node[_END] = target
+        self.classify = lru_cache(maxsize=1024)(self._classify)
+
+    def _longest_match(self, tokens: List[str], start: int) -> Tuple[int, Optional[Tuple[str, object]]]:
+        """Longest phrase starting at `start` -> (tokens consumed, target)"""
+        node, consumed, target = self._trie, 0, None
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if _END in node:
+                consumed, target = i - start + 1, node[_END]
+        return consumed, target
+
+    @staticmethod
+    def _number(token: str) -> Optional[int]:
+        if token.isdigit():
+            return int(token)
+        return NUMBER_WORDS.get(token)
+
+    def _classify(self, question: str) -> IntentMatch:
+        tokens = _TOKEN.findall(question.lower().replace("'", ""))
+        metrics: List[str] = []
+        rank: Optional[Tuple[str, str]] = None
+        has_entity = eligibility = trend = False
+        top_n = last_days = None
+        dates: List[Tuple[Optional[str], str]] = []  # (preceding word, date)
+        item_ids: List[int] = []
+
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            previous = tokens[i - 1] if i else None
+
+            if _ISO_DATE.match(token):
+                dates.append((previous, token))
+                i += 1
+                continue
+
+            # "last 7 days", "past two weeks", "last month"
+            if token in ('last', 'past', 'previous') and i + 1 < len(tokens):
+                count = self._number(tokens[i + 1])
+                unit = tokens[i + 2] if count is not None and i + 2 < len(tokens) else tokens[i + 1]
+                if unit in PERIOD_DAYS:
+                    last_days = (count or 1) * PERIOD_DAYS[unit]
+                    i += 3 if count is not None else 2
+                    continue
+
+            number = self._number(token)
+            if number is not None:
+                follows_id = item_ids and (previous in ('and', 'or') or self._number(previous) is not None)
+                if has_entity and (previous in ('product', 'products', 'item', 'items', 'sku', 'skus') or follows_id):
+                    item_ids.append(number)
+                elif rank and previous in ('top', 'bottom', 'best', 'worst'):
+                    top_n = number
+                i += 1
+                continue
+
+            consumed, target = self._longest_match(tokens, i)
+            if not consumed:
+                i += 1
+                continue
+
+            kind, value = target
+            if kind == 'metric' and value not in metrics:
+                metrics.append(value)
+            elif kind == 'rank':
+                rank = rank or value
+            elif kind == 'ranked_entity':
+                rank, has_entity = rank or value, True
+            elif kind == 'entity':
+                has_entity = True
+                if top_n is None and rank and previous and self._number(previous) is not None:
+                    top_n = self._number(previous)  # "top 5 products" when the number preceded the noun
+            elif kind == 'eligibility':
+                eligibility = True
+            elif kind == 'trend':
+                trend = True
+            i += consumed
+
+        metric = next((m for m in METRIC_INTENTS if m in metrics), metrics[0] if metrics else None)
+
+        # Rankings of products by sales (or by nothing in particular) are "top products";
+        # rankings by ROAS/CPC/etc. stay with that metric
+        if rank and has_entity and metric in (None, 'total_sales'):
+            intent = 'top_products'
+        elif trend:
+            intent = 'trends'
+        elif metric in METRIC_INTENTS:
+            intent = metric
+        elif eligibility:
+            intent = 'eligible_products'
+        else:
+            intent = None
+
+        if top_n is None and rank and rank[0] == 'one':
+            top_n = 1
+
+        start_date, end_date = self._date_bounds(dates)
+
+        return IntentMatch(
+            intent=intent,
+            metric=metric,
+            metrics=tuple(metrics),
+            top_n=top_n,
+            sort=rank[1] if rank else None,
+            start_date=start_date,
+            end_date=end_date,
+            last_days=last_days,
+            item_ids=tuple(item_ids)
+        )
+
+    @staticmethod
+    def _date_bounds(dates: List[Tuple[Optional[str], str]]) -> Tuple[Optional[str], Optional[str]]:
+        """Explicit ISO dates -> (start, end)"""
+        if len(dates) >= 2:
+            first, second = sorted(date for _, date in dates[:2])
+            return first, second
+        if dates:
+            word, date = dates[0]
+            if word in ('since', 'after', 'from'):
+                return date, None
+            if word in ('before', 'until', 'through'):
+                return None, date
+            return date, date
+        return None, None
+
+# Built once at import (i.e. at startup) and shared by every router
+intent_classifier = IntentClassifier()
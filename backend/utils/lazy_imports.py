@@ -0,0 +1,83 @@
+import builtins
+import importlib
+import logging
+import sys
+import time
+from typing import Dict, List, Any
+
+logger = logging.getLogger(__name__)
+
+# Optional heavy dependencies reported by the startup profile
+HEAVY_MODULES = ("pandas", "plotly", "numpy", "openpyxl")
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            loaded, start = self.loaded, time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            if not loaded:
+                logger.info(f"Imported {self._name} on first use in {time.perf_counter() - start:.3f}s")
+        return getattr(self._module, attr)
+
+    @property
+    def loaded(self) -> bool:
+        return self._name in sys.modules
+
+class ImportProfiler:
+    """Times every module's first import by wrapping builtins.__import__ (startup profile mode only)"""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = {}  # module -> [cumulative, self] seconds
+        self._stack: List[List[Any]] = []
+        self._original = None
+
+    def start(self):
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Relative imports and modules already loaded cost nothing worth reporting
+        if level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+
+        frame = [name, 0.0]  # name, time spent in nested first imports
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][1] += elapsed
+            self.timings.setdefault(name, [elapsed, elapsed - frame[1]])
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        """Slowest imports by cumulative time, plus which heavy dependencies are loaded"""
+        ranked = sorted(self.timings.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return {
+            "modules": [{"module": name, "cumulative_ms": total * 1000, "self_ms": own * 1000}
+                        for name, (total, own) in ranked],
+            "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules]
+        }
+
+    def log_report(self, limit: int = 20):
+        report = self.report(limit)
+        logger.info("Startup import profile (cumulative / self ms):")
+        for entry in report["modules"]:
+            logger.info(f"  {entry['cumulative_ms']:9.1f} / {entry['self_ms']:8.1f}  {entry['module']}")
+        logger.info(f"Heavy modules loaded: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+
+import_profiler = ImportProfiler()
@@ -2,6 +2,8 @@ from typing import Dict, List, Any, Optional
 import json
 import logging
 
+from utils.intent_classifier import intent_classifier
+
 logger = logging.getLogger(__name__)
 
 class ResponseFormatter:
@@ -18,23 +20,17 @@ class ResponseFormatter:
         if not results:
             return "No data found for your query."
 
-        question_lower = question.lower()
-        
         # Determine response type based on question
-        if 'total sales' in question_lower:
-            return self._format_sales_response(results)
-        elif 'roas' in question_lower:
-            return self._format_roas_response(results)
-        elif 'cpc' in question_lower:
-            return self._format_cpc_response(results)
-        elif 'top' in question_lower and 'product' in question_lower:
-            return self._format_top_products_response(results)
-        elif 'conversion' in question_lower:
-            return self._format_conversion_response(results)
-        elif 'eligible' in question_lower:
-            return self._format_eligibility_response(results)
-        else:
-            return self._format_generic_response(results)
+        formatters = {
+            'total_sales': self._format_sales_response,
+            'roas': self._format_roas_response,
+            'cpc': self._format_cpc_response,
+            'top_products': self._format_top_products_response,
+            'conversion_rate': self._format_conversion_response,
+            'eligible_products': self._format_eligibility_response
+        }
+        formatter = formatters.get(intent_classifier.classify(question).intent, self._format_generic_response)
+        return formatter(results)
 
     def _format_sales_response(self, results: List[Dict]) -> str:
         """Format total sales response"""
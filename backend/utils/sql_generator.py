@@ -2,6 +2,8 @@ import re
 from typing import Dict, List, Optional
 import logging
 
+from utils.intent_classifier import intent_classifier
+
 logger = logging.getLogger(__name__)
 
 class SQLQueryGenerator:
@@ -32,25 +34,9 @@ class SQLQueryGenerator:
 
     def generate_query(self, question: str) -> str:
         """Generate SQL query based on natural language question"""
-        question_lower = question.lower()
-        
-        for pattern, generator in self.query_patterns.items():
-            if pattern in question_lower or any(keyword in question_lower for keyword in self._get_keywords(pattern)):
-                return generator(question)
-        
-        return self._generate_generic_query(question)
-
-    def _get_keywords(self, pattern: str) -> List[str]:
-        """Get keywords associated with each query pattern"""
-        keywords = {
-            'total_sales': ['total sales', 'revenue', 'sales amount'],
-            'roas': ['return on ad spend', 'advertising roi', 'ad return'],
-            'cpc': ['cost per click', 'click cost', 'cost per click'],
-            'top_products': ['top products', 'best selling', 'highest', 'best performers'],
-            'conversion_rate': ['conversion', 'conversion rate', 'click to sale'],
-            'eligible_products': ['eligible', 'eligibility', 'advertising eligible']
-        }
-        return keywords.get(pattern, [])
+        # Trigger phrases live in the shared intent classifier so every router agrees
+        generator = self.query_patterns.get(intent_classifier.classify(question).intent, self._generate_generic_query)
+        return generator(question)
 
     def _generate_total_sales_query(self, question: str) -> str:
         """Generate query for total sales"""
@@ -76,8 +62,9 @@ class SQLQueryGenerator:
 
     def _generate_cpc_query(self, question: str) -> str:
         """Generate query for CPC analysis"""
-        if 'highest' in question.lower():
-            return """
+        sort = intent_classifier.classify(question).sort
+        if sort is not None:
+            return f"""
             SELECT 
                 item_id,
                 SUM(ad_spend) / NULLIF(SUM(clicks), 0) as cpc,
@@ -86,7 +73,7 @@ class SQLQueryGenerator:
             FROM ad_sales_metrics 
             WHERE clicks > 0
             GROUP BY item_id
-            ORDER BY cpc DESC
+            ORDER BY cpc {sort.upper()}
             LIMIT 10
             """
         else:
@@ -101,7 +88,8 @@ class SQLQueryGenerator:
 
     def _generate_top_products_query(self, question: str) -> str:
         """Generate query for top products"""
-        return """
+        direction = (intent_classifier.classify(question).sort or 'desc').upper()
+        return f"""
         SELECT 
             t.item_id,
             SUM(t.total_sales) as total_sales,
@@ -111,7 +99,7 @@ class SQLQueryGenerator:
         FROM total_sales_metrics t
         LEFT JOIN ad_sales_metrics a ON t.item_id = a.item_id AND t.date = a.date
         GROUP BY t.item_id
-        ORDER BY total_sales DESC
+        ORDER BY total_sales {direction}
         LIMIT 10
         """
 
@@ -0,0 +1,172 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from core.database import ROLLUP_MEASURES
+from utils.intent_classifier import IntentMatch
+
+AD_TABLE = "ad_sales_metrics"
+TOTAL_TABLE = "total_sales_metrics"
+
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 100
+
+# Ratio metrics: (expression, supporting columns, measure that must be positive for the ratio to exist)
+RATIO_METRICS = {
+    'roas': ("SUM({roas_ad_sales}) / NULLIF(SUM({roas_ad_spend}), 0)",
+             ["SUM({roas_ad_sales}) as total_ad_sales", "SUM({roas_ad_spend}) as total_ad_spend"],
+             "roas_ad_spend"),
+    'cpc': ("SUM({cpc_ad_spend}) / NULLIF(SUM({cpc_clicks}), 0)",
+            ["SUM({cpc_ad_spend}) as total_spend", "SUM({cpc_clicks}) as total_clicks"],
+            "cpc_clicks"),
+    'conversion_rate': ("SUM({cvr_units_sold}) * 1.0 / NULLIF(SUM({cpc_clicks}), 0)",
+                        ["SUM({cvr_units_sold}) as total_units_sold", "SUM({cpc_clicks}) as total_clicks"],
+                        "cpc_clicks"),
+    'ctr': ("SUM({ctr_clicks}) * 1.0 / NULLIF(SUM({ctr_impressions}), 0)",
+            ["SUM({ctr_clicks}) as total_clicks", "SUM({ctr_impressions}) as total_impressions"],
+            "ctr_impressions")
+}
+
+# Without an explicit ranking, CPC and conversion questions list products; ROAS and CTR are one number
+RANKED_BY_DEFAULT = {'cpc', 'conversion_rate'}
+
+TEMPLATE_INTENTS = {'total_sales', 'top_products', 'trends', 'eligible_products'} | set(RATIO_METRICS)
+
+# Statement shape: everything that changes the SQL text; values go in the parameters
+Shape = Tuple
+
+class SQLTemplateEngine:
+    """Parameterized SQL for deterministic intents; SQL text is cached per statement shape"""
+
+    def __init__(self):
+        self.statement = lru_cache(maxsize=256)(self._build_statement)
+
+    def supports(self, match: IntentMatch) -> bool:
+        return match.intent in TEMPLATE_INTENTS
+
+    def render(self, match: IntentMatch) -> Optional[Tuple[str, tuple]]:
+        """(sql, params) for an intent, or None when no template applies"""
+        if not self.supports(match):
+            return None
+
+        ranked = self.ranked(match)
+        windows = tuple(kind for kind, value in (('start', match.start_date), ('end', match.end_date),
+                                                  ('last', match.last_days)) if value is not None)
+        shape = (match.intent, match.metric if match.intent in ('trends',) else None,
+                 ranked, windows, len(match.item_ids), (match.sort or 'desc').upper())
+
+        params: List = []
+        if match.intent != 'eligible_products':
+            params += [value for value in (match.start_date, match.end_date) if value is not None]
+            if match.last_days is not None:
+                params.append(f"-{match.last_days} days")
+        params += list(match.item_ids)
+        if ranked:
+            params.append(min(match.top_n or DEFAULT_TOP_N, MAX_TOP_N))
+
+        return self.statement(shape), tuple(params)
+
+    def ranked(self, match: IntentMatch) -> bool:
+        """Per-product ranking (ORDER BY ... LIMIT ?) rather than a single aggregate"""
+        if match.intent == 'top_products':
+            return True
+        if match.intent in RATIO_METRICS:
+            return match.intent in RANKED_BY_DEFAULT or match.sort is not None or len(match.item_ids) > 1
+        return False
+
+    def cache_info(self) -> Dict[str, int]:
+        """Statement cache counters for monitoring"""
+        info = self.statement.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+    def _build_statement(self, shape: Shape) -> str:
+        intent, metric, ranked, windows, item_count, direction = shape
+
+        if intent == 'eligible_products':
+            return self._eligibility_sql(item_count)
+
+        table = TOTAL_TABLE if intent in ('total_sales', 'top_products') else AD_TABLE
+        if intent == 'trends' and metric in (None, 'total_sales', 'units'):
+            table = TOTAL_TABLE
+
+        # Rollups answer whole-history questions; date windows need daily rows
+        if intent == 'trends':
+            source = table if item_count else table.replace("_metrics", "_by_day")
+        else:
+            source = table if windows else table.replace("_metrics", "_by_item")
+        measures = ROLLUP_MEASURES[table] if source == table else {column: column for column in ROLLUP_MEASURES[table]}
+
+        where = self._where(table, windows, item_count)
+
+        if intent == 'trends':
+            if table == TOTAL_TABLE:
+                columns = ["SUM({total_sales}) as daily_sales", "SUM({total_units_ordered}) as daily_units"]
+            else:
+                columns = ["SUM({ad_sales}) as daily_ad_sales", "SUM({ad_spend}) as daily_ad_spend",
+                           "SUM({clicks}) as daily_clicks", "SUM({impressions}) as daily_impressions"]
+                if metric in RATIO_METRICS:
+                    columns.append(f"{RATIO_METRICS[metric][0]} as {metric}")
+            sql = f"SELECT date, {', '.join(columns)} FROM {source}{where} GROUP BY date ORDER BY date"
+
+        elif intent == 'total_sales':
+            sql = f"SELECT SUM({{total_sales}}) as total_sales FROM {source}{where}"
+
+        elif intent == 'top_products':
+            sql = (f"SELECT item_id, SUM({{total_sales}}) as total_sales, SUM({{total_units_ordered}}) as total_units "
+                   f"FROM {source}{where} GROUP BY item_id ORDER BY total_sales {direction} LIMIT ?")
+
+        else:
+            expression, supporting, positive = RATIO_METRICS[intent]
+            columns = [f"{expression} as {intent}"] + supporting
+            if ranked:
+                sql = (f"SELECT item_id, {', '.join(columns)} FROM {source}{where} GROUP BY item_id "
+                       f"HAVING SUM({{{positive}}}) > 0 ORDER BY {intent} {direction} LIMIT ?")
+            else:
+                if intent == 'roas':
+                    columns.append(f"COUNT(DISTINCT CASE WHEN {{{positive}}} > 0 THEN item_id END) as products_with_ads")
+                sql = f"SELECT {', '.join(columns)} FROM {source}{where}"
+
+        return sql.format(**measures)
+
+    def _where(self, table: str, windows: Tuple[str, ...], item_count: int) -> str:
+        """WHERE clause with placeholders in the same order render() emits parameters"""
+        clauses = []
+        if 'start' in windows:
+            clauses.append("date >= ?")
+        if 'end' in windows:
+            clauses.append("date <= ?")
+        if 'last' in windows:
+            # Relative windows end at the latest loaded day, not today
+            clauses.append(f"date > date((SELECT MAX(date) FROM {table}), ?)")
+        if item_count:
+            clauses.append(f"item_id IN ({', '.join('?' * item_count)})")
+        return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    def _eligibility_sql(self, item_count: int) -> str:
+        """Latest eligibility status per product: listed for given items, otherwise counted"""
+        latest = """
+            SELECT item_id, eligibility, message, eligibility_datetime_utc
+            FROM product_eligibility p
+            WHERE eligibility_datetime_utc = (
+                SELECT MAX(eligibility_datetime_utc) FROM product_eligibility
+                WHERE item_id = p.item_id
+            )"""
+        if item_count:
+            return f"{latest} AND item_id IN ({', '.join('?' * item_count)}) ORDER BY item_id"
+        return f"""
+            SELECT eligibility, COUNT(*) as count, COUNT(*) * 100.0 / SUM(COUNT(*)) OVER () as percentage
+            FROM ({latest})
+            GROUP BY eligibility"""
+
+def inline_params(sql: str, params: tuple) -> str:
+    """SQL text with parameters written as literals, for display and LLM prompts only"""
+    if not params:
+        return sql
+    parts = sql.split("?")
+    if len(parts) != len(params) + 1:
+        return sql
+    literals = [str(value) if isinstance(value, (int, float)) else "'" + str(value).replace("'", "''") + "'"
+                for value in params]
+    return "".join(part + literal for part, literal in zip(parts, literals + [""]))
+
+# Built once; shared by MistralService and anything else that answers deterministic intents
+sql_templates = SQLTemplateEngine()
@@ -66,7 +66,9 @@ class QueryValidator:
                 errors.append("SQL query must start with SELECT or WITH")
         
         # Check for table existence
-        valid_tables = ['product_eligibility', 'ad_sales_metrics', 'total_sales_metrics']
+        valid_tables = ['product_eligibility', 'ad_sales_metrics', 'total_sales_metrics',
+                        'ad_sales_by_item', 'ad_sales_by_day', 'ad_sales_by_item_month',
+                        'total_sales_by_item', 'total_sales_by_day', 'total_sales_by_item_month']
         for table in valid_tables:
             if table in sql_query.lower():
                 break
@@ -202,7 +202,7 @@
 // };
 
 // export default ChartViewer;
-import React, { useState, Suspense } from 'react';
+import React, { useState, useEffect, Suspense } from 'react';
 import {
   Box,
   Card,
@@ -224,6 +224,9 @@ import {
   ThreeDRotation as ThreeDIcon
 } from '@mui/icons-material';
 
+import { decodeChart } from '../../utils/chartData';
+import { chartsAPI } from '../../services/api';
+
 // Lazy load 3D components
 const Chart3D = React.lazy(() => import('./Chart3D'));
 const BarChart3D = React.lazy(() => import('./BarChart3D'));
@@ -233,6 +236,27 @@ const LineChart3D = React.lazy(() => import('./LineChart3D'));
 const ChartViewer = ({ data, onBack }) => {
   const [chartType, setChartType] = useState(data?.chart_data?.type || 'bar');
   const [is3D, setIs3D] = useState(true);
+  const templateId = data?.chart_data?.template;
+  // undefined while loading, null if the template could not be fetched
+  const [template, setTemplate] = useState(templateId ? undefined : null);
+
+  useEffect(() => {
+    if (!templateId) {
+      setTemplate(null);
+      return undefined;
+    }
+    let active = true;
+    setTemplate(undefined);
+    chartsAPI.getTemplate(templateId)
+      .then((fetched) => active && setTemplate(fetched))
+      .catch((error) => {
+        console.error('Chart template unavailable:', error);
+        if (active) setTemplate(null);
+      });
+    return () => {
+      active = false;
+    };
+  }, [templateId]);
 
   if (!data?.chart_data) {
     return (
@@ -253,7 +277,16 @@ const ChartViewer = ({ data, onBack }) => {
     );
   }
 
-  const { chart_data } = data;
+  if (template === undefined) {
+    return (
+      <Box sx={{ display: 'flex', justifyContent: 'center', p: 4 }}>
+        <CircularProgress />
+      </Box>
+    );
+  }
+
+  // Compact columnar payloads are expanded into the per-point list the 3D charts use
+  const chart_data = decodeChart(data.chart_data, template?.palette);
   const processedData = chart_data.data?.map((item, index) => ({
     id: index,
     label: item.label || `Item ${index}`,
@@ -99,6 +99,23 @@ export const metricsAPI = {
   },
 };
 
+const chartTemplates = new Map();
+
+export const chartsAPI = {
+  // Palette and Plotly layout referenced by chart_data.template (fetched once per id, used by ChartViewer)
+  getTemplate: async (templateId) => {
+    if (!chartTemplates.has(templateId)) {
+      chartTemplates.set(templateId, apiClient.get(`/api/charts/templates/${templateId}`)
+        .then((response) => response.data)
+        .catch((error) => {
+          chartTemplates.delete(templateId);
+          throw error;
+        }));
+    }
+    return chartTemplates.get(templateId);
+  },
+};
+
 export const healthAPI = {
   // Basic health check - CORRECT PATH (no /api prefix needed)
   checkHealth: async () => {
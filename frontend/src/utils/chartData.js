@@ -0,0 +1,85 @@
+// Decoding of the compact chart_data wire format ("columnar/1").
+//
+// The backend sends the result rows once as typed columns, plus a small spec for the 3D chart
+// (type/title/config) and one for the Plotly figure (plotly). The palette comes from the template
+// referenced by id (GET /api/charts/templates/{id}), so it is neither repeated per response nor
+// copied into the client.
+
+export const CHART_FORMAT = 'columnar/1';
+
+const NAME_COLUMNS = ['product_name', 'item_name', 'name', 'title', 'description'];
+
+const toRows = (columns) => {
+  const count = columns.length ? columns[0].values.length : 0;
+  const rows = new Array(count);
+  for (let i = 0; i < count; i += 1) {
+    const row = {};
+    columns.forEach((column) => {
+      row[column.name] = column.values[i];
+    });
+    rows[i] = row;
+  }
+  return rows;
+};
+
+const toLabel = (value) => {
+  if (value === undefined) return 'Unknown';
+  if (value === null) return 'None';
+  return String(value);
+};
+
+const itemName = (row, fallback) => {
+  const named = NAME_COLUMNS.find((column) => row[column]);
+  if (named) return String(row[named]);
+  if ('item_id' in row) return `Product ${row.item_id}`;
+  return fallback;
+};
+
+// Rebuild the per-point chart_data.data list the 3D charts consume; without a palette points
+// carry no color and the charts pick their own
+export const decodeChart = (chartData, palette = []) => {
+  if (!chartData || chartData.format !== CHART_FORMAT) {
+    return chartData;
+  }
+
+  const colorAt = (index) => (palette.length ? palette[index % palette.length] : undefined);
+  const rows = toRows(chartData.columns || []);
+  const config = chartData.config || {};
+  const { xAxis, yAxis } = config;
+  let data = [];
+
+  if (chartData.type === 'line') {
+    data = rows.map((row) => {
+      const label = toLabel(row[xAxis]);
+      const value = Number(row[yAxis] ?? 0);
+      return { x: label, y: value, label, value };
+    });
+    return { ...chartData, data, config: { ...config, color: colorAt(0) } };
+  }
+
+  if (chartData.type === 'bar' || chartData.type === 'pie') {
+    const limited = rows.slice(0, config.limit || rows.length);
+    const total = config.total ?? limited.reduce((sum, row) => sum + Number(row[yAxis] ?? 0), 0);
+    data = limited.map((row, index) => {
+      const label = toLabel(row[xAxis]);
+      const value = Number(row[yAxis] ?? 0);
+      const point = {
+        label,
+        value,
+        color: colorAt(index),
+        item_id: 'item_id' in row ? row.item_id : `item_${index}`,
+        item_name: itemName(row, label),
+      };
+      if (chartData.type === 'pie') {
+        point.percentage = total > 0 ? Math.round((value / total) * 10000) / 100 : 0;
+      } else {
+        const { [xAxis]: omitLabel, [yAxis]: omitValue, ...additional } = row;
+        point.additional_info = additional;
+      }
+      return point;
+    });
+    return { ...chartData, data, config: { ...config, colors: palette.slice(0, data.length) } };
+  }
+
+  return { ...chartData, data };
+};
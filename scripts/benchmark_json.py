@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: response serialization, jsonable_encoder + stdlib JSONResponse vs FastJSONResponse
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from statistics import median
+
+# The backend modules live next to this directory
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from core.responses import FastJSONResponse, orjson
+
+def query_payload(rows: int) -> dict:
+    """Shape of a /api/query response: result rows, compact chart_data and metadata"""
+    results = [{"item_id": i, "total_sales": random.uniform(0, 5000), "total_units": random.randint(0, 200)}
+               for i in range(rows)]
+    return {
+        "question": "Show me the top products by revenue",
+        "sql_query": "SELECT item_id, SUM(total_sales) as total_sales FROM total_sales_by_item GROUP BY item_id",
+        "results": results,
+        "truncated": False,
+        "response": "Your top products by revenue are listed below." * 5,
+        "chart_data": {
+            "format": "columnar/1", "type": "bar", "template": "dark",
+            "columns": [{"name": name, "type": "float", "values": [row[name] for row in results]}
+                        for name in ("item_id", "total_sales", "total_units")]
+        },
+        "execution_time": 0.123,
+        "query_metadata": {"result_count": rows, "stage_timings": {"generate_sql": 0.01, "execute_query": 0.02}}
+    }
+
+def trends_payload(days: int) -> dict:
+    """Shape of /api/metrics/trends"""
+    start = date(2023, 1, 1)
+    return {
+        "sales_trends": [{"date": (start + timedelta(days=i)).isoformat(), "daily_sales": random.uniform(0, 1e5),
+                          "daily_units": random.randint(0, 1000)} for i in range(days)],
+        "ad_trends": [{"date": (start + timedelta(days=i)).isoformat(), "daily_ad_sales": random.uniform(0, 1e4),
+                       "daily_ad_spend": random.uniform(0, 1e3), "daily_impressions": random.randint(0, 1e5),
+                       "daily_clicks": random.randint(0, 1e3)} for i in range(days)],
+        "query_timings": {"columnar": 0.0008}
+    }
+
+def current_path(content: dict) -> bytes:
+    """What FastAPI does today for a returned dict: encoder walk, then stdlib json"""
+    return JSONResponse(jsonable_encoder(content)).body
+
+def stdlib_path(content: dict) -> bytes:
+    """What /api/query does today: JSONResponse (stdlib json) returned directly, no encoder walk"""
+    return JSONResponse(content).body
+
+def fast_path(content: dict) -> bytes:
+    return FastJSONResponse(content).body
+
+def measure(fn, content: dict, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(content)
+        timings.append(time.perf_counter() - start)
+    return median(timings)
+
+def main(runs: int):
+    print(f"Encoder: {'orjson ' + orjson.__version__ if orjson else 'stdlib (orjson not installed)'}")
+    cases = {
+        "query, 20 rows": query_payload(20),
+        "query, 1000 rows": query_payload(1000),
+        "trends, 2 years daily": trends_payload(730)
+    }
+    print(f"{'ms per response':24} {'walk+json':>8} {'json':>8} {'fast':>8}  {'vs walk':>7} {'vs json':>7}")
+    for name, content in cases.items():
+        assert len(fast_path(content)) > 0
+        walked = measure(current_path, content, runs)
+        stdlib = measure(stdlib_path, content, runs)
+        fast = measure(fast_path, content, runs)
+        print(f"{name:24} {walked * 1000:8.3f} {stdlib * 1000:8.3f} {fast * 1000:8.3f}  "
+              f"{walked / fast:6.1f}x {stdlib / fast:6.1f}x  {len(stdlib_path(content)):,} bytes")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSON response serialization")
+    parser.add_argument("--runs", type=int, default=200, help="Timed runs per case (median reported)")
+    args = parser.parse_args()
+    main(args.runs)
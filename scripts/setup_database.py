@@ -2,6 +2,7 @@
 """
 Database setup script
 """
+import argparse
 import asyncio
 import sys
 import logging
@@ -17,7 +18,7 @@ from config import DATABASE_PATH
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def main():
+async def main(force_reload: bool = False):
     """Setup database and load initial data"""
     try:
         logger.info("Setting up database...")
@@ -29,11 +30,12 @@ async def main():
         # Load data
         logger.info("Loading data from Excel files...")
         data_processor = DataProcessor()
-        await data_processor.load_all_data()
+        await data_processor.load_all_data(force=force_reload)
         
         # Verify data
         stats = await data_processor.get_summary_stats()
         logger.info(f"Data loaded successfully: {stats}")
+        await db_manager.close()
         
         logger.info("Database setup complete!")
         
@@ -42,4 +44,8 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Setup database and load initial data")
+    parser.add_argument("--force-reload", action="store_true",
+                        help="Reload every table even if the source files are unchanged")
+    args = parser.parse_args()
+    asyncio.run(main(force_reload=args.force_reload))